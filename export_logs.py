@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Export ecommerce-logs-* to CSV from the command line
+
+Same filters and output as GET /api/export/csv: the result set is walked with a
+point-in-time, optionally split into slices fetched in parallel, and written
+batch by batch (gzip when the output ends with .gz).
+
+Usage:
+    python export_logs.py -o logs.csv --start-date 2025-01-01 --end-date 2025-06-30
+    python export_logs.py -o logs.csv.gz --slices 4 --unordered
+"""
+
+from elasticsearch import Elasticsearch
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp'))
+
+from query.config import QueryConfig
+from query.export import HitExporter, csv_chunks, export_query
+from query.hit_normalizer import HitNormalizer
+from query.index_resolver import IndexResolver
+
+ES_HOST = 'http://localhost:9200'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export log search results to CSV')
+    parser.add_argument('-o', '--output', required=True, help='Output file (.csv or .csv.gz)')
+    parser.add_argument('--es-host', default=ES_HOST)
+    parser.add_argument('-q', '--query', default='', help='Free text, as the q parameter of the API')
+    parser.add_argument('--level', default='')
+    parser.add_argument('--service', default='')
+    parser.add_argument('--start-date', default='')
+    parser.add_argument('--end-date', default='')
+    parser.add_argument('--slices', type=int, default=1,
+                        help=f'PIT slices fetched in parallel (max {QueryConfig.EXPORT_MAX_SLICES})')
+    parser.add_argument('--unordered', action='store_true',
+                        help='Write batches as they arrive instead of merging them by timestamp')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Hits per request (default: EXPORT_BATCH_SIZE)')
+    args = parser.parse_args()
+
+    es = Elasticsearch([args.es_host])
+    if not es.ping():
+        print(f"❌ Cannot connect to Elasticsearch at {args.es_host}")
+        sys.exit(1)
+
+    resolver = IndexResolver(es)
+    indices = resolver.resolve(args.start_date, args.end_date)
+    if indices == []:
+        print("⚠️  No index in the requested window, nothing to export")
+        return
+
+    slices = max(1, min(args.slices, QueryConfig.EXPORT_MAX_SLICES))
+    exporter = HitExporter(es, batch_size=args.batch_size)
+    query = export_query(args.query, args.level, args.service, args.start_date, args.end_date)
+    print(f"📤 Exporting to {args.output} ({slices} slice(s), "
+          f"{'unordered' if args.unordered else 'timestamp order'})")
+
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for hits in batches:
+            rows += len(hits)
+            yield hits
+
+    start = time.perf_counter()
+    written = 0
+    batches = exporter.batches(exporter.open(resolver.expression(indices)), query,
+                               slices=slices, ordered=not args.unordered)
+    with open(args.output, 'wb') as output:
+        for chunk in csv_chunks(counted(batches), HitNormalizer().row, compress=args.output.endswith('.gz')):
+            output.write(chunk)
+            written += len(chunk)
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ {rows} rows, {written / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+          f"({written / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s)")
+
+
+if __name__ == '__main__':
+    main()
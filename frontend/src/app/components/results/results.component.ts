@@ -1,4 +1,4 @@
-import { Component, OnInit, ViewChild } from '@angular/core';
+import { Component, OnDestroy, OnInit, ViewChild } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { ActivatedRoute } from '@angular/router';
 import { MatCardModule } from '@angular/material/card';
@@ -34,7 +34,7 @@ import { LogDetailsDialogComponent } from './log-details-dialog.component';
   templateUrl: './results.component.html',
   styleUrls: ['./results.component.scss']
 })
-export class ResultsComponent implements OnInit {
+export class ResultsComponent implements OnInit, OnDestroy {
   @ViewChild(MatPaginator) paginator!: MatPaginator;
   @ViewChild(MatSort) sort!: MatSort;
 
@@ -43,9 +43,14 @@ export class ResultsComponent implements OnInit {
   
   totalResults = 0;
   loading = true;
+  loadingMore = false;
   filters: SearchFilters = {};
   exporting = false;
 
+  // Curseur serveur de la page suivante (null : tous les résultats sont chargés)
+  cursor: string | null = null;
+  private readonly batchSize = 100;
+
   constructor(
     private apiService: ApiService,
     private route: ActivatedRoute,
@@ -63,20 +68,23 @@ export class ResultsComponent implements OnInit {
         endDate: params['endDate'] ? new Date(params['endDate']) : undefined
       };
       
+      this.releaseCursor();
       this.loadResults();
     });
   }
 
+  ngOnDestroy() {
+    this.releaseCursor();
+  }
+
   loadResults() {
     this.loading = true;
     
-    const pageSize = this.paginator?.pageSize || 50;
-    const pageIndex = this.paginator?.pageIndex || 0;
-    
-    this.apiService.searchLogs(this.filters, pageSize, pageIndex * pageSize).subscribe({
+    this.apiService.searchLogsCursor(this.filters, this.batchSize).subscribe({
       next: (results) => {
         this.dataSource.data = results.hits;
         this.totalResults = results.total;
+        this.cursor = results.cursor ?? null;
         this.loading = false;
         
         // Setup paginator and sort after data is loaded
@@ -93,8 +101,44 @@ export class ResultsComponent implements OnInit {
     });
   }
 
+  /**
+   * Load the next batch through the cursor: constant cost whatever the depth
+   */
+  loadMore() {
+    if (!this.cursor || this.loadingMore) {
+      return;
+    }
+    this.loadingMore = true;
+    
+    this.apiService.searchLogsCursor(this.filters, this.batchSize, this.cursor).subscribe({
+      next: (results) => {
+        this.dataSource.data = [...this.dataSource.data, ...results.hits];
+        this.cursor = results.cursor ?? null;
+        this.loadingMore = false;
+      },
+      error: (err) => {
+        this.loadingMore = false;
+        this.cursor = null;
+        this.showError(err.status === 410
+          ? 'La recherche a expiré, relancez-la'
+          : 'Erreur lors du chargement des résultats');
+        console.error('Results error:', err);
+      }
+    });
+  }
+
   onPageChange() {
-    this.loadResults();
+    // Last loaded page reached: fetch the next batch
+    if (this.paginator && !this.paginator.hasNextPage()) {
+      this.loadMore();
+    }
+  }
+
+  private releaseCursor() {
+    if (this.cursor) {
+      this.apiService.closeSearchCursor(this.cursor).subscribe({ error: () => {} });
+      this.cursor = null;
+    }
   }
 
   getLevelClass(level: string): string {
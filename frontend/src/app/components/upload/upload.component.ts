@@ -1,4 +1,4 @@
-import { Component } from '@angular/core';
+import { Component, OnDestroy } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { MatCardModule } from '@angular/material/card';
 import { MatButtonModule } from '@angular/material/button';
@@ -8,8 +8,10 @@ import { MatTableModule } from '@angular/material/table';
 import { MatChipsModule } from '@angular/material/chips';
 import { MatDividerModule } from '@angular/material/divider';
 import { MatSnackBar, MatSnackBarModule } from '@angular/material/snack-bar';
+import { Subscription, timer } from 'rxjs';
+import { switchMap, takeWhile } from 'rxjs/operators';
 import { ApiService } from '../../services/api.service';
-import { FileInfo, UploadResponse } from '../../models/log.models';
+import { FileInfo, UploadJob, UploadResponse } from '../../models/log.models';
 
 @Component({
   selector: 'app-upload',
@@ -28,16 +30,25 @@ import { FileInfo, UploadResponse } from '../../models/log.models';
   templateUrl: './upload.component.html',
   styleUrls: ['./upload.component.scss']
 })
-export class UploadComponent {
+export class UploadComponent implements OnDestroy {
   selectedFile: File | null = null;
   uploading = false;
   uploadProgress = 0;
+  currentJob: UploadJob | null = null;
+  private jobPolling?: Subscription;
+
+  // Polling interval for ingestion jobs (ms)
+  private readonly jobPollInterval = 1000;
   recentUploads: FileInfo[] = [];
   displayedColumns: string[] = ['filename', 'size', 'type', 'upload_time', 'documents'];
 
   // Validation
-  maxFileSize = 100 * 1024 * 1024; // 100MB
-  allowedFormats = ['csv', 'json', 'txt'];
+  maxFileSize = 2 * 1024 * 1024 * 1024; // 2GB (chunked upload)
+  // Larger files are sent in resumable chunks
+  private readonly chunkedThreshold = 100 * 1024 * 1024; // 100MB
+  allowedFormats = ['csv', 'json', 'ndjson'];
+  // Compressed files are decompressed server-side as a stream
+  compressionFormats = ['gz', 'zst'];
 
   constructor(
     private apiService: ApiService,
@@ -82,12 +93,16 @@ export class UploadComponent {
   handleFile(file: File) {
     // Validate file size
     if (file.size > this.maxFileSize) {
-      this.showError(`Fichier trop volumineux. Maximum ${this.maxFileSize / (1024 * 1024)}MB`);
+      this.showError(`Fichier trop volumineux. Maximum ${this.maxFileSize / (1024 * 1024 * 1024)}GB`);
       return;
     }
 
     // Validate file format
-    const fileExtension = file.name.split('.').pop()?.toLowerCase();
+    const parts = file.name.toLowerCase().split('.');
+    if (parts.length > 2 && this.compressionFormats.includes(parts[parts.length - 1])) {
+      parts.pop();
+    }
+    const fileExtension = parts.length > 1 ? parts.pop() : undefined;
     if (!fileExtension || !this.allowedFormats.includes(fileExtension)) {
       this.showError(`Format non supporté. Formats acceptés: ${this.allowedFormats.join(', ').toUpperCase()}`);
       return;
@@ -104,43 +119,72 @@ export class UploadComponent {
 
     this.uploading = true;
     this.uploadProgress = 0;
+    this.currentJob = null;
 
-    // Simulate progress (in real app, use HttpClient with reportProgress)
-    const progressInterval = setInterval(() => {
-      this.uploadProgress += 10;
-      if (this.uploadProgress >= 90) {
-        clearInterval(progressInterval);
-      }
-    }, 200);
+    const upload$ = this.selectedFile.size > this.chunkedThreshold
+      ? this.apiService.uploadFileChunked(this.selectedFile)
+      : this.apiService.uploadFile(this.selectedFile);
 
-    this.apiService.uploadFile(this.selectedFile).subscribe({
+    upload$.subscribe({
       next: (response: UploadResponse) => {
-        clearInterval(progressInterval);
-        this.uploadProgress = 100;
-        
-        setTimeout(() => {
-          this.uploading = false;
-          this.uploadProgress = 0;
-          this.selectedFile = null;
-          
-          this.showSuccess(`✓ ${response.documents_indexed} documents indexés avec succès!`);
-          this.loadRecentUploads();
-          
-          // Reset file input
-          const fileInput = document.querySelector('input[type="file"]') as HTMLInputElement;
-          if (fileInput) fileInput.value = '';
-        }, 500);
+        // File accepted, ingestion runs server-side: poll the job
+        this.pollJob(response.job_id);
       },
       error: (err) => {
-        clearInterval(progressInterval);
-        this.uploading = false;
-        this.uploadProgress = 0;
+        this.resetUpload();
         this.showError(err.error?.error || 'Erreur lors de l\'upload');
         console.error('Upload error:', err);
       }
     });
   }
 
+  pollJob(jobId: string) {
+    this.jobPolling?.unsubscribe();
+    this.jobPolling = timer(0, this.jobPollInterval).pipe(
+      switchMap(() => this.apiService.getUploadJob(jobId)),
+      takeWhile(job => job.status === 'queued' || job.status === 'running', true)
+    ).subscribe({
+      next: (job: UploadJob) => {
+        this.currentJob = job;
+        this.uploadProgress = Math.round(job.progress);
+
+        if (job.status === 'completed') {
+          this.resetUpload();
+          this.showSuccess(`✓ ${job.result?.indexed ?? job.rows_processed} documents indexés avec succès!`);
+          this.loadRecentUploads();
+        } else if (job.status === 'failed') {
+          this.resetUpload();
+          this.showError(job.errors[job.errors.length - 1]?.reason || 'Erreur lors de l\'indexation');
+        }
+      },
+      error: (err) => {
+        this.resetUpload();
+        this.showError(err.error?.error || 'Impossible de suivre l\'indexation');
+        console.error('Job polling error:', err);
+      }
+    });
+  }
+
+  formatEta(seconds: number | null): string {
+    if (seconds === null || seconds === undefined) return '--';
+    if (seconds < 60) return `${Math.ceil(seconds)}s`;
+    return `${Math.floor(seconds / 60)}min ${Math.ceil(seconds % 60)}s`;
+  }
+
+  ngOnDestroy() {
+    this.jobPolling?.unsubscribe();
+  }
+
+  private resetUpload() {
+    this.uploading = false;
+    this.uploadProgress = 0;
+    this.selectedFile = null;
+
+    // Reset file input
+    const fileInput = document.querySelector('input[type="file"]') as HTMLInputElement;
+    if (fileInput) fileInput.value = '';
+  }
+
   loadRecentUploads() {
     this.apiService.getFiles().subscribe({
       next: (files: FileInfo[]) => {
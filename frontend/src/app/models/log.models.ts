@@ -24,13 +24,53 @@ export interface SearchResult {
   total: number;
   hits: LogEntry[];
   took: number;
+  cursor?: string | null;  // page suivante (pagination=cursor), null à la fin
 }
 
 export interface UploadResponse {
   message: string;
   filename: string;
-  documents_indexed: number;
-  file_size: number;
+  job_id: string;
+  status: UploadJobStatus;
+  status_url: string;
+  file_type: string;
+}
+
+export type UploadJobStatus = 'queued' | 'running' | 'completed' | 'failed';
+
+export interface UploadJob {
+  job_id: string;
+  status: UploadJobStatus;
+  filename: string;
+  file_type: string;
+  total_bytes: number;
+  bytes_read: number;
+  progress: number;
+  rows_processed: number;
+  rows_failed: number;
+  rows_per_sec: number;
+  eta_seconds: number | null;
+  errors: { reason: string; [key: string]: any }[];
+  result?: {
+    indexed: number;
+    failed: number;
+    [key: string]: any;
+  };
+}
+
+export interface ChunkedUploadSession {
+  upload_id: string;
+  filename: string;
+  file_type: string;
+  status: 'uploading' | 'completed';
+  total_size: number;
+  chunk_size: number;
+  total_chunks: number;
+  received_chunks: number;
+  missing_chunks: number[];
+  bytes_received: number;
+  contiguous_bytes: number;
+  job_id: string | null;
 }
 
 export interface FileInfo {
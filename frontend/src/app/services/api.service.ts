@@ -1,13 +1,15 @@
 import { Injectable } from '@angular/core';
 import { HttpClient, HttpParams } from '@angular/common/http';
-import { Observable } from 'rxjs';
-import { map } from 'rxjs/operators';
+import { Observable, from } from 'rxjs';
+import { concatMap, last, map, retry, switchMap } from 'rxjs/operators';
 import { environment } from '../../environments/environment';
 import {
   LogEntry,
   SearchFilters,
   SearchResult,
   UploadResponse,
+  UploadJob,
+  ChunkedUploadSession,
   FileInfo,
   SystemStats,
   DashboardStats
@@ -38,6 +40,7 @@ export class ApiService {
   /**
    * Upload log file (CSV, JSON, TXT)
    * Max size: 100MB
+   * Returns immediately with a job id, ingestion runs in the background
    */
   uploadFile(file: File): Observable<UploadResponse> {
     const formData = new FormData();
@@ -47,6 +50,50 @@ export class ApiService {
     });
   }
 
+  /**
+   * Upload a large file in chunks (resumable, ingestion starts while uploading)
+   * Each chunk is retried on network errors; pass uploadId to resume a session
+   */
+  uploadFileChunked(file: File, uploadId?: string): Observable<UploadResponse> {
+    const session$ = uploadId
+      ? this.getChunkedUpload(uploadId)
+      : this.http.post<ChunkedUploadSession>(`${this.baseUrl}/upload/chunked`, {
+          filename: file.name,
+          total_size: file.size,
+          stream: true
+        });
+
+    return session$.pipe(
+      switchMap(session => from(session.missing_chunks).pipe(
+        concatMap(index => {
+          const start = index * session.chunk_size;
+          const chunk = file.slice(start, start + session.chunk_size);
+          return this.http.put(
+            `${this.baseUrl}/upload/chunked/${session.upload_id}/chunks/${index}`, chunk
+          ).pipe(retry({ count: 3, delay: 1000 }));
+        }),
+        last(null, null),
+        switchMap(() => this.http.post<UploadResponse>(
+          `${this.baseUrl}/upload/chunked/${session.upload_id}/complete`, {}
+        ))
+      ))
+    );
+  }
+
+  /**
+   * Get received / missing chunks of a chunked upload (resume)
+   */
+  getChunkedUpload(uploadId: string): Observable<ChunkedUploadSession> {
+    return this.http.get<ChunkedUploadSession>(`${this.baseUrl}/upload/chunked/${uploadId}`);
+  }
+
+  /**
+   * Get progress of a background ingestion job
+   */
+  getUploadJob(jobId: string): Observable<UploadJob> {
+    return this.http.get<UploadJob>(`${this.baseUrl}/upload/jobs/${jobId}`);
+  }
+
   /**
    * Search logs with filters
    */
@@ -64,6 +111,33 @@ export class ApiService {
     return this.http.post<SearchResult>(`${this.baseUrl}/search`, body);
   }
 
+  /**
+   * Search logs page by page with a server cursor (point-in-time + search_after):
+   * pass the cursor of the previous page to get the next one, at constant cost
+   */
+  searchLogsCursor(filters: SearchFilters, size: number = 50, cursor?: string | null): Observable<SearchResult> {
+    if (cursor) {
+      return this.http.post<SearchResult>(`${this.baseUrl}/search`, { cursor });
+    }
+    const body = {
+      query: filters.query || '',
+      level: filters.level || '',
+      service: filters.service || '',
+      start_date: filters.startDate ? filters.startDate.toISOString() : '',
+      end_date: filters.endDate ? filters.endDate.toISOString() : '',
+      size: size,
+      pagination: 'cursor'
+    };
+    return this.http.post<SearchResult>(`${this.baseUrl}/search`, body);
+  }
+
+  /**
+   * Release the server cursor of an abandoned search
+   */
+  closeSearchCursor(cursor: string): Observable<any> {
+    return this.http.delete(`${this.baseUrl}/search/cursor`, { body: { cursor } });
+  }
+
   /**
    * Get analytics and aggregations
    */
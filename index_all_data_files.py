@@ -1,147 +1,279 @@
 #!/usr/bin/env python3
 """
 Index all files from data folder into Elasticsearch
+
+Usage:
+    python index_all_data_files.py --workers 8 --chunk-size 2000
+    python index_all_data_files.py --replay-dead-letters   # after fixing the mapping
 """
 
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+import argparse
 import csv
-import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from dateutil import parser as date_parser
 from pathlib import Path
 
+# Réutiliser les lecteurs streaming et l'indexeur bulk de la webapp
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp'))
+
+from ingest.backpressure import bulk_metrics
+from ingest.bulk_indexer import BulkIndexer
+from ingest.canonical import canonicalize
+from ingest.dead_letter import NdjsonDeadLetterStore
+from ingest.index_templates import ensure_index_templates
+from ingest.doc_ids import create_action, document_route
+from ingest.readers import iter_batches, iter_documents, iter_ndjson_range, iter_csv_range, split_byte_ranges
+from ingest.timestamps import TimestampNormalizer
+from ingest.manifest import IngestManifest, ManifestAction
+
 ES_HOST = 'http://localhost:9200'
 DATA_FOLDER = 'data'
-INDEX_NAME = 'ecommerce-logs-{}'.format(datetime.now().strftime('%Y.%m.%d'))
 
-def index_csv_file(es_client, file_path):
-    """Index CSV file into Elasticsearch"""
-    print(f"📄 Processing CSV: {file_path}")
+# Extensions indexées et lecteur associé
+FILE_PATTERNS = {
+    'csv': ['*.csv'],
+    'json': ['*.json'],
+    'ndjson': ['*.ndjson', '*.jsonl']
+}
+
+# Documents normalisés par lot (chemin vectorisé pd.to_datetime)
+NORMALIZE_BATCH_SIZE = 1000
+
+# Types de fichiers découpables en plages d'octets (une ligne = un document)
+SPLITTABLE_TYPES = {'csv', 'ndjson'}
+
+# Documents rejetés par Elasticsearch (NDJSON rejouable avec --replay-dead-letters)
+DEAD_LETTER_FILE = os.path.join(DATA_FOLDER, 'dead-letters.ndjson')
+
+# Client Elasticsearch et dead-letter propres à chaque process worker
+_worker_es = None
+_worker_dead_letter = None
+
+def build_action(raw, source_data, timestamp, file_path, file_type):
+    """
+    Build the bulk action of one document (timestamp already normalized to ISO 8601)
+
+    The _id is derived from the raw document and the file name and the document
+    goes to the daily index of its event date (a fixed index when it has none)
+    with op_type=create, as for uploads: re-running the loader, or uploading the
+    same file, never duplicates documents. Canonical level/service/message/user
+    fields are added after the _id is computed.
+    """
+    source_file = os.path.basename(file_path)
+    index_name, doc_id = document_route(raw, source_file, datetime.fromisoformat(timestamp) if timestamp else None)
+    return create_action(index_name, canonicalize({
+        '@timestamp': timestamp or datetime.now().isoformat(),
+        **source_data,
+        'source_file': source_file,
+        'file_type': file_type
+    }), doc_id)
+
+def iter_actions(file_path, file_type, normalizer, byte_range=None):
+    """Stream bulk actions, normalizing timestamps batch by batch (column/format detected once)"""
+    documents = iter_file_documents(file_path, file_type, byte_range)
+    for batch in iter_batches(documents, NORMALIZE_BATCH_SIZE):
+        for raw, (source_data, timestamp) in zip(batch, normalizer.normalize_batch(batch)):
+            yield build_action(raw, source_data, timestamp, file_path, file_type)
+
+def report_timestamps(stats, label):
+    """Print how many rows needed the dateutil slow path"""
+    if stats['slow_path'] or stats['failed']:
+        print(f"   ⚠️  {label}: {stats['slow_path']} timestamp(s) on the slow path, "
+              f"{stats['failed']} unparseable (format: {stats['format']})")
+
+def iter_csv_rows(file_path):
+    """Stream CSV rows as strings (csv.DictReader, one row in memory at a time)"""
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+def iter_file_documents(file_path, file_type, byte_range=None):
+    """Stream the documents of a data file (CSV/NDJSON can be read by byte range)"""
+    if file_type == 'ndjson':
+        start, end = byte_range or (0, None)
+        return iter_ndjson_range(file_path, start, end)
+    if file_type == 'csv':
+        if byte_range is not None:
+            return iter_csv_range(file_path, *byte_range)
+        return iter_csv_rows(file_path)
+    return iter_documents(file_path, file_type)
+
+def index_file(es_client, file_path, file_type, byte_range=None):
+    """Stream one data file (or byte range) into Elasticsearch with the bulk API"""
+    print(f"📄 Processing {file_type.upper()}: {file_path}")
     
-    actions = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Find timestamp field (case-insensitive)
-                timestamp = None
-                timestamp_key = None
-                for key in row.keys():
-                    if key.lower() in ['timestamp', '@timestamp', 'time', 'date']:
-                        timestamp_str = row[key]
-                        timestamp_key = key
-                        # Parse and convert to ISO 8601 format
-                        try:
-                            # Try to parse the timestamp
-                            dt = date_parser.parse(timestamp_str)
-                            timestamp = dt.isoformat()
-                        except Exception as e:
-                            print(f"   ⚠️  Could not parse timestamp '{timestamp_str}': {e}")
-                            timestamp = datetime.now().isoformat()
-                        break
-                
-                if not timestamp:
-                    timestamp = datetime.now().isoformat()
-                
-                # Remove original timestamp key and use only @timestamp
-                source_data = {k: v for k, v in row.items() if k != timestamp_key}
-                
-                action = {
-                    '_index': INDEX_NAME,
-                    '_source': {
-                        '@timestamp': timestamp,
-                        **source_data,
-                        'source_file': os.path.basename(file_path),
-                        'file_type': 'csv'
-                    }
-                }
-                actions.append(action)
-        
-        if actions:
-            success, failed = bulk(es_client, actions, raise_on_error=False, stats_only=False)
-            print(f"   ✅ Indexed {success} documents from {os.path.basename(file_path)}")
-            if failed:
-                print(f"   ⚠️  {failed} documents failed")
-                # Print first few errors for debugging
-                for err in failed[:3]:
-                    print(f"   🔍 Error: {err}")
-            return success
+        normalizer = TimestampNormalizer()
+        actions = iter_actions(file_path, file_type, normalizer, byte_range)
+        dead_letter = NdjsonDeadLetterStore(DEAD_LETTER_FILE)
+        result = BulkIndexer(es_client).index(actions, dead_letter=dead_letter, source_file=file_path)
+        print(f"   ✅ Indexed {result.indexed} documents from {os.path.basename(file_path)}")
+        if result.duplicates:
+            print(f"   ⏭️  {result.duplicates} documents already indexed")
+        report_timestamps(normalizer.get_stats(), os.path.basename(file_path))
+        if result.failed:
+            print(f"   ⚠️  {result.failed} documents failed")
+            # Print first few errors for debugging
+            for err in result.errors[:3]:
+                print(f"   🔍 Error: {err}")
+            print(f"   📥 Rejected documents saved to {DEAD_LETTER_FILE}")
+        return result.indexed
     except Exception as e:
         print(f"   ❌ Error: {e}")
     return 0
 
+def index_csv_file(es_client, file_path):
+    """Index CSV file into Elasticsearch"""
+    return index_file(es_client, file_path, 'csv')
+
 def index_json_file(es_client, file_path):
-    """Index JSON file into Elasticsearch"""
-    print(f"📄 Processing JSON: {file_path}")
-    
-    actions = []
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    """Index JSON file (array or single object) into Elasticsearch"""
+    return index_file(es_client, file_path, 'json')
+
+def index_ndjson_file(es_client, file_path):
+    """Index NDJSON / JSON Lines file into Elasticsearch, line by line"""
+    return index_file(es_client, file_path, 'ndjson')
+
+def plan_tasks(data_folder, split_size, manifest=None, full=False):
+    """
+    List the indexing tasks: one per file, or one per byte range for large CSV/NDJSON files
+
+    With a manifest, unchanged files are skipped and partially indexed or
+    appended files only get tasks for the bytes after their indexed offset.
+    """
+    tasks = []
+    for file_type, patterns in FILE_PATTERNS.items():
+        for data_file in sorted({f for pattern in patterns for f in Path(data_folder).glob(pattern)}):
+            file_path = str(data_file)
+            if os.path.abspath(file_path) == os.path.abspath(DEAD_LETTER_FILE):
+                continue
+            splittable = file_type in SPLITTABLE_TYPES
+            start = 0
+            if manifest is not None:
+                action, start, fingerprint = manifest.plan(file_path, resumable=splittable)
+                if full:
+                    action, start = ManifestAction.FULL, 0
+                if action == ManifestAction.SKIP:
+                    print(f"   ⏭️  {os.path.basename(file_path)}: unchanged, skipped")
+                    continue
+                if action != ManifestAction.FULL:
+                    print(f"   ↪️  {os.path.basename(file_path)}: {action} from byte {start}")
+                manifest.begin(file_path, fingerprint, start)
             
-            # Handle both array and single object
-            if isinstance(data, list):
-                items = data
+            size = os.path.getsize(file_path)
+            if splittable:
+                parts = max(1, -(-(size - start) // split_size))
+                for byte_range in split_byte_ranges(file_path, parts, start):
+                    tasks.append((file_path, file_type, byte_range))
             else:
-                items = [data]
-            
-            for item in items:
-                # Find timestamp field (case-insensitive)
-                timestamp = None
-                timestamp_key = None
-                for key in list(item.keys()):
-                    if key.lower() in ['timestamp', '@timestamp', 'time', 'date']:
-                        timestamp_str = item[key]
-                        timestamp_key = key
-                        # Parse and convert to ISO 8601 format
-                        try:
-                            dt = date_parser.parse(timestamp_str)
-                            timestamp = dt.isoformat()
-                        except Exception as e:
-                            print(f"   ⚠️  Could not parse timestamp '{timestamp_str}': {e}")
-                            timestamp = datetime.now().isoformat()
-                        break
-                
-                if not timestamp:
-                    timestamp = datetime.now().isoformat()
-                
-                # Remove original timestamp key and use only @timestamp
-                source_data = {k: v for k, v in item.items() if k != timestamp_key}
-                
-                action = {
-                    '_index': INDEX_NAME,
-                    '_source': {
-                        '@timestamp': timestamp,
-                        **source_data,
-                        'source_file': os.path.basename(file_path),
-                        'file_type': 'json'
-                    }
-                }
-                actions.append(action)
-        
-        if actions:
-            success, failed = bulk(es_client, actions, raise_on_error=False, stats_only=False)
-            print(f"   ✅ Indexed {success} documents from {os.path.basename(file_path)}")
-            if failed:
-                print(f"   ⚠️  {failed} documents failed")
-                # Print first few errors for debugging
-                for err in failed[:3]:
-                    print(f"   🔍 Error: {err}")
-            return success
+                tasks.append((file_path, file_type, None))
+    # Largest tasks first so that the pool finishes evenly
+    tasks.sort(key=lambda t: (t[2][1] - t[2][0]) if t[2] else os.path.getsize(t[0]), reverse=True)
+    return tasks
+
+def checkpoint(manifest, stats):
+    """Record a finished task in the manifest (failed tasks are retried on the next run)"""
+    if manifest is None or stats.get('exception'):
+        return
+    start, end = stats['byte_range'] or (0, stats['bytes'])
+    manifest.complete_range(stats['file'], start, end, stats['indexed'])
+
+def _init_worker(es_host, dead_letter_file=None):
+    """Create the Elasticsearch client and dead-letter store of a worker process"""
+    global _worker_es, _worker_dead_letter
+    _worker_es = Elasticsearch([es_host])
+    _worker_dead_letter = NdjsonDeadLetterStore(dead_letter_file) if dead_letter_file else None
+
+def index_task(task, chunk_size, thread_count):
+    """Index one file or byte range in a worker process (adaptive bulk, at most thread_count requests in flight)"""
+    file_path, file_type, byte_range = task
+    start = time.time()
+    size = (byte_range[1] - byte_range[0]) if byte_range else os.path.getsize(file_path)
+    stats = {
+        'file': file_path,
+        'file_type': file_type,
+        'byte_range': byte_range,
+        'bytes': size,
+        'indexed': 0,
+        'failed': 0,
+        'duplicates': 0,
+        'rejected': 0,
+        'retried': 0,
+        'batch_size': None,
+        'errors': []
+    }
+    normalizer = TimestampNormalizer()
+    before = bulk_metrics.to_dict()
+    try:
+        actions = iter_actions(file_path, file_type, normalizer, byte_range)
+        indexer = BulkIndexer(_worker_es, chunk_size=chunk_size, thread_count=thread_count)
+        result = indexer.index(actions, dead_letter=_worker_dead_letter, source_file=file_path)
+        stats.update(indexed=result.indexed, failed=result.failed, duplicates=result.duplicates,
+                     errors=result.errors[:3], batch_size=indexer.batch_size.size)
     except Exception as e:
-        print(f"   ❌ Error: {e}")
-    return 0
+        stats['errors'] = [{'reason': str(e)}]
+        stats['exception'] = True
+    # Per-process metrics are cumulative: keep this task's share only
+    after = bulk_metrics.to_dict()
+    stats['rejected'] = after['rejected_documents'] - before['rejected_documents']
+    stats['retried'] = after['retried_documents'] - before['retried_documents']
+    stats['timestamps'] = normalizer.get_stats()
+    stats['duration'] = time.time() - start
+    return stats
+
+def print_summary(results, wall_time):
+    """Print per-file timings and global throughput (docs/sec, MB/sec)"""
+    files = {}
+    for stats in results:
+        entry = files.setdefault(stats['file'], {'indexed': 0, 'failed': 0, 'bytes': 0, 'duration': 0.0, 'parts': 0,
+                                                 'slow_path': 0, 'unparsed': 0})
+        entry['slow_path'] += stats['timestamps']['slow_path']
+        entry['unparsed'] += stats['timestamps']['failed']
+        entry['indexed'] += stats['indexed']
+        entry['failed'] += stats['failed']
+        entry['bytes'] += stats['bytes']
+        entry['duration'] += stats['duration']
+        entry['parts'] += 1
+    
+    print(f"\n{'File':<40} {'Parts':>5} {'Docs':>10} {'Failed':>7} {'MB':>8} {'Time (s)':>9} {'TS slow':>8}")
+    for file_path, entry in sorted(files.items()):
+        print(f"{os.path.basename(file_path)[:40]:<40} {entry['parts']:>5} {entry['indexed']:>10} "
+              f"{entry['failed']:>7} {entry['bytes'] / (1024 * 1024):>8.1f} {entry['duration']:>9.2f} "
+              f"{entry['slow_path']:>8}")
+    
+    total_docs = sum(e['indexed'] for e in files.values())
+    duplicates = sum(stats.get('duplicates', 0) for stats in results)
+    if duplicates:
+        print(f"⏭️  {duplicates} document(s) already indexed (same _id), skipped by Elasticsearch")
+    rejected = sum(stats.get('rejected', 0) for stats in results)
+    if rejected:
+        sizes = [stats['batch_size'] for stats in results if stats.get('batch_size')]
+        print(f"🔁 {rejected} document(s) rejected with 429 and retried "
+              f"(batch size adapted down to {min(sizes) if sizes else '?'})")
+    slow_path = sum(e['slow_path'] for e in files.values())
+    unparsed = sum(e['unparsed'] for e in files.values())
+    if slow_path or unparsed:
+        print(f"⚠️  Timestamps: {slow_path} row(s) parsed with dateutil, {unparsed} unparseable (set to now)")
+    total_mb = sum(e['bytes'] for e in files.values()) / (1024 * 1024)
+    print("-" * 70)
+    print(f"⏱️  Wall time: {wall_time:.2f}s")
+    if wall_time > 0:
+        print(f"🚀 Throughput: {total_docs / wall_time:,.0f} docs/sec, {total_mb / wall_time:.1f} MB/sec")
+    return total_docs
 
-def index_all_files():
-    """Index all CSV and JSON files from data folder"""
+def index_all_files(workers=1, chunk_size=None, thread_count=1, split_size=64 * 1024 * 1024,
+                    manifest_path=None, full=False):
+    """Index all CSV, JSON and NDJSON files from data folder (incremental when a manifest is used)"""
     print("=" * 70)
     print("🚀 Indexing all files from data folder into Elasticsearch")
     print("=" * 70)
     print(f"📁 Data folder: {DATA_FOLDER}")
     print(f"🔗 Elasticsearch: {ES_HOST}")
-    print(f"📊 Target index: {INDEX_NAME}")
+    print(f"📊 Target indices: ecommerce-logs-<event date> (deterministic _id, op_type=create)")
+    print(f"⚙️  Workers: {workers}, chunk size: {chunk_size or 'default'}, bulk requests in flight per worker: {thread_count}")
     print("-" * 70)
     
     # Connect to Elasticsearch
@@ -153,30 +285,51 @@ def index_all_files():
         print(f"❌ Failed to connect to Elasticsearch: {e}")
         return
     
-    # Find all CSV and JSON files
-    csv_files = list(Path(DATA_FOLDER).glob('*.csv'))
-    json_files = list(Path(DATA_FOLDER).glob('*.json'))
+    # Daily indices created by this run get the shared mappings and index sorting
+    try:
+        print(f"✅ Index template {ensure_index_templates(es)}")
+    except Exception as e:
+        print(f"⚠️  Template creation warning: {e}")
+    
+    # Index CSV, JSON and NDJSON files (large files split in byte ranges)
+    manifest = IngestManifest(manifest_path) if manifest_path else None
+    tasks = plan_tasks(DATA_FOLDER, split_size, manifest, full)
+    print(f"📋 {len(tasks)} task(s) for {len({t[0] for t in tasks})} file(s)")
     
-    total_docs = 0
+    results = []
+    start = time.time()
+    if workers <= 1:
+        _init_worker(ES_HOST, DEAD_LETTER_FILE)
+        for task in tasks:
+            results.append(index_task(task, chunk_size, thread_count))
+            checkpoint(manifest, results[-1])
+            print(f"   ✅ {os.path.basename(task[0])}: {results[-1]['indexed']} documents")
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ES_HOST, DEAD_LETTER_FILE)) as pool:
+            futures = [pool.submit(index_task, task, chunk_size, thread_count) for task in tasks]
+            for future in as_completed(futures):
+                stats = future.result()
+                results.append(stats)
+                checkpoint(manifest, stats)
+                part = f" {stats['byte_range']}" if stats['byte_range'] else ''
+                print(f"   ✅ {os.path.basename(stats['file'])}{part}: {stats['indexed']} documents "
+                      f"in {stats['duration']:.2f}s")
+    wall_time = time.time() - start
+    if manifest is not None:
+        manifest.close()
     
-    # Index CSV files
-    if csv_files:
-        print(f"📋 Found {len(csv_files)} CSV file(s)")
-        for csv_file in csv_files:
-            count = index_csv_file(es, str(csv_file))
-            total_docs += count
-        print()
+    for stats in results:
+        for err in stats['errors']:
+            print(f"   🔍 Error ({os.path.basename(stats['file'])}): {err}")
+    failed = sum(stats['failed'] for stats in results)
+    if failed:
+        print(f"📥 {failed} rejected document(s) saved to {DEAD_LETTER_FILE} "
+              f"(fix the mapping, then run with --replay-dead-letters)")
     
-    # Index JSON files
-    if json_files:
-        print(f"📋 Found {len(json_files)} JSON file(s)")
-        for json_file in json_files:
-            count = index_json_file(es, str(json_file))
-            total_docs += count
-        print()
+    total_docs = print_summary(results, wall_time)
     
-    # Refresh index
-    es.indices.refresh(index=INDEX_NAME)
+    # Refresh indices
+    es.indices.refresh(index='ecommerce-logs-*')
     
     # Get total count
     try:
@@ -192,5 +345,63 @@ def index_all_files():
     except Exception as e:
         print(f"⚠️  Could not get count: {e}")
 
+def replay_dead_letters(source_file=None, error_type=None):
+    """Re-index the documents of the dead-letter file (same index and _id)"""
+    print(f"🔁 Replaying dead letters from {DEAD_LETTER_FILE}")
+    try:
+        es = Elasticsearch([ES_HOST])
+        es.info()
+    except Exception as e:
+        print(f"❌ Failed to connect to Elasticsearch: {e}")
+        return
+    
+    stats = NdjsonDeadLetterStore(DEAD_LETTER_FILE).replay(es, source_file, error_type)
+    print(f"✅ Replayed {stats['replayed']} document(s)")
+    if stats['failed']:
+        print(f"⚠️  {stats['failed']} document(s) still rejected (kept in {DEAD_LETTER_FILE})")
+    if stats['skipped']:
+        print(f"⏭️  {stats['skipped']} entry(ies) without document source skipped")
+    es.indices.refresh(index='ecommerce-logs-*')
+
+def main():
+    global ES_HOST, DATA_FOLDER, DEAD_LETTER_FILE
+    parser = argparse.ArgumentParser(description='Index data folder files into Elasticsearch')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes (1 = sequential)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Initial documents per _bulk request, adapted to latency and 429s (default: BULK_CHUNK_SIZE)')
+    parser.add_argument('--threads', type=int, default=2,
+                        help='concurrent _bulk requests per worker')
+    parser.add_argument('--split-mb', type=int, default=64,
+                        help='CSV/NDJSON files larger than this are split in byte ranges')
+    parser.add_argument('--data-folder', default=DATA_FOLDER)
+    parser.add_argument('--es-host', default=ES_HOST)
+    parser.add_argument('--manifest', default=None,
+                        help='SQLite manifest of indexed files (default: <data-folder>/.ingest-manifest.sqlite)')
+    parser.add_argument('--no-manifest', action='store_true',
+                        help='Index every file without reading or updating the manifest')
+    parser.add_argument('--full', action='store_true',
+                        help='Re-index every file from the start and reset the manifest')
+    parser.add_argument('--dead-letters', default=None,
+                        help='NDJSON file of rejected documents (default: <data-folder>/dead-letters.ndjson)')
+    parser.add_argument('--replay-dead-letters', action='store_true',
+                        help='Re-index the rejected documents instead of the data files')
+    parser.add_argument('--source-file', default=None, help='With --replay-dead-letters: only this file')
+    parser.add_argument('--error-type', default=None,
+                        help='With --replay-dead-letters: only this error (e.g. mapper_parsing_exception)')
+    args = parser.parse_args()
+    
+    ES_HOST = args.es_host
+    DATA_FOLDER = args.data_folder
+    DEAD_LETTER_FILE = args.dead_letters or os.path.join(DATA_FOLDER, 'dead-letters.ndjson')
+    if args.replay_dead_letters:
+        replay_dead_letters(args.source_file, args.error_type)
+        return
+    manifest_path = None
+    if not args.no_manifest:
+        manifest_path = args.manifest or os.path.join(DATA_FOLDER, '.ingest-manifest.sqlite')
+    index_all_files(args.workers, args.chunk_size, args.threads, args.split_mb * 1024 * 1024,
+                    manifest_path, args.full)
+
 if __name__ == '__main__':
-    index_all_files()
+    main()
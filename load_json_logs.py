@@ -1,15 +1,44 @@
 #!/usr/bin/env python3
 """
-Load JSON logs into Elasticsearch
+Load JSON or NDJSON (JSON Lines) logs into Elasticsearch
+
+Each record goes to the daily index of its event date (timestamp field and
+format detected as in index_all_data_files.py); records without a parseable
+timestamp are skipped and counted.
+
+Usage: python load_json_logs.py [data/sample_logs.json | data/events.ndjson]
 """
 
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
-import json
+from datetime import datetime
+import os
+import sys
+
+# Réutiliser les lecteurs streaming et l'indexeur bulk de la webapp
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp'))
+
+from ingest.bulk_indexer import BulkIndexer
+from ingest.canonical import canonicalize
+from ingest.dead_letter import NdjsonDeadLetterStore
+from ingest.index_templates import ensure_index_templates
+from ingest.doc_ids import INDEX_PREFIX, create_action, document_route
+from ingest.readers import detect_format, iter_documents, open_text_stream
+from ingest.timestamps import TimestampNormalizer
 
 ES_HOST = 'http://localhost:9200'
-INDEX_NAME = 'ecommerce-logs-2025.12.21'
-JSON_FILE = 'data/sample_logs.json'
+INDEX_PATTERN = f'{INDEX_PREFIX}-*'
+JSON_FILE = sys.argv[1] if len(sys.argv) > 1 else 'data/sample_logs.json'
+
+def iter_actions(logs, source_file, normalizer, skipped):
+    """Bulk actions routed by event date; records without a parseable timestamp are counted in skipped"""
+    for log in logs:
+        _, timestamp = normalizer.normalize(log)
+        if timestamp is None:
+            skipped[0] += 1
+            continue
+        # Same index and _id as the other loaders and uploads; canonicalize() works on a copy
+        index_name, doc_id = document_route(log, source_file, datetime.fromisoformat(timestamp))
+        yield create_action(index_name, canonicalize({**log, '@timestamp': timestamp}), doc_id)
 
 def main():
     print(f"🚀 Loading JSON logs into Elasticsearch...")
@@ -17,33 +46,46 @@ def main():
     # Connect
     es = Elasticsearch([ES_HOST])
     print(f"✅ Connected to Elasticsearch")
+    try:
+        print(f"✅ Index template {ensure_index_templates(es)}")
+    except Exception as e:
+        print(f"⚠️  Template creation warning: {e}")
     
-    # Load JSON
-    with open(JSON_FILE, 'r', encoding='utf-8') as f:
-        logs_data = json.load(f)
+    # Stream JSON array / NDJSON lines (optionally .gz) without loading the whole file
+    file_type, compression = detect_format(JSON_FILE)
+    if file_type not in ('json', 'ndjson'):
+        print(f"❌ Unsupported file: {JSON_FILE}")
+        sys.exit(1)
+    stream, _ = open_text_stream(JSON_FILE, compression)
     
     # Prepare for bulk indexing
-    actions = [
-        {
-            '_index': INDEX_NAME,
-            '_source': {
-                '@timestamp': log['Timestamp'],
-                **log
-            }
-        }
-        for log in logs_data
-    ]
+    # Deterministic _id + op_type=create: re-running the script does not duplicate logs
+    source_file = os.path.basename(JSON_FILE)
+    normalizer = TimestampNormalizer()
+    skipped = [0]
+    actions = iter_actions(iter_documents(stream, file_type), source_file, normalizer, skipped)
     
     # Bulk index
-    success, failed = bulk(es, actions, raise_on_error=False)
-    print(f"✅ Indexed {success} documents from JSON")
+    with stream:
+        dead_letter = NdjsonDeadLetterStore()
+        result = BulkIndexer(es).index(actions, dead_letter=dead_letter, source_file=source_file)
+    print(f"✅ Indexed {result.indexed} documents from {file_type.upper()}")
+    if result.duplicates:
+        print(f"⏭️  {result.duplicates} documents already indexed")
+    if skipped[0]:
+        stats = normalizer.get_stats()
+        print(f"⚠️  {skipped[0]} records skipped: {stats['missing']} without timestamp field, "
+              f"{stats['failed']} unparseable (format: {stats['format']})")
+    if result.failed:
+        print(f"⚠️  {result.failed} documents failed, saved to {dead_letter.path} "
+              f"(replay: python index_all_data_files.py --dead-letters {dead_letter.path} --replay-dead-letters)")
     
     # Refresh
-    es.indices.refresh(index=INDEX_NAME)
+    es.indices.refresh(index=INDEX_PATTERN)
     
     # Total count
-    total = es.count(index=INDEX_NAME)['count']
-    print(f"📊 Total documents in {INDEX_NAME}: {total}")
+    total = es.count(index=INDEX_PATTERN)['count']
+    print(f"📊 Total documents in {INDEX_PATTERN}: {total}")
     print(f"🌐 View in Angular: http://localhost:4200")
 
 if __name__ == '__main__':
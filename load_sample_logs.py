@@ -4,78 +4,46 @@ Script to load sample logs into Elasticsearch
 """
 
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import csv
+import os
 from datetime import datetime
 import sys
 
+# Réutiliser les identifiants déterministes de la webapp
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp'))
+
+from ingest.bulk_indexer import BulkIndexer
+from ingest.canonical import canonicalize
+from ingest.dead_letter import NdjsonDeadLetterStore
+from ingest.doc_ids import INDEX_PREFIX, create_action, document_route
+from ingest.index_templates import ensure_index_templates
+from ingest.timestamps import TimestampNormalizer
+
 # Configuration
 ES_HOST = 'http://localhost:9200'
-INDEX_NAME = 'ecommerce-logs-2025.12.21'
+INDEX_PATTERN = f'{INDEX_PREFIX}-*'
 CSV_FILE = 'data/sample_logs.csv'
 
-def create_index_template(es_client):
-    """Create index template for logs"""
-    template = {
-        "index_patterns": ["ecommerce-logs-*"],
-        "template": {
-            "settings": {
-                "number_of_shards": 1,
-                "number_of_replicas": 0
-            },
-            "mappings": {
-                "properties": {
-                    "@timestamp": {"type": "date"},
-                    "Timestamp": {"type": "date"},
-                    "Level": {
-                        "type": "text",
-                        "fields": {
-                            "keyword": {"type": "keyword"}
-                        }
-                    },
-                    "Service": {
-                        "type": "text",
-                        "fields": {
-                            "keyword": {"type": "keyword"}
-                        }
-                    },
-                    "Message": {"type": "text"},
-                    "User": {
-                        "type": "text",
-                        "fields": {
-                            "keyword": {"type": "keyword"}
-                        }
-                    }
-                }
-            }
-        }
-    }
-    
-    try:
-        es_client.indices.put_index_template(name='ecommerce-logs-template', body=template)
-        print("✅ Index template created")
-    except Exception as e:
-        print(f"⚠️  Template creation warning: {e}")
-
 def load_logs_from_csv(csv_file):
-    """Load logs from CSV file"""
+    """Load logs from CSV file, each one routed to the daily index of its event date"""
     logs = []
+    normalizer = TimestampNormalizer()
     
     with open(csv_file, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
-            log = {
-                '_index': INDEX_NAME,
-                '_source': {
-                    '@timestamp': row['Timestamp'],
-                    'Timestamp': row['Timestamp'],
-                    'Level': row['Level'],
-                    'Service': row['Service'],
-                    'Message': row['Message'],
-                    'User': row['User']
-                }
+            event_time = normalizer.parse(row['Timestamp'])
+            source = {
+                '@timestamp': (event_time or datetime.now()).isoformat(),
+                'Timestamp': row['Timestamp'],
+                'Level': row['Level'],
+                'Service': row['Service'],
+                'Message': row['Message'],
+                'User': row['User']
             }
-            logs.append(log)
+            # Same row => same index and _id as the other loaders and uploads: no duplicates
+            index_name, doc_id = document_route(row, os.path.basename(csv_file), event_time)
+            logs.append(create_action(index_name, canonicalize(source), doc_id))
     
     return logs
 
@@ -84,7 +52,7 @@ def main():
     print(f"🚀 Starting log indexing...")
     print(f"📁 CSV file: {CSV_FILE}")
     print(f"🔗 Elasticsearch: {ES_HOST}")
-    print(f"📊 Target index: {INDEX_NAME}")
+    print(f"📊 Target indices: {INDEX_PATTERN} (by event date)")
     print("-" * 50)
     
     # Connect to Elasticsearch
@@ -96,8 +64,11 @@ def main():
         print(f"❌ Failed to connect to Elasticsearch: {e}")
         sys.exit(1)
     
-    # Create index template
-    create_index_template(es)
+    # Install the shared index template (keyword fields, index sorting)
+    try:
+        print(f"✅ Index template {ensure_index_templates(es)}")
+    except Exception as e:
+        print(f"⚠️  Template creation warning: {e}")
     
     # Load logs from CSV
     try:
@@ -109,23 +80,28 @@ def main():
     
     # Bulk index logs
     try:
-        success, failed = bulk(es, logs, raise_on_error=False, stats_only=False)
-        print(f"✅ Indexed {success} documents successfully")
-        if failed:
-            print(f"⚠️  {len(failed)} documents failed to index")
+        # Adaptive batch size, 429 rejections retried with backoff
+        dead_letter = NdjsonDeadLetterStore()
+        result = BulkIndexer(es).index(logs, dead_letter=dead_letter, source_file=os.path.basename(CSV_FILE))
+        print(f"✅ Indexed {result.indexed} documents successfully")
+        if result.duplicates:
+            print(f"⏭️  {result.duplicates} documents already indexed")
+        if result.failed:
+            print(f"⚠️  {result.failed} documents failed to index, saved to {dead_letter.path} "
+                  f"(replay: python index_all_data_files.py --dead-letters {dead_letter.path} --replay-dead-letters)")
     except Exception as e:
         print(f"❌ Bulk indexing failed: {e}")
         sys.exit(1)
     
-    # Refresh index
-    es.indices.refresh(index=INDEX_NAME)
+    # Refresh indices
+    es.indices.refresh(index=INDEX_PATTERN)
     
     # Verify indexing
-    count = es.count(index=INDEX_NAME)['count']
-    print(f"✅ Total documents in {INDEX_NAME}: {count}")
+    count = es.count(index=INDEX_PATTERN)['count']
+    print(f"✅ Total documents in {INDEX_PATTERN}: {count}")
     
     # Show sample document
-    sample = es.search(index=INDEX_NAME, body={"query": {"match_all": {}}, "size": 1})
+    sample = es.search(index=INDEX_PATTERN, body={"query": {"match_all": {}}, "size": 1})
     if sample['hits']['hits']:
         print("\n📝 Sample document:")
         doc = sample['hits']['hits'][0]['_source']
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Apply the lifecycle of the daily ecommerce-logs-* indices
+
+Days older than the write window are write-blocked, lose their replicas and are
+force-merged to one segment; days beyond retention are deleted (snapshotted first
+when a repository is given). Without --apply only the report is printed.
+
+Usage:
+    python manage_index_lifecycle.py                      # dry-run report
+    python manage_index_lifecycle.py --apply --retention-days 90
+    python manage_index_lifecycle.py --apply --interval-hours 24   # run daily
+"""
+
+from elasticsearch import Elasticsearch
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp'))
+
+from ingest.config import IngestConfig
+from ingest.lifecycle import IndexLifecycleManager
+
+ES_HOST = 'http://localhost:9200'
+
+
+def _size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+
+def print_report(outcome, dry_run):
+    """Print the per-index plan and the shard/segment savings"""
+    for step in outcome['steps']:
+        if step['actions']:
+            print(f"   {step['index']} ({step['age_days']}d, {step['shards']} shards, "
+                  f"{step['segments']} segments, {_size(step['size_bytes'])}): {', '.join(step['actions'])}")
+
+    report = outcome['report']
+    print("\n" + "=" * 60)
+    print("📊 DRY-RUN REPORT" if dry_run else "📊 LIFECYCLE REPORT")
+    print("=" * 60)
+    print(f"📁 Daily indices:    {report['indices']} ({report['indices_changed']} to change)")
+    print(f"🧩 Shards:           {report['shards_before']} -> {report['shards_after']} "
+          f"(-{report['shards_before'] - report['shards_after']})")
+    print(f"🧱 Segments:         {report['segments_before']} -> {report['segments_after']} "
+          f"(-{report['segments_before'] - report['segments_after']})")
+    print(f"🗑️  Deleted indices:  {report['indices_deleted']} ({_size(report['bytes_deleted'])})")
+    for action, count in report['actions'].items():
+        if count:
+            print(f"   {action}: {count}")
+    if report['oversized']:
+        print(f"⚠️  Indices above {_size(IngestConfig.LIFECYCLE_MAX_INDEX_BYTES)}: {', '.join(report['oversized'])}")
+
+    errors = [result for result in outcome['results'] if result['status'] == 'error']
+    for error in errors:
+        print(f"❌ {error['index']} {error['action']}: {error['error']}")
+    if not dry_run and not errors:
+        print("✅ Lifecycle applied")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Force-merge, write-block and expire daily log indices')
+    parser.add_argument('--apply', action='store_true', help='Run the actions (default: dry-run report only)')
+    parser.add_argument('--es-host', default=ES_HOST)
+    parser.add_argument('--write-window-days', type=int, default=None,
+                        help='Days still receiving writes (default: LIFECYCLE_WRITE_WINDOW_DAYS)')
+    parser.add_argument('--retention-days', type=int, default=None,
+                        help='Delete indices older than this (default: LIFECYCLE_RETENTION_DAYS)')
+    parser.add_argument('--snapshot-repository', default=None,
+                        help='Snapshot indices to this repository before deleting them')
+    parser.add_argument('--interval-hours', type=float, default=None,
+                        help='Run again every N hours instead of once')
+    args = parser.parse_args()
+
+    es = Elasticsearch([args.es_host])
+    if not es.ping():
+        print(f"❌ Cannot connect to Elasticsearch at {args.es_host}")
+        sys.exit(1)
+
+    manager = IndexLifecycleManager(
+        es,
+        write_window_days=args.write_window_days,
+        retention_days=args.retention_days,
+        snapshot_repository=args.snapshot_repository
+    )
+    dry_run = not args.apply
+    while True:
+        print(f"🔄 Index lifecycle: write window {manager.write_window_days}d, retention {manager.retention_days}d"
+              + (f", snapshots to {manager.snapshot_repository}" if manager.snapshot_repository else ""))
+        print_report(manager.run(dry_run=dry_run), dry_run)
+        if not args.interval_hours:
+            break
+        time.sleep(args.interval_hours * 3600)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Materialize the hourly order rollups behind /api/results
+
+Every past day of ecommerce-logs-* that is new or changed since its last rollup
+is summarized into hourly documents per country/product/category/payment
+method/status, from the orders of each daily index dated on its day. Rollups
+of deleted indices are removed. The webapp also requests a pass in the
+background after each upload; both share a Redis lock so that only one pass
+runs at a time. Use --interval-minutes for data arriving via Logstash.
+
+Usage:
+    python materialize_rollups.py
+    python materialize_rollups.py --interval-minutes 60
+"""
+
+from elasticsearch import Elasticsearch
+import argparse
+import redis
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp'))
+
+from query.index_resolver import IndexResolver
+from query.rollups import OrderRollups
+
+ES_HOST = 'http://localhost:9200'
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+
+
+def print_report(report, elapsed):
+    """Print rolled, skipped and removed days"""
+    print("\n" + "=" * 60)
+    print("📊 ROLLUP REPORT")
+    print("=" * 60)
+    print(f"🔁 Days rolled up:   {len(report['rolled'])} ({report['documents']} hourly documents)")
+    for day in report['rolled']:
+        print(f"   {day}")
+    print(f"✅ Up to date:       {report['up_to_date']}")
+    print(f"⏳ Too recent:       {report['pending']} (served from raw orders)")
+    if report['removed']:
+        print(f"🗑️  Removed days:     {', '.join(report['removed'])}")
+    for error in report['errors']:
+        print(f"❌ {error['day']}: {error['error']}")
+    print(f"⏱️  Duration:         {elapsed:.1f}s")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain hourly order rollups for /api/results')
+    parser.add_argument('--es-host', default=ES_HOST)
+    parser.add_argument('--redis-host', default=REDIS_HOST)
+    parser.add_argument('--redis-port', type=int, default=REDIS_PORT)
+    parser.add_argument('--interval-minutes', type=float, default=None,
+                        help='Run again every N minutes instead of once')
+    args = parser.parse_args()
+
+    es = Elasticsearch([args.es_host])
+    if not es.ping():
+        print(f"❌ Cannot connect to Elasticsearch at {args.es_host}")
+        sys.exit(1)
+
+    # Shared lock with the webapp; without Redis, nothing prevents a concurrent pass
+    redis_client = redis.Redis(host=args.redis_host, port=args.redis_port)
+    try:
+        redis_client.ping()
+    except redis.RedisError:
+        print(f"⚠️  Redis unavailable at {args.redis_host}:{args.redis_port}, running without the shared lock")
+        redis_client = None
+
+    resolver = IndexResolver(es, ttl=0)
+    rollups = OrderRollups(es, resolver, redis_client=redis_client)
+    while True:
+        print(f"🔄 Rolling up {resolver.wildcard} into {rollups.rollup_index}")
+        start = time.perf_counter()
+        report = rollups.materialize()
+        if report is None:
+            print("⏳ Another process is already rolling up, skipping this pass")
+        else:
+            print_report(report, time.perf_counter() - start)
+        if not args.interval_minutes:
+            break
+        time.sleep(args.interval_minutes * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,12 @@
-from flask import Flask, jsonify, request, send_from_directory, make_response, g
+from flask import Flask, Response, jsonify, request, send_from_directory, make_response, g
 from pymongo import MongoClient
 import redis
 from elasticsearch import Elasticsearch
 import os
 import json
-import csv
-import io
+from collections import Counter
 from datetime import datetime
 from werkzeug.utils import secure_filename
-import pandas as pd
 
 # Import du blueprint d'authentification
 from auth.routes import auth_bp
@@ -16,9 +14,31 @@ from auth.models import create_user_indexes
 from auth.decorators import token_required, role_required
 
 # Import du cache Redis
-from cache.redis_cache import cache_manager, cache_response, invalidate_pattern, get_cache_stats, invalidate_cache_type
+from cache.redis_cache import (cache_manager, cache_response, invalidate_pattern, get_cache_stats,
+                               invalidate_cache_type, params_cache_key)
 from cache.config import CacheType, CacheConfig
 
+# Import de l'ingestion en arrière-plan
+from ingest.backpressure import bulk_metrics
+from ingest.chunked_upload import ChunkedUploadManager, ChunkedUploadError
+from ingest.config import IngestConfig
+from ingest.dead_letter import MongoDeadLetterStore
+from ingest.index_templates import ensure_index_templates
+from ingest.jobs import IngestJob, JobManager, JobStatus
+from ingest.pipeline import ingest_file
+from ingest.readers import detect_format
+
+# Résolution des index quotidiens ciblés par les requêtes
+from query.cursor import CursorError, SearchCursors
+from query.export import HitExporter, csv_chunks, export_query
+from query.export_jobs import ExportJobError, ExportJobManager
+from query.config import QueryConfig
+from query.index_resolver import IndexResolver, data_version
+from query.params import range_is_closed, search_params
+from query.rollups import OrderRollups
+from query.hit_normalizer import hit_normalizer
+from query.projection import LEGACY_DOCUMENTS, LOG_FILTER_PATH, LOG_SOURCE, canonical_term, complete_legacy_sources
+
 app = Flask(__name__)
 
 # Configuration
@@ -33,7 +53,9 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-super-secret-key-change
 # Upload folder - use local path by default, Docker will override via env var
 default_upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', default_upload_folder)
-ALLOWED_EXTENSIONS = {'csv', 'json'}
+
+# Export job artifacts (csv.gz / parquet), kept EXPORT_ARTIFACT_TTL seconds
+EXPORT_FOLDER = os.getenv('EXPORT_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports'))
 
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -75,6 +97,22 @@ except Exception as e:
     print(f"[ERROR] Elasticsearch connection error: {e}")
     es_client = None
 
+# Daily indices covering a requested date range (catalogue cached, see query/index_resolver.py)
+index_resolver = IndexResolver(es_client)
+
+# Deep pagination of /api/search: point-in-time + search_after behind a signed token
+search_cursors = SearchCursors(es_client, app.config['SECRET_KEY'])
+
+# Unbounded CSV export, streamed from a point-in-time
+csv_exporter = HitExporter(es_client)
+
+# Keyword/scaled_float mappings and index sorting for ecommerce-logs-* (no-op when up to date)
+if es_client is not None:
+    try:
+        print(f"[OK] Index templates {ensure_index_templates(es_client)}")
+    except Exception as e:
+        print(f"[WARNING] Could not install index templates: {e}")
+
 
 @app.route('/')
 def index():
@@ -177,13 +215,80 @@ def set_cache(key):
 
 
 def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    """Check if file extension is allowed (plain or gzip/zstd compressed)"""
+    return detect_format(filename)[0] is not None
+
+
+def _run_ingest_job(job):
+    """Ingest an uploaded file (runs in the background worker pool)"""
+    def on_progress(bulk_result, bytes_read):
+        job.progress_callback(bulk_result.indexed + bulk_result.failed, bulk_result.failed,
+                              bytes_read, bulk_result.errors)
+    
+    # Chunked upload still in progress: follow the chunks as they arrive
+    source = chunked_uploads.open_stream(job.upload_id) if job.upload_id else job.filepath
+    # Compressed uploads stay compressed on disk and are decompressed as a stream
+    compression = detect_format(job.filename)[1]
+    # Ids are derived from the original file name: re-uploading the same file is a no-op
+    summary = ingest_file(source, job.file_type, job.filename, es_client, db,
+                          on_progress=on_progress, compression=compression,
+                          id_source=job.filename.split('_', 2)[-1])
+    job.update_progress(summary['indexed'] + summary['failed'], summary['failed'],
+                        job.total_bytes, summary['errors'])
+    # The upload may have created new daily indices
+    index_resolver.invalidate()
+    # ...and added documents to ranges whose results are cached
+    if summary['indexed']:
+        invalidate_cache_type(CacheType.SEARCH)
+        # Past days that received orders are rolled up again, in the background
+        order_rollups.request_materialize()
+    
+    # Store file metadata in Redis
+    if redis_client is not None:
+        file_info = {
+            'filename': job.filename,
+            'original_name': job.filename.split('_', 2)[-1],
+            'uploaded_at': datetime.now().isoformat(),
+            'size': job.total_bytes,
+            'type': job.file_type,
+            'documents_count': summary['indexed'] + summary['duplicates'],
+            'job_id': job.id
+        }
+        redis_client.setex(
+            f"file:{job.filename}",
+            86400,  # Expire after 24 hours
+            json.dumps(file_info)
+        )
+    
+    return summary
+
+
+# Background ingestion workers (local thread pool or shared Redis queue)
+job_manager = JobManager(_run_ingest_job, redis_client=redis_client)
+
+# Hourly order rollups answering /api/results (refreshed in the background after each upload,
+# one pass at a time across processes through the Redis lock)
+order_rollups = OrderRollups(es_client, index_resolver, redis_client=redis_client)
+
+# Background exports, artifacts reused until new data lands in the covered indices
+export_jobs = ExportJobManager(es_client, index_resolver, EXPORT_FOLDER, redis_client=redis_client)
+
+# Resumable chunked uploads (session state in Redis, chunks written in UPLOAD_FOLDER)
+chunked_uploads = ChunkedUploadManager(redis_client, UPLOAD_FOLDER)
+# .part files of uploads abandoned while the app was down (their Redis session has expired)
+try:
+    for name in chunked_uploads.sweep(force=True):
+        print(f"[OK] Removed abandoned chunked upload {name}")
+except Exception as e:
+    print(f"[WARNING] Could not sweep abandoned chunked uploads: {e}")
+
+# Queued jobs may be picked up at once: start consuming only when every manager they use exists
+job_manager.start_consumers()
 
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """Upload CSV or JSON file and index to Elasticsearch"""
+    """Upload CSV or JSON file and queue its ingestion into Elasticsearch"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -193,7 +298,7 @@ def upload_file():
         return jsonify({'error': 'No file selected'}), 400
     
     if not allowed_file(file.filename):
-        return jsonify({'error': 'Invalid file type. Only CSV and JSON are allowed'}), 400
+        return jsonify({'error': 'Invalid file type. Only CSV, JSON and NDJSON (optionally .gz/.zst) are allowed'}), 400
     
     try:
         filename = secure_filename(file.filename)
@@ -204,114 +309,246 @@ def upload_file():
         # Save file
         file.save(filepath)
         
-        # Process and index the file
-        documents_indexed = 0
-        file_type = filename.rsplit('.', 1)[1].lower()
+        file_type = detect_format(filename)[0]
+        job = IngestJob(filepath, file_type, unique_filename, os.path.getsize(filepath))
         
-        if file_type == 'csv':
-            # Process CSV file
-            df = pd.read_csv(filepath)
-            documents = df.to_dict('records')
-            
-            # Index to Elasticsearch
-            for doc in documents:
-                # Add timestamp if not present
-                if '@timestamp' not in doc:
-                    doc['@timestamp'] = datetime.now().isoformat()
-                
-                # Index to Elasticsearch
-                if es_client:
-                    index_name = f"ecommerce-logs-{datetime.now().strftime('%Y.%m.%d')}"
-                    es_client.index(index=index_name, document=doc)
-                    documents_indexed += 1
-                
-                # Also save to MongoDB
-                if db is not None:
-                    db.uploads.insert_one({
-                        **doc,
-                        'source_file': unique_filename,
-                        'uploaded_at': datetime.now().isoformat()
-                    })
-        
-        elif file_type == 'json':
-            # Process JSON file
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-            
-            # Handle both single object and array of objects
-            documents = data if isinstance(data, list) else [data]
-            
-            # Index to Elasticsearch
-            for doc in documents:
-                # Add timestamp if not present
-                if '@timestamp' not in doc:
-                    doc['@timestamp'] = datetime.now().isoformat()
-                
-                if es_client:
-                    index_name = f"ecommerce-logs-{datetime.now().strftime('%Y.%m.%d')}"
-                    es_client.index(index=index_name, document=doc)
-                    documents_indexed += 1
-                
-                # Also save to MongoDB
-                if db is not None:
-                    db.uploads.insert_one({
-                        **doc,
-                        'source_file': unique_filename,
-                        'uploaded_at': datetime.now().isoformat()
-                    })
-        
-        # Store file metadata in Redis
-        if redis_client is not None:
-            file_info = {
+        # Synchronous mode kept for scripts: ?wait=true
+        if request.args.get('wait', '').lower() == 'true':
+            job_manager.run_sync(job)
+            if job.status == JobStatus.FAILED:
+                return jsonify({'error': f"Upload failed: {job.errors[-1]['reason']}"}), 500
+            return jsonify({
+                'message': 'File uploaded and indexed successfully',
                 'filename': unique_filename,
-                'original_name': filename,
-                'uploaded_at': datetime.now().isoformat(),
-                'size': os.path.getsize(filepath),
-                'type': file_type,
-                'documents_count': documents_indexed
-            }
-            redis_client.setex(
-                f"file:{unique_filename}",
-                86400,  # Expire after 24 hours
-                json.dumps(file_info)
-            )
-        
+                'job_id': job.id,
+                'documents_indexed': job.result['indexed'],
+                'documents_failed': job.result['failed'],
+                'documents_duplicates': job.result['duplicates'],
+                'documents_dead_lettered': job.result['dead_lettered'],
+                'errors': job.result['errors'],
+                'mongo': job.result['mongo'],
+                'file_type': file_type
+            }), 201
+        
+        job_manager.submit(job)
         return jsonify({
-            'message': 'File uploaded and indexed successfully',
+            'message': 'File uploaded, ingestion started',
             'filename': unique_filename,
-            'documents_indexed': documents_indexed,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f"/api/upload/jobs/{job.id}",
             'file_type': file_type
-        }), 201
+        }), 202
     
     except Exception as e:
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
 
+@app.route('/api/upload/jobs/<job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    """Get progress of a background ingestion job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/ingest/stats', methods=['GET'])
+def get_ingest_stats():
+    """Bulk indexing backpressure metrics (batch size, queue depth, 429 rejections) and job counts"""
+    return jsonify({
+        'bulk': bulk_metrics.to_dict(),
+        'jobs': job_manager.get_stats()
+    })
+
+
+@app.route('/api/ingest/dead-letters', methods=['GET'])
+@token_required
+@role_required('ADMIN', 'ANALYST')
+def get_dead_letters():
+    """List documents rejected by Elasticsearch (filter by source_file / error_type)"""
+    if db is None:
+        return jsonify({'error': 'Database not connected'}), 500
+    
+    try:
+        source_file = request.args.get('source_file')
+        error_type = request.args.get('error_type')
+        limit = min(int(request.args.get('limit', 50)), 500)
+        query = {k: v for k, v in (('source_file', source_file), ('error_type', error_type)) if v}
+        
+        store = MongoDeadLetterStore(db[IngestConfig.DEAD_LETTER_COLLECTION])
+        items = list(store.collection.find(query).sort('failed_at', -1).limit(limit))
+        return jsonify({
+            'total': store.count(source_file or None, error_type or None),
+            'summary': store.summary(),
+            'items': items
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/ingest/dead-letters/replay', methods=['POST'])
+@token_required
+@role_required('ADMIN')
+def replay_dead_letters():
+    """Re-index rejected documents (e.g. after a mapping fix) without re-uploading the source file"""
+    if db is None:
+        return jsonify({'error': 'Database not connected'}), 500
+    if es_client is None:
+        return jsonify({'error': 'Elasticsearch not connected'}), 500
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        store = MongoDeadLetterStore(db[IngestConfig.DEAD_LETTER_COLLECTION])
+        stats = store.replay(es_client, data.get('source_file'), data.get('error_type'))
+        print(f"[OK] Dead letters replayed: {stats}")
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _submit_chunked_job(session):
+    """Queue the ingestion of a chunked upload (streaming while chunks arrive)"""
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['filename'])
+    upload_id = session['upload_id'] if session['status'] != 'completed' else None
+    job = IngestJob(filepath, session['file_type'], session['filename'], session['total_size'],
+                    upload_id=upload_id)
+    job_manager.submit(job)
+    chunked_uploads.set_job(session['upload_id'], job.id)
+    return job
+
+
+@app.route('/api/upload/chunked', methods=['POST'])
+def init_chunked_upload():
+    """Open a resumable chunked upload session"""
+    if redis_client is None:
+        return jsonify({'error': 'Chunked uploads require Redis'}), 503
+    
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Only CSV, JSON and NDJSON (optionally .gz/.zst) are allowed'}), 400
+    
+    try:
+        session = chunked_uploads.init(
+            filename,
+            detect_format(filename)[0],
+            int(data.get('total_size', 0)),
+            int(data['chunk_size']) if data.get('chunk_size') else None
+        )
+        
+        # Optional: start ingesting contiguous chunks before the upload completes
+        if data.get('stream'):
+            job = _submit_chunked_job(session)
+            session['job_id'] = job.id
+        
+        return jsonify(session), 201
+    
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except (TypeError, ValueError):
+        return jsonify({'error': 'total_size and chunk_size must be integers'}), 400
+
+
+@app.route('/api/upload/chunked/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """Write chunk N of a chunked upload (idempotent, can be retried)"""
+    if redis_client is None:
+        return jsonify({'error': 'Chunked uploads require Redis'}), 503
+    
+    try:
+        session = chunked_uploads.write_chunk(upload_id, index, request.get_data(cache=False))
+        # Keep the response small: the full list is available from the status route
+        session['missing_chunks'] = len(session['missing_chunks'])
+        return jsonify(session)
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Get the received / missing chunks of an upload (used to resume)"""
+    if redis_client is None:
+        return jsonify({'error': 'Chunked uploads require Redis'}), 503
+    
+    try:
+        return jsonify(chunked_uploads.status(upload_id))
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+
+@app.route('/api/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Finalize a chunked upload and start its ingestion if not already streaming"""
+    if redis_client is None:
+        return jsonify({'error': 'Chunked uploads require Redis'}), 503
+    
+    try:
+        # The ingestion job is started by the request that finalizes the upload, and only once
+        session = chunked_uploads.complete(upload_id, on_complete=lambda state: _submit_chunked_job(state).id)
+        
+        return jsonify({
+            'message': 'File uploaded, ingestion started',
+            'filename': session['filename'],
+            'job_id': session['job_id'],
+            'status_url': f"/api/upload/jobs/{session['job_id']}",
+            'file_type': session['file_type']
+        }), 202
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+
+def _search_cache_key(req):
+    """Cache key of a search: normalized parameters, identical for GET and POST
+
+    A closed range is cached for a day, so its key also carries the data version
+    of the indices it covers: a late upload or a deletion there changes the key.
+    """
+    params = search_params(req)
+    if range_is_closed(params.get('end_date')):
+        indices = index_resolver.resolve(params.get('start_date'), params.get('end_date'))
+        try:
+            version = data_version(es_client, None if indices == [] else index_resolver.expression(indices))
+        except Exception as e:
+            print(f"[WARNING] Search data version unavailable, not caching: {e}")
+            return None
+        params = dict(params, data_version=version)
+    return params_cache_key(CacheType.SEARCH, params, req.path)
+
+
+def _search_cache_ttl(req):
+    """Long TTL for a range closed in the past, short when it touches now, no cache for cursors"""
+    params = search_params(req)
+    if params.get('cursor') or params.get('pagination') == 'cursor':
+        return None
+    if range_is_closed(params.get('end_date')):
+        return CacheConfig.SEARCH_TTL_CONFIG['closed_range']
+    return CacheConfig.SEARCH_TTL_CONFIG['live']
+
+
 @app.route('/api/search', methods=['GET', 'POST'])
+@cache_response(CacheType.SEARCH, key_func=_search_cache_key, ttl_func=_search_cache_ttl)
 def search():
     """Search in Elasticsearch with advanced queries"""
     if es_client is None:
         return jsonify({'error': 'Elasticsearch not connected'}), 500
     
     try:
-        # Handle both GET and POST requests
-        if request.method == 'POST':
-            data = request.get_json()
-            query_text = data.get('query', '')
-            level = data.get('level', '')
-            service = data.get('service', '')
-            start_date = data.get('start_date', '')
-            end_date = data.get('end_date', '')
-            size = int(data.get('size', 50))
-            from_param = int(data.get('from', 0))
-        else:
-            query_text = request.args.get('q', '')
-            level = request.args.get('level', '')
-            service = request.args.get('service', '')
-            start_date = request.args.get('start_date', '')
-            end_date = request.args.get('end_date', '')
-            size = int(request.args.get('size', 50))
-            from_param = int(request.args.get('from', 0))
+        # GET and POST parameters normalized the same way as the cache key
+        params = search_params(request)
+        cursor = params.get('cursor')
+        pagination = params.get('pagination', '')
+        query_text = params.get('query', '')
+        level = params.get('level', '')
+        service = params.get('service', '')
+        start_date = params.get('start_date', '')
+        end_date = params.get('end_date', '')
+        size = int(params.get('size', 50))
+        from_param = int(params.get('from', 0))
+        
+        # Next page of a cursor: the query travels in the token
+        if cursor:
+            return _cursor_page(search_cursors.decode(cursor))
         
         # Build query
         must_clauses = []
@@ -320,15 +557,17 @@ def search():
             must_clauses.append({
                 "multi_match": {
                     "query": query_text,
-                    "fields": ["Message", "Service", "User", "Level"]
+                    "fields": ["Message", "Service", "User", "Level", "Service.text", "User.text", "Level.text",
+                               "message", "service.text"],
+                    "lenient": True
                 }
             })
         
         if level:
-            must_clauses.append({"term": {"Level": level}})
+            must_clauses.append(canonical_term('level', level))
         
         if service:
-            must_clauses.append({"term": {"Service": service}})
+            must_clauses.append(canonical_term('service', service))
         
         if start_date or end_date:
             date_range = {"@timestamp": {}}
@@ -347,66 +586,37 @@ def search():
                 },
                 "size": size,
                 "from": from_param,
-                "sort": [{"@timestamp": {"order": "desc"}}]
+                "sort": [{"@timestamp": {"order": "desc"}}],
+                "_source": LOG_SOURCE
             }
         else:
             search_body = {
                 "query": {"match_all": {}},
                 "size": size,
                 "from": from_param,
-                "sort": [{"@timestamp": {"order": "desc"}}]
+                "sort": [{"@timestamp": {"order": "desc"}}],
+                "_source": LOG_SOURCE
             }
         
-        result = es_client.search(index='ecommerce-logs-*', body=search_body)
-        
-        hits = []
-        for hit in result['hits']['hits']:
-            source = hit['_source']
-            
-            # Helper function to get service from multiple possible fields
-            def get_service_name(src):
-                # Try different field name variations
-                service_fields = ['Service', 'service', 'source', 'Source', 'event', 'Event', 
-                                'application', 'Application', 'app', 'App', 'component', 'Component']
-                for field in service_fields:
-                    if field in src and src[field]:
-                        return src[field]
-                # If no service field found, try to infer from other fields
-                if 'product_name' in src or 'customer_name' in src:
-                    return 'E-commerce'
-                return 'Application'
-            
-            # Handle different document types
-            if 'Level' in source:
-                # Standard log format
-                hits.append({
-                    "_id": hit['_id'],
-                    "timestamp": source.get('@timestamp', ''),
-                    "level": source.get('Level', ''),
-                    "service": get_service_name(source),
-                    "message": source.get('Message', ''),
-                    "user": source.get('User', '')
-                })
-            elif 'event' in source:
-                # E-commerce event format
-                hits.append({
-                    "_id": hit['_id'],
-                    "timestamp": source.get('@timestamp', ''),
-                    "level": "INFO",
-                    "service": source.get('event', 'E-commerce'),
-                    "message": f"{source.get('event', '')} - User: {source.get('user', '')} - Page: {source.get('page', '')}",
-                    "user": source.get('user', '')
-                })
-            else:
-                # Generic format
-                hits.append({
-                    "_id": hit['_id'],
-                    "timestamp": source.get('@timestamp', ''),
-                    "level": source.get('level', source.get('severity', 'INFO')),
-                    "service": get_service_name(source),
-                    "message": source.get('message', source.get('msg', str(source))),
-                    "user": source.get('user', source.get('User', ''))
-                })
+        # Only the daily indices of the requested window (no fan-out to every index)
+        indices = index_resolver.resolve(start_date, end_date)
+        if indices == []:
+            empty = {'total': 0, 'hits': [], 'took': 0}
+            if pagination == 'cursor':
+                empty['cursor'] = None
+            return jsonify(empty)
+        if pagination == 'cursor':
+            # First page of a cursor: point-in-time on the resolved indices
+            return _cursor_page(search_cursors.open(index_resolver.expression(indices),
+                                                    search_body['query'], size))
+        result = es_client.search(index=index_resolver.expression(indices), body=search_body,
+                                  ignore_unavailable=True, filter_path=LOG_FILTER_PATH).body
+        # filter_path drops hits.hits from a response without matches
+        raw_hits = result['hits'].get('hits', [])
+        complete_legacy_sources(es_client, raw_hits)
+        
+        # Canonical fields read as-is, older documents through the plan compiled for their shape
+        hits = [hit_normalizer.hit(hit) for hit in raw_hits]
         
         return jsonify({
             'total': result['hits']['total']['value'],
@@ -414,6 +624,38 @@ def search():
             'took': result['took']
         })
     
+    except CursorError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _cursor_page(state):
+    """One page of a search cursor, with the token of the next page (None on the last page)"""
+    raw_hits, total, took, next_cursor = search_cursors.page(state)
+    complete_legacy_sources(es_client, raw_hits)
+    return jsonify({
+        'total': total,
+        'hits': [hit_normalizer.hit(hit) for hit in raw_hits],
+        'took': took,
+        'cursor': next_cursor
+    })
+
+
+@app.route('/api/search/cursor', methods=['DELETE'])
+def close_search_cursor():
+    """Release the point-in-time of a cursor abandoned before its last page"""
+    if es_client is None:
+        return jsonify({'error': 'Elasticsearch not connected'}), 500
+    
+    cursor = (request.get_json(silent=True) or {}).get('cursor') or request.args.get('cursor')
+    if not cursor:
+        return jsonify({'error': 'cursor is required'}), 400
+    try:
+        search_cursors.close(cursor)
+        return jsonify({'message': 'Cursor closed'})
+    except CursorError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -432,85 +674,30 @@ def export_to_csv():
         start_date = request.args.get('start_date', '')
         end_date = request.args.get('end_date', '')
         
-        # Build Elasticsearch query (same as search endpoint)
-        must = []
-        if query:
-            must.append({"query_string": {"query": f"*{query}*", "fields": ["*"]}})
-        if level:
-            must.append({"match": {"Level": level}})
-        if service:
-            must.append({"match": {"Service": service}})
-        if start_date or end_date:
-            date_range = {}
-            if start_date:
-                date_range["gte"] = start_date
-            if end_date:
-                date_range["lte"] = end_date
-            must.append({"range": {"@timestamp": date_range}})
-        
-        search_body = {
-            "query": {"bool": {"must": must}} if must else {"match_all": {}},
-            "size": 10000,  # Export up to 10000 records
-            "sort": [{"@timestamp": {"order": "desc"}}]
-        }
-        
-        result = es_client.search(index='ecommerce-logs-*', body=search_body)
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        csv_writer = csv.writer(output)
-        
-        # Write header
-        csv_writer.writerow(['Timestamp', 'Level', 'Service', 'Message', 'User'])
-        
-        # Helper function to get service from multiple possible fields
-        def get_service_name(src):
-            service_fields = ['Service', 'service', 'source', 'Source', 'event', 'Event', 
-                            'application', 'Application', 'app', 'App', 'component', 'Component']
-            for field in service_fields:
-                if field in src and src[field]:
-                    return src[field]
-            if 'product_name' in src or 'customer_name' in src:
-                return 'E-commerce'
-            return 'Application'
-        
-        # Write data rows
-        for hit in result['hits']['hits']:
-            source = hit['_source']
-            
-            # Handle different document types (same logic as search)
-            if 'Level' in source:
-                row = [
-                    source.get('@timestamp', ''),
-                    source.get('Level', ''),
-                    get_service_name(source),
-                    source.get('Message', ''),
-                    source.get('User', '')
-                ]
-            elif 'event' in source:
-                row = [
-                    source.get('@timestamp', ''),
-                    'INFO',
-                    source.get('event', 'E-commerce'),
-                    f"{source.get('event', '')} - User: {source.get('user', '')} - Page: {source.get('page', '')}",
-                    source.get('user', '')
-                ]
-            else:
-                row = [
-                    source.get('@timestamp', ''),
-                    source.get('level', source.get('severity', 'INFO')),
-                    get_service_name(source),
-                    source.get('message', source.get('msg', str(source))),
-                    source.get('user', source.get('User', ''))
-                ]
-            
-            csv_writer.writerow(row)
-        
-        # Prepare response
-        output.seek(0)
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = f'attachment; filename=logs_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        # Large ranges: N PIT slices fetched in parallel, merged by timestamp unless order=none
+        try:
+            slices = max(1, min(int(request.args.get('slices', 1)), QueryConfig.EXPORT_MAX_SLICES))
+        except ValueError:
+            return jsonify({'error': 'slices must be an integer'}), 400
+        
+        query_body = export_query(query, level, service, start_date, end_date)
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+        ordered = request.args.get('order', 'timestamp') != 'none'
+        
+        # The whole result set, streamed batch by batch (PIT + search_after): no 10,000 hit cap,
+        # one batch in memory, the header goes out before the first batch is fetched
+        indices = index_resolver.resolve(start_date, end_date)
+        batches = iter(())
+        if indices != []:
+            pit_id = csv_exporter.open(index_resolver.expression(indices))
+            batches = csv_exporter.batches(pit_id, query_body, slices=slices, ordered=ordered)
+        
+        filename = f'logs_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        response = Response(csv_chunks(batches, hit_normalizer.row, compress=compress),
+                            mimetype='application/gzip' if compress else 'text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}{".gz" if compress else ""}'
+        # Let chunks through reverse proxies as they are produced
+        response.headers['X-Accel-Buffering'] = 'no'
         
         return response
         
@@ -518,6 +705,49 @@ def export_to_csv():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/export/jobs', methods=['POST'])
+def submit_export_job():
+    """Start a background export (csv.gz or parquet), or return the stored artifact of the same filters"""
+    if es_client is None:
+        return jsonify({'error': 'Elasticsearch not connected'}), 500
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        job = export_jobs.request_export(search_params(request), data.get('format', 'csv.gz'))
+        job['status_url'] = f"/api/export/jobs/{job['job_id']}"
+        job['download_url'] = f"/api/export/jobs/{job['job_id']}/download"
+        return jsonify(job), 200 if job['cached'] else 202
+    except ExportJobError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """Get progress of a background export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """Download the artifact of a finished export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != JobStatus.COMPLETED:
+        return jsonify({'error': f"Export is {job['status']}", 'status_url': f"/api/export/jobs/{job_id}"}), 409
+    path = export_jobs.artifact_path(job_id)
+    if path is None:
+        return jsonify({'error': 'Export artifact expired, submit the export again'}), 410
+    extension = job['artifact'].split('.', 1)[1]
+    return send_from_directory(EXPORT_FOLDER, job['artifact'], as_attachment=True,
+                               download_name=f"logs_export_{job_id}.{extension}")
+
+
 @app.route('/api/results', methods=['GET'])
 def get_results():
     """Get aggregated results and analytics from Elasticsearch"""
@@ -525,142 +755,12 @@ def get_results():
         return jsonify({'error': 'Elasticsearch not connected'}), 500
     
     try:
-        index = request.args.get('index', 'ecommerce-logs-*')
-        
-        # Complex aggregation query
-        agg_body = {
-            "size": 0,
-            "aggs": {
-                "total_revenue": {
-                    "sum": {"field": "total_amount"}
-                },
-                "total_orders": {
-                    "value_count": {"field": "order_id"}
-                },
-                "avg_order_value": {
-                    "avg": {"field": "total_amount"}
-                },
-                "unique_customers": {
-                    "cardinality": {"field": "customer_id"}
-                },
-                "orders_by_country": {
-                    "terms": {
-                        "field": "customer_country",
-                        "size": 10
-                    },
-                    "aggs": {
-                        "country_revenue": {
-                            "sum": {"field": "total_amount"}
-                        }
-                    }
-                },
-                "top_products": {
-                    "terms": {
-                        "field": "product_name.keyword",
-                        "size": 10,
-                        "order": {"product_revenue": "desc"}
-                    },
-                    "aggs": {
-                        "product_revenue": {
-                            "sum": {"field": "total_amount"}
-                        },
-                        "quantity_sold": {
-                            "sum": {"field": "quantity"}
-                        }
-                    }
-                },
-                "orders_by_category": {
-                    "terms": {
-                        "field": "product_category",
-                        "size": 10
-                    }
-                },
-                "orders_over_time": {
-                    "date_histogram": {
-                        "field": "@timestamp",
-                        "calendar_interval": "hour"
-                    },
-                    "aggs": {
-                        "hourly_revenue": {
-                            "sum": {"field": "total_amount"}
-                        }
-                    }
-                },
-                "payment_methods": {
-                    "terms": {
-                        "field": "payment_method",
-                        "size": 10
-                    }
-                },
-                "order_status": {
-                    "terms": {
-                        "field": "order_status",
-                        "size": 10
-                    }
-                }
-            }
-        }
-        
-        result = es_client.search(index=index, body=agg_body)
-        aggs = result['aggregations']
-        
-        # Format response
-        response = {
-            'summary': {
-                'total_revenue': round(aggs['total_revenue']['value'], 2),
-                'total_orders': aggs['total_orders']['value'],
-                'avg_order_value': round(aggs['avg_order_value']['value'], 2),
-                'unique_customers': aggs['unique_customers']['value']
-            },
-            'by_country': [
-                {
-                    'country': bucket['key'],
-                    'orders': bucket['doc_count'],
-                    'revenue': round(bucket['country_revenue']['value'], 2)
-                }
-                for bucket in aggs['orders_by_country']['buckets']
-            ],
-            'top_products': [
-                {
-                    'product': bucket['key'],
-                    'orders': bucket['doc_count'],
-                    'revenue': round(bucket['product_revenue']['value'], 2),
-                    'quantity': bucket['quantity_sold']['value']
-                }
-                for bucket in aggs['top_products']['buckets']
-            ],
-            'by_category': [
-                {
-                    'category': bucket['key'],
-                    'count': bucket['doc_count']
-                }
-                for bucket in aggs['orders_by_category']['buckets']
-            ],
-            'over_time': [
-                {
-                    'timestamp': bucket['key_as_string'],
-                    'orders': bucket['doc_count'],
-                    'revenue': round(bucket['hourly_revenue']['value'], 2)
-                }
-                for bucket in aggs['orders_over_time']['buckets']
-            ],
-            'payment_methods': [
-                {
-                    'method': bucket['key'],
-                    'count': bucket['doc_count']
-                }
-                for bucket in aggs['payment_methods']['buckets']
-            ],
-            'order_status': [
-                {
-                    'status': bucket['key'],
-                    'count': bucket['doc_count']
-                }
-                for bucket in aggs['order_status']['buckets']
-            ]
-        }
+        index = request.args.get('index')
+        start_date = request.args.get('start_date', '')
+        end_date = request.args.get('end_date', '')
         
-        return jsonify(response)
+        # Hourly rollups for complete, unchanged days; raw orders only for the tail
+        return jsonify(order_rollups.results(start_date, end_date, index))
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -683,6 +783,9 @@ def list_files():
             print(f"[DEBUG] Found {len(file_list)} files: {file_list[:3]}")
             
             for filename in file_list:
+                # Skip chunked uploads still in progress
+                if filename.endswith('.part'):
+                    continue
                 filepath = os.path.join(upload_folder, filename)
                 
                 # Try to get metadata from Redis
@@ -888,87 +991,78 @@ def get_dashboard():
                 }
             }
         }
-        logs_today = es_client.count(index='ecommerce-logs-*', body=today_query)['count']
+        today_indices = index_resolver.resolve('now/d', 'now')
+        logs_today = 0
+        if today_indices != []:
+            logs_today = es_client.count(index=index_resolver.expression(today_indices), body=today_query,
+                                         ignore_unavailable=True)['count']
         
         # Get error logs count
         error_query = {
-            "query": {
-                "term": {"Level": "ERROR"}
-            }
+            "query": canonical_term('level', 'ERROR')
         }
         error_logs = es_client.count(index='ecommerce-logs-*', body=error_query)['count']
         
         # Get files count from uploads folder
         files_uploaded = 0
         if os.path.exists(app.config['UPLOAD_FOLDER']):
-            files_uploaded = len(os.listdir(app.config['UPLOAD_FOLDER']))
+            # Chunked uploads still in progress are not uploaded files yet
+            files_uploaded = sum(1 for f in os.listdir(app.config['UPLOAD_FOLDER']) if not f.endswith('.part'))
         
         # Get logs by level aggregation
         agg_query = {
             "size": 0,
             "aggs": {
                 "by_level": {
-                    "terms": {"field": "Level", "size": 10}
+                    "terms": {"field": "level", "size": 10}
+                },
+                # Documents indexed before canonicalization only have Level
+                "legacy": {
+                    "filter": LEGACY_DOCUMENTS,
+                    "aggs": {"by_level": {"terms": {"field": "Level", "size": 10}}}
                 }
             }
         }
         agg_result = es_client.search(index='ecommerce-logs-*', body=agg_query)
+        level_counts = Counter()
+        aggregations = agg_result['aggregations']
+        for bucket in aggregations['by_level']['buckets'] + aggregations['legacy']['by_level']['buckets']:
+            level_counts[bucket['key']] += bucket['doc_count']
         logs_by_level = [
-            {"level": bucket['key'], "count": bucket['doc_count']}
-            for bucket in agg_result['aggregations']['by_level']['buckets']
+            {"level": level, "count": count}
+            for level, count in level_counts.most_common(10)
         ]
         
         # Get recent logs
         recent_query = {
             "query": {"match_all": {}},
             "size": 10,
-            "sort": [{"@timestamp": {"order": "desc"}}]
+            "sort": [{"@timestamp": {"order": "desc"}}],
+            # Indices are sorted by @timestamp: stop early instead of counting every hit
+            "track_total_hits": False,
+            "_source": LOG_SOURCE
         }
-        recent_result = es_client.search(index='ecommerce-logs-*', body=recent_query)
+        # Newest daily indices first, all indices only if they hold fewer than 10 logs
+        recent_indices = index_resolver.latest()
+        recent_hits = []
+        if recent_indices:
+            recent_hits = es_client.search(index=index_resolver.expression(recent_indices), body=recent_query,
+                                           ignore_unavailable=True, filter_path=LOG_FILTER_PATH
+                                           ).body.get('hits', {}).get('hits', [])
+        if len(recent_hits) < recent_query['size']:
+            recent_hits = es_client.search(index='ecommerce-logs-*', body=recent_query,
+                                           filter_path=LOG_FILTER_PATH).body.get('hits', {}).get('hits', [])
+        complete_legacy_sources(es_client, recent_hits)
         recent_logs = []
-        
-        # Helper function to get service from multiple possible fields
-        def get_service_name(src):
-            service_fields = ['Service', 'service', 'source', 'Source', 'event', 'Event', 
-                            'application', 'Application', 'app', 'App', 'component', 'Component']
-            for field in service_fields:
-                if field in src and src[field]:
-                    return src[field]
-            if 'product_name' in src or 'customer_name' in src:
-                return 'E-commerce'
-            return 'Application'
-        
-        for hit in recent_result['hits']['hits']:
-            source = hit['_source']
-            # Handle different document types
-            if 'Level' in source:
-                # Standard log format
-                recent_logs.append({
-                    "_id": hit['_id'],
-                    "timestamp": source.get('@timestamp', ''),
-                    "level": source.get('Level', ''),
-                    "service": get_service_name(source),
-                    "message": source.get('Message', '')
-                })
-            elif 'event' in source:
-                # E-commerce event format
-                recent_logs.append({
-                    "_id": hit['_id'],
-                    "timestamp": source.get('@timestamp', ''),
-                    "level": "INFO",
-                    "service": source.get('event', 'E-commerce'),
-                    "message": f"{source.get('event', '')} - User: {source.get('user', '')} - Page: {source.get('page', '')}"
-                })
-            else:
-                # Generic format
-                recent_logs.append({
-                    "_id": hit['_id'],
-                    "timestamp": source.get('@timestamp', ''),
-                    "level": source.get('level', source.get('severity', 'INFO')),
-                    "service": get_service_name(source),
-                    "message": source.get('message', source.get('msg', str(source)))
-                })
-
+        for hit in recent_hits:
+            timestamp, level, service, message, _user = hit_normalizer.row(hit['_source'])
+            recent_logs.append({
+                "_id": hit['_id'],
+                "timestamp": timestamp,
+                "level": level,
+                "service": service,
+                "message": message
+            })
         
         # Get logs over time (last 7 days)
         time_agg_query = {
@@ -989,11 +1083,15 @@ def get_dashboard():
                 }
             }
         }
-        time_result = es_client.search(index='ecommerce-logs-*', body=time_agg_query)
-        logs_over_time = [
-            {"date": bucket['key_as_string'][:10], "count": bucket['doc_count']}
-            for bucket in time_result['aggregations']['by_date']['buckets']
-        ]
+        week_indices = index_resolver.resolve('now-7d/d', 'now')
+        logs_over_time = []
+        if week_indices != []:
+            time_result = es_client.search(index=index_resolver.expression(week_indices), body=time_agg_query,
+                                           ignore_unavailable=True)
+            logs_over_time = [
+                {"date": bucket['key_as_string'][:10], "count": bucket['doc_count']}
+                for bucket in time_result['aggregations']['by_date']['buckets']
+            ]
         
         return jsonify({
             "total_logs": total_logs,
@@ -0,0 +1,446 @@
+"""
+Benchmarks de performance du backend
+Mesure les débits d'ingestion contre un Elasticsearch réel
+
+Usage:
+    python benchmarks.py upload --rows 500000
+    python benchmarks.py normalize --hits 10000
+    python benchmarks.py projection --docs 50000
+    python benchmarks.py export --docs 500000 --slices 4
+    python benchmarks.py rollups --docs 200000 --days 30
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from elasticsearch import Elasticsearch
+
+from ingest.bulk_indexer import BulkIndexer
+from ingest.canonical import canonicalize
+from ingest.index_templates import ensure_index_templates, index_template
+from ingest.readers import iter_documents, open_text_stream, zstandard
+from query.export import HitExporter, csv_chunks
+from query.hit_normalizer import HitNormalizer
+from query.index_resolver import IndexResolver
+from query.rollups import OrderRollups
+from query.projection import LOG_FILTER_PATH, LOG_SOURCE
+
+
+ELASTICSEARCH_HOST = os.getenv('ELASTICSEARCH_HOST', 'http://localhost:9200')
+
+COUNTRIES = ['France', 'Germany', 'Spain', 'Italy', 'Belgium', 'Tunisia', 'Morocco']
+CATEGORIES = ['Electronics', 'Books', 'Clothing', 'Home', 'Sports']
+PAYMENT_METHODS = ['credit_card', 'paypal', 'bank_transfer', 'cash_on_delivery']
+STATUSES = ['completed', 'pending', 'shipped', 'cancelled']
+
+
+def print_header(text):
+    """Affiche un header formaté"""
+    print("\n" + "=" * 70)
+    print(f"  {text}")
+    print("=" * 70)
+
+
+def generate_orders_csv(path, rows):
+    """Génère un fichier CSV synthétique de commandes e-commerce"""
+    start = datetime(2025, 1, 1)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'order_id', 'customer_id', 'customer_name', 'customer_country',
+                         'product_name', 'product_category', 'quantity', 'unit_price', 'total_amount',
+                         'payment_method', 'order_status'])
+        for i in range(rows):
+            quantity = random.randint(1, 5)
+            unit_price = round(random.uniform(5, 500), 2)
+            writer.writerow([
+                (start + timedelta(seconds=i * 7)).strftime('%Y-%m-%d %H:%M:%S'),
+                f"ORD-{i:08d}",
+                f"CUST-{random.randint(1, 50000):06d}",
+                f"Customer {i % 5000}",
+                random.choice(COUNTRIES),
+                f"Product {random.randint(1, 2000)}",
+                random.choice(CATEGORIES),
+                quantity,
+                unit_price,
+                round(quantity * unit_price, 2),
+                random.choice(PAYMENT_METHODS),
+                random.choice(STATUSES)
+            ])
+
+
+def _legacy_csv_documents(path, limit=None):
+    """Chargement historique: tout le CSV en DataFrame puis to_dict('records')"""
+    for i, doc in enumerate(pd.read_csv(path).to_dict('records')):
+        if limit is not None and i >= limit:
+            return
+        yield doc
+
+
+def bench_per_document(es, path, index_name, rows):
+    """Boucle historique: un appel es.index() par document"""
+    start = time.time()
+    count = 0
+    for doc in _legacy_csv_documents(path, limit=rows):
+        es.index(index=index_name, document=doc)
+        count += 1
+    return count, time.time() - start
+
+
+def bench_bulk(es, path, index_name, chunk_size, thread_count, compression=None):
+    """Chemin bulk: lecture streaming (décompressée à la volée) + BulkIndexer"""
+    start = time.time()
+    stream, _ = open_text_stream(path, compression)
+    try:
+        actions = ({'_index': index_name, '_source': doc} for doc in iter_documents(stream, 'csv'))
+        indexer = BulkIndexer(es, chunk_size=chunk_size, thread_count=thread_count)
+        result = indexer.index(actions)
+    finally:
+        stream.close()
+    return result.indexed, time.time() - start
+
+
+def compress_file(path, compression):
+    """Écrit une copie compressée (gzip ou zstd) du fichier et retourne son chemin"""
+    if compression == 'gzip':
+        target = f"{path}.gz"
+        with open(path, 'rb') as src, gzip.open(target, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+    else:
+        target = f"{path}.zst"
+        with open(path, 'rb') as src, open(target, 'wb') as dst:
+            zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+    return target
+
+
+def run_upload_benchmark(args):
+    """Compare docs/sec entre la boucle par document et le BulkIndexer"""
+    es = Elasticsearch([args.es_host])
+    es.info()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench-upload-')
+    path = os.path.join(tmp_dir, 'orders.csv')
+    print_header(f"BENCHMARK UPLOAD - {args.rows} lignes")
+    print(f"  Génération du fichier synthétique: {path}")
+    generate_orders_csv(path, args.rows)
+    print(f"  Taille: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+
+    suffix = datetime.now().strftime('%Y%m%d%H%M%S')
+    per_doc_index = f"bench-ingest-perdoc-{suffix}"
+    bulk_index = f"bench-ingest-bulk-{suffix}"
+
+    try:
+        # La boucle par document est mesurée sur un échantillon (trop lente sur 500k lignes)
+        sample = min(args.per_doc_rows, args.rows)
+        count, elapsed = bench_per_document(es, path, per_doc_index, sample)
+        per_doc_rate = count / elapsed if elapsed else 0
+        print(f"\n  es.index() par document : {count} docs en {elapsed:.2f}s -> {per_doc_rate:,.0f} docs/sec")
+
+        count, elapsed = bench_bulk(es, path, bulk_index, args.chunk_size, args.threads)
+        bulk_rate = count / elapsed if elapsed else 0
+        print(f"  BulkIndexer            : {count} docs en {elapsed:.2f}s -> {bulk_rate:,.0f} docs/sec")
+
+        if per_doc_rate:
+            print(f"\n  Accélération: x{bulk_rate / per_doc_rate:.1f}")
+
+        # Fichier compressé: moins d'octets transférés/stockés, décompression en flux
+        if args.compressed:
+            raw_size = os.path.getsize(path)
+            compressions = ['gzip'] + (['zstd'] if zstandard is not None else [])
+            print(f"\n  {'Format':<8} {'Taille':>10} {'Ratio':>7} {'Wall time':>10} {'docs/sec':>10}")
+            print(f"  {'raw':<8} {raw_size / (1024 * 1024):>8.1f}MB {'x1.0':>7} {elapsed:>9.2f}s {bulk_rate:>10,.0f}")
+            for compression in compressions:
+                compressed_path = compress_file(path, compression)
+                size = os.path.getsize(compressed_path)
+                try:
+                    count, c_elapsed = bench_bulk(es, compressed_path, f"{bulk_index}-{compression}",
+                                                  args.chunk_size, args.threads, compression)
+                finally:
+                    os.remove(compressed_path)
+                print(f"  {compression:<8} {size / (1024 * 1024):>8.1f}MB {f'x{raw_size / size:.1f}':>7} "
+                      f"{c_elapsed:>9.2f}s {count / c_elapsed if c_elapsed else 0:>10,.0f}")
+    finally:
+        es.indices.delete(index=f"{per_doc_index},{bulk_index}*", ignore_unavailable=True)
+        os.remove(path)
+        os.rmdir(tmp_dir)
+
+
+def generate_hits(count):
+    """Hits de formes mélangées : logs applicatifs, événements, commandes, génériques et canonicalisés"""
+    shapes = [
+        lambda i: {'@timestamp': f'2025-12-21T10:{i % 60:02d}:00', 'Level': random.choice(['INFO', 'ERROR']),
+                   'Service': f'service-{i % 7}', 'Message': f'Request {i} processed', 'User': f'user{i % 100}'},
+        lambda i: {'@timestamp': f'2025-12-21T10:{i % 60:02d}:00', 'event': 'add_to_cart',
+                   'user': f'user{i % 100}', 'page': f'/product/{i}'},
+        lambda i: {'@timestamp': f'2025-12-21T10:{i % 60:02d}:00', 'order_id': f'ORD-{i:08d}',
+                   'customer_name': f'Customer {i}', 'product_name': f'Product {i % 2000}',
+                   'total_amount': round(random.uniform(5, 500), 2)},
+        lambda i: {'@timestamp': f'2025-12-21T10:{i % 60:02d}:00', 'severity': 'WARN',
+                   'msg': f'Slow query {i}', 'component': 'db'},
+        lambda i: {'@timestamp': f'2025-12-21T10:{i % 60:02d}:00', 'level': 'INFO', 'service': 'api',
+                   'message': f'Request {i}', 'user': f'user{i % 100}', 'canonical_version': 1},
+    ]
+    return [{'_id': str(i), '_source': random.choice(shapes)(i)} for i in range(count)]
+
+
+def _legacy_normalize(hit):
+    """Normalisation historique de app.py : closure redéfinie et douze sondes de dict par hit"""
+    source = hit['_source']
+
+    def get_service_name(src):
+        service_fields = ['Service', 'service', 'source', 'Source', 'event', 'Event',
+                          'application', 'Application', 'app', 'App', 'component', 'Component']
+        for field in service_fields:
+            if field in src and src[field]:
+                return src[field]
+        if 'product_name' in src or 'customer_name' in src:
+            return 'E-commerce'
+        return 'Application'
+
+    if 'Level' in source:
+        return {"_id": hit['_id'], "timestamp": source.get('@timestamp', ''), "level": source.get('Level', ''),
+                "service": get_service_name(source), "message": source.get('Message', ''),
+                "user": source.get('User', '')}
+    if 'event' in source:
+        return {"_id": hit['_id'], "timestamp": source.get('@timestamp', ''), "level": "INFO",
+                "service": source.get('event', 'E-commerce'),
+                "message": f"{source.get('event', '')} - User: {source.get('user', '')} - Page: {source.get('page', '')}",
+                "user": source.get('user', '')}
+    return {"_id": hit['_id'], "timestamp": source.get('@timestamp', ''),
+            "level": source.get('level', source.get('severity', 'INFO')),
+            "service": get_service_name(source),
+            "message": source.get('message', source.get('msg', str(source))),
+            "user": source.get('user', source.get('User', ''))}
+
+
+def run_normalize_benchmark(args):
+    """Compare la normalisation historique et le HitNormalizer compilé (sans Elasticsearch)"""
+    hits = generate_hits(args.hits)
+    normalizer = HitNormalizer()
+    print_header(f"BENCHMARK NORMALISATION - {args.hits} hits, {args.rounds} tours")
+
+    results = {}
+    for name, normalize in (('historique', _legacy_normalize), ('compilé', normalizer.hit)):
+        normalize(hits[0])  # premier plan compilé hors mesure
+        best = None
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for hit in hits:
+                normalize(hit)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+        print(f"  {name:<11}: {best * 1000:8.2f} ms -> {len(hits) / best:>12,.0f} hits/sec")
+
+    print(f"\n  Plans compilés: {normalizer.plan_count}")
+    print(f"  Accélération: x{results['historique'] / results['compilé']:.1f}")
+
+
+def generate_order_documents(count):
+    """Commandes uploadées : 17 colonnes + geoip, canonicalisées comme à l'ingestion"""
+    start = datetime(2025, 12, 1)
+    for i in range(count):
+        quantity = random.randint(1, 5)
+        unit_price = round(random.uniform(5, 500), 2)
+        yield canonicalize({
+            '@timestamp': (start + timedelta(seconds=i * 7)).isoformat(),
+            'timestamp': (start + timedelta(seconds=i * 7)).strftime('%Y-%m-%d %H:%M:%S'),
+            'order_id': f"ORD-{i:08d}",
+            'customer_id': f"CUST-{random.randint(1, 50000):06d}",
+            'customer_name': f"Customer {i % 5000}",
+            'customer_email': f"customer{i % 5000}@example.com",
+            'customer_ip': f"81.{i % 250}.{(i // 250) % 250}.{i % 200 + 1}",
+            'customer_country': random.choice(COUNTRIES),
+            'customer_city': f"City {i % 300}",
+            'product_id': f"PROD-{i % 2000:05d}",
+            'product_name': f"Product {i % 2000}",
+            'product_category': random.choice(CATEGORIES),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_amount': round(quantity * unit_price, 2),
+            'payment_method': random.choice(PAYMENT_METHODS),
+            'order_status': random.choice(STATUSES),
+            'shipping_method': random.choice(['standard', 'express']),
+            'geoip': {'country_name': random.choice(COUNTRIES), 'city_name': f"City {i % 300}",
+                      'location': {'lat': round(random.uniform(30, 55), 4), 'lon': round(random.uniform(-5, 15), 4)}},
+            'source_file': 'orders.csv',
+            'file_type': 'csv'
+        })
+
+
+def _timed_search(es, index, body, rounds, **params):
+    """Meilleure latence, taille du JSON reçu et took sur rounds requêtes"""
+    best, size, took = None, 0, 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = es.search(index=index, body=body, **params)
+        payload = json.dumps(response.body)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best, size, took = elapsed, len(payload), response['took']
+    return best, size, took
+
+
+def run_projection_benchmark(args):
+    """Compare _source complet et projection LOG_SOURCE + filter_path sur un corpus de commandes"""
+    es = Elasticsearch([args.es_host])
+    es.info()
+    index_name = f"bench-projection-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    print_header(f"BENCHMARK PROJECTION - {args.docs} documents, pages de {args.size} hits")
+
+    try:
+        actions = ({'_index': index_name, '_source': doc} for doc in generate_order_documents(args.docs))
+        BulkIndexer(es).index(actions)
+        es.indices.refresh(index=index_name)
+
+        body = {'query': {'match_all': {}}, 'size': args.size, 'sort': [{'@timestamp': {'order': 'desc'}}]}
+        full = _timed_search(es, index_name, body, args.rounds)
+        projected = _timed_search(es, index_name, dict(body, _source=LOG_SOURCE), args.rounds,
+                                  filter_path=LOG_FILTER_PATH)
+
+        print(f"\n  {'Requête':<12} {'JSON reçu':>12} {'took':>8} {'Latence':>10}")
+        for name, (elapsed, size, took) in (('_source', full), ('projection', projected)):
+            print(f"  {name:<12} {size / 1024:>10.1f}KB {took:>6}ms {elapsed * 1000:>8.1f}ms")
+        print(f"\n  Réduction du payload: {1 - projected[1] / full[1]:.0%}, "
+              f"de la latence: {1 - projected[0] / full[0]:.0%}")
+    finally:
+        es.indices.delete(index=index_name, ignore_unavailable=True)
+
+
+def _timed_export(es, index_name, batch_size, slices, ordered, compress):
+    """Durée et octets produits d'un export complet"""
+    exporter = HitExporter(es, batch_size=batch_size)
+    size = 0
+    start = time.perf_counter()
+    batches = exporter.batches(exporter.open(index_name), {'match_all': {}}, slices=slices, ordered=ordered)
+    for chunk in csv_chunks(batches, HitNormalizer().row, compress=compress):
+        size += len(chunk)
+    return time.perf_counter() - start, size
+
+
+def run_export_benchmark(args):
+    """Débit de l'export CSV : un seul curseur contre des tranches PIT parallèles"""
+    es = Elasticsearch([args.es_host])
+    es.info()
+    index_name = f"bench-export-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    print_header(f"BENCHMARK EXPORT - {args.docs} documents, lots de {args.batch_size}")
+
+    try:
+        es.indices.create(index=index_name, settings={'number_of_shards': args.shards, 'number_of_replicas': 0})
+        actions = ({'_index': index_name, '_source': doc} for doc in generate_order_documents(args.docs))
+        BulkIndexer(es).index(actions)
+        es.indices.refresh(index=index_name)
+
+        runs = [('1 curseur', 1, True, False),
+                (f'{args.slices} tranches, triées', args.slices, True, False),
+                (f'{args.slices} tranches, non triées', args.slices, False, False),
+                (f'{args.slices} tranches, gzip', args.slices, True, True)]
+        print(f"\n  {'Export':<28} {'Taille':>10} {'Durée':>9} {'Débit':>11}")
+        baseline = None
+        for name, slices, ordered, compress in runs:
+            elapsed, size = _timed_export(es, index_name, args.batch_size, slices, ordered, compress)
+            baseline = baseline or elapsed
+            print(f"  {name:<28} {size / 1024 / 1024:>8.1f}MB {elapsed:>8.2f}s "
+                  f"{size / 1024 / 1024 / elapsed:>7.1f}MB/s  x{baseline / elapsed:.1f}")
+    finally:
+        es.indices.delete(index=index_name, ignore_unavailable=True)
+
+
+def run_rollups_benchmark(args):
+    """Latence de /api/results : agrégations sur les commandes brutes contre rollups + queue brute"""
+    es = Elasticsearch([args.es_host])
+    es.info()
+    prefix = f"bench-rollups-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    print_header(f"BENCHMARK ROLLUPS - {args.docs} commandes sur {args.days} jours")
+
+    resolver = IndexResolver(es, prefix=prefix, ttl=0)
+    rollups = OrderRollups(es, resolver, rollup_index=f"{prefix}_hourly")
+    seconds = args.days * 86400 / args.docs
+    start = datetime.now() - timedelta(days=args.days)
+
+    def actions():
+        for i, doc in enumerate(generate_order_documents(args.docs)):
+            moment = start + timedelta(seconds=i * seconds)
+            doc['@timestamp'] = moment.isoformat()
+            yield {'_index': f"{prefix}-{moment.strftime('%Y.%m.%d')}", '_source': doc}
+
+    try:
+        # Index quotidiens avec les mappings de ecommerce-logs-* (keyword, scaled_float...)
+        ensure_index_templates(es)
+        es.indices.put_index_template(name=prefix, index_patterns=[f"{prefix}-*"],
+                                      composed_of=index_template()['composed_of'], priority=300)
+        BulkIndexer(es).index(actions())
+        es.indices.refresh(index=f"{prefix}-*")
+
+        began = time.perf_counter()
+        report = rollups.materialize()
+        print(f"\n  Matérialisation: {len(report['rolled'])} jours, {report['documents']} documents horaires "
+              f"en {time.perf_counter() - began:.1f}s")
+
+        print(f"\n  {'Requête':<22} {'Latence':>10}")
+        for name, use_rollups in (('commandes brutes', False), ('rollups + queue', True)):
+            best = None
+            for _ in range(args.rounds):
+                began = time.perf_counter()
+                rollups.results(use_rollups=use_rollups)
+                elapsed = time.perf_counter() - began
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"  {name:<22} {best * 1000:>8.1f}ms")
+    finally:
+        es.indices.delete(index=f"{prefix}-*,{prefix}_hourly", ignore_unavailable=True)
+        es.options(ignore_status=404).indices.delete_index_template(name=prefix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks du backend Flask')
+    parser.add_argument('--es-host', default=ELASTICSEARCH_HOST)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    upload = subparsers.add_parser('upload', help='Débit d\'indexation des uploads')
+    upload.add_argument('--rows', type=int, default=500000)
+    upload.add_argument('--per-doc-rows', type=int, default=20000,
+                        help='Nombre de lignes mesurées avec la boucle par document')
+    upload.add_argument('--chunk-size', type=int, default=1000)
+    upload.add_argument('--threads', type=int, default=1)
+    upload.add_argument('--no-compressed', dest='compressed', action='store_false',
+                        help='Ne pas comparer avec les fichiers gzip/zstd')
+    upload.set_defaults(func=run_upload_benchmark)
+
+    normalize = subparsers.add_parser('normalize', help='Normalisation des hits (search, export, dashboard)')
+    normalize.add_argument('--hits', type=int, default=10000)
+    normalize.add_argument('--rounds', type=int, default=5)
+    normalize.set_defaults(func=run_normalize_benchmark)
+
+    projection = subparsers.add_parser('projection', help='Payload et latence avec projection _source')
+    projection.add_argument('--docs', type=int, default=50000)
+    projection.add_argument('--size', type=int, default=1000, help='Hits par requête')
+    projection.add_argument('--rounds', type=int, default=10)
+    projection.set_defaults(func=run_projection_benchmark)
+
+    export = subparsers.add_parser('export', help='Débit de l\'export CSV (MB/s), tranches PIT parallèles')
+    export.add_argument('--docs', type=int, default=500000)
+    export.add_argument('--shards', type=int, default=4, help='Shards de l\'index de test')
+    export.add_argument('--slices', type=int, default=4)
+    export.add_argument('--batch-size', type=int, default=5000)
+    export.set_defaults(func=run_export_benchmark)
+
+    rollup = subparsers.add_parser('rollups', help='Latence de /api/results avec et sans rollups horaires')
+    rollup.add_argument('--docs', type=int, default=200000)
+    rollup.add_argument('--days', type=int, default=30)
+    rollup.add_argument('--rounds', type=int, default=10)
+    rollup.set_defaults(func=run_rollups_benchmark)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
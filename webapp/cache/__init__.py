@@ -5,6 +5,7 @@ Provides caching decorators, TTL management, and cache invalidation
 
 from .redis_cache import (
     cache_response,
+    params_cache_key,
     invalidate_cache,
     invalidate_pattern,
     invalidate_cache_type,
@@ -16,6 +17,7 @@ from .config import CacheConfig, CacheType, TTL_CONFIG
 
 __all__ = [
     'cache_response',
+    'params_cache_key',
     'invalidate_cache',
     'invalidate_pattern',
     'invalidate_cache_type',
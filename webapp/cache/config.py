@@ -31,6 +31,13 @@ class CacheConfig:
         CacheType.ANALYTICS: 600,      # 10 minutes - Statistiques temps réel
     }
     
+    # Recherches : TTL long pour une plage terminée (la clé porte la version des
+    # données des index couverts), court pour une plage ouverte ou qui inclut maintenant
+    SEARCH_TTL_CONFIG = {
+        "closed_range": 86400,  # 24 heures
+        "live": 30  # 30 secondes
+    }
+    
     # Préfixes des clés Redis par type
     KEY_PREFIXES: Dict[CacheType, str] = {
         CacheType.DASHBOARD: "cache:dashboard:",
@@ -204,18 +204,45 @@ def _generate_cache_key(prefix: str, request_obj) -> str:
     return f"{prefix}{key_hash}"
 
 
+def params_cache_key(cache_type: CacheType, params: Dict[str, Any], path: str = '') -> str:
+    """
+    Clé de cache canonique d'un jeu de paramètres déjà normalisés
+    
+    Indépendante de l'ordre des paramètres et de la méthode (GET ou corps POST)
+    """
+    key_str = json.dumps([path, params], sort_keys=True, separators=(',', ':'), default=str)
+    key_hash = hashlib.sha256(key_str.encode()).hexdigest()[:32]
+    return CacheConfig.build_cache_key(cache_type, key_hash)
+
+
+def _response_status(result) -> int:
+    """Code HTTP d'un retour de route Flask (Response ou tuple (response, status))"""
+    if isinstance(result, tuple):
+        if len(result) > 1 and isinstance(result[1], int):
+            return result[1]
+        result = result[0]
+    return getattr(result, 'status_code', 200)
+
+
 def cache_response(
     cache_type: CacheType,
     ttl: Optional[int] = None,
-    key_func: Optional[Callable] = None
+    key_func: Optional[Callable] = None,
+    ttl_func: Optional[Callable] = None
 ):
     """
     Décorateur pour cacher les réponses des routes Flask
     
+    Seules les réponses 200 sont mises en cache (une erreur passagère
+    d'Elasticsearch n'est pas servie pendant tout le TTL).
+    
     Args:
         cache_type: Type de cache (définit le préfixe et TTL par défaut)
         ttl: TTL custom en secondes (optionnel)
-        key_func: Fonction custom pour générer la clé (optionnel)
+        key_func: Fonction custom pour générer la clé, ou None pour ne pas
+            utiliser le cache (optionnel)
+        ttl_func: Fonction (request) -> TTL propre à la requête, ou None pour
+            ne pas utiliser le cache (optionnel, prioritaire sur ttl)
     
     Usage:
         @app.route('/api/dashboard')
@@ -228,10 +255,17 @@ def cache_response(
         def wrapper(*args, **kwargs):
             # Déterminer le TTL
             effective_ttl = ttl if ttl is not None else CacheConfig.get_ttl(cache_type)
+            if ttl_func is not None:
+                effective_ttl = ttl_func(request)
+                if effective_ttl is None:
+                    # Requête non cachable (état côté serveur, pagination par curseur...)
+                    return func(*args, **kwargs)
             
             # Générer la clé de cache
             if key_func:
                 cache_key = key_func(request)
+                if cache_key is None:
+                    return func(*args, **kwargs)
             else:
                 prefix = CacheConfig.get_key_prefix(cache_type)
                 cache_key = _generate_cache_key(prefix, request)
@@ -258,8 +292,8 @@ def cache_response(
             else:
                 data_to_cache = None
             
-            # Mettre en cache si possible
-            if data_to_cache is not None:
+            # Mettre en cache si possible (réponses 200 uniquement)
+            if data_to_cache is not None and _response_status(result) == 200:
                 success = cache_manager.set(cache_key, data_to_cache, effective_ttl)
                 if success:
                     print(f"[CACHE SET] {cache_key} (TTL: {effective_ttl}s)")
@@ -0,0 +1,61 @@
+"""
+Ingestion Module for Flask API
+Provides streaming, bulk and background ingestion of uploaded files
+into Elasticsearch and MongoDB
+"""
+
+from .bulk_indexer import BulkIndexer, BulkResult
+from .backpressure import AdaptiveBatchSize, bulk_metrics
+from .mongo_writer import BufferedMongoWriter
+from .readers import (
+    read_batches, iter_documents, iter_json_records, iter_ndjson_records,
+    iter_ndjson_range, iter_csv_range, split_byte_ranges, detect_format
+)
+from .pipeline import ingest_file
+from .jobs import IngestJob, JobManager, JobStatus
+from .chunked_upload import ChunkedUploadManager, ChunkedUploadError
+from .timestamps import TimestampNormalizer
+from .manifest import IngestManifest, ManifestAction
+from .doc_ids import document_id, document_route, event_index
+from .dead_letter import DeadLetterStore, MongoDeadLetterStore, NdjsonDeadLetterStore
+from .canonical import canonicalize, CANONICAL_VERSION
+from .index_templates import ensure_index_templates, SCHEMA_VERSION
+from .lifecycle import IndexLifecycleManager
+from .config import IngestConfig
+
+__all__ = [
+    'BulkIndexer',
+    'BulkResult',
+    'AdaptiveBatchSize',
+    'bulk_metrics',
+    'BufferedMongoWriter',
+    'read_batches',
+    'iter_documents',
+    'iter_json_records',
+    'iter_ndjson_records',
+    'iter_ndjson_range',
+    'iter_csv_range',
+    'split_byte_ranges',
+    'detect_format',
+    'ingest_file',
+    'IngestJob',
+    'JobManager',
+    'JobStatus',
+    'ChunkedUploadManager',
+    'ChunkedUploadError',
+    'TimestampNormalizer',
+    'IngestManifest',
+    'ManifestAction',
+    'document_id',
+    'document_route',
+    'event_index',
+    'DeadLetterStore',
+    'MongoDeadLetterStore',
+    'NdjsonDeadLetterStore',
+    'canonicalize',
+    'CANONICAL_VERSION',
+    'ensure_index_templates',
+    'SCHEMA_VERSION',
+    'IndexLifecycleManager',
+    'IngestConfig'
+]
@@ -0,0 +1,148 @@
+"""
+Bulk Backpressure
+AIMD batch sizing, jittered retry delays and process-wide metrics for the bulk indexer
+"""
+
+import random
+import threading
+from typing import Any, Dict, Optional
+
+from .config import IngestConfig
+
+
+def backoff_delay(attempt: int, initial: Optional[float] = None, maximum: Optional[float] = None) -> float:
+    """
+    Délai avant le retry n° attempt (backoff exponentiel avec jitter)
+
+    La moitié du délai est fixe, l'autre aléatoire : les indexeurs rejetés en
+    même temps ne reviennent pas tous au même instant.
+    """
+    initial = IngestConfig.BULK_INITIAL_BACKOFF if initial is None else initial
+    maximum = IngestConfig.BULK_MAX_BACKOFF if maximum is None else maximum
+    delay = min(maximum, initial * (2 ** max(attempt - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class AdaptiveBatchSize:
+    """
+    Taille de lot adaptative (AIMD)
+
+    Augmentation additive tant que les requêtes _bulk sont acceptées sous la
+    latence cible ; diminution multiplicative dès qu'Elasticsearch rejette des
+    documents (429) ou que la latence dépasse la cible.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[int] = None,
+        minimum: Optional[int] = None,
+        maximum: Optional[int] = None,
+        step: Optional[int] = None,
+        decrease_factor: Optional[float] = None,
+        target_latency: Optional[float] = None
+    ):
+        self.minimum = minimum or IngestConfig.BULK_MIN_CHUNK_SIZE
+        self.maximum = max(maximum or IngestConfig.BULK_MAX_CHUNK_SIZE, self.minimum)
+        self.step = step or IngestConfig.BULK_CHUNK_STEP
+        self.decrease_factor = decrease_factor or IngestConfig.BULK_DECREASE_FACTOR
+        self.target_latency = target_latency or IngestConfig.BULK_TARGET_LATENCY
+        self.size = self._clamp(initial or IngestConfig.BULK_CHUNK_SIZE)
+        self._lock = threading.Lock()
+
+    def _clamp(self, size: int) -> int:
+        return max(self.minimum, min(self.maximum, int(size)))
+
+    def record(self, latency: float, documents: int, rejected: int) -> int:
+        """
+        Ajuste la taille après une requête _bulk
+
+        Args:
+            latency: Durée de la requête (secondes)
+            documents: Nombre de documents envoyés
+            rejected: Nombre de documents rejetés en 429
+
+        Returns:
+            int: nouvelle taille de lot
+        """
+        with self._lock:
+            if rejected or latency > self.target_latency:
+                self.size = self._clamp(self.size * self.decrease_factor)
+            elif documents >= self.size:
+                # Seul un lot plein renseigne sur la capacité du cluster
+                self.size = self._clamp(self.size + self.step)
+            return self.size
+
+
+class BulkMetrics:
+    """Métriques de l'indexation bulk du processus (exposées par /api/ingest/stats)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batch_size: Optional[int] = None
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.requests = 0
+        self.documents = 0
+        self.rejected_requests = 0
+        self.rejected_documents = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.latency_ms = 0.0
+
+    def add_queued(self, documents: int):
+        """Documents lus et mis en lot, en attente d'acquittement (négatif à l'acquittement)"""
+        with self._lock:
+            self.queue_depth += documents
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_ended(self):
+        """Fin d'une requête, quelle qu'en soit l'issue (appelé dans un finally)"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def request_finished(self, latency: float, documents: int, rejected: int, batch_size: int):
+        """Statistiques d'une requête dont la réponse (ou l'erreur Elasticsearch) a été traitée"""
+        with self._lock:
+            self.requests += 1
+            self.documents += documents
+            self.batch_size = batch_size
+            if rejected:
+                self.rejected_requests += 1
+                self.rejected_documents += rejected
+            # Moyenne mobile exponentielle de la latence
+            latency_ms = latency * 1000
+            self.latency_ms = latency_ms if self.requests == 1 else 0.8 * self.latency_ms + 0.2 * latency_ms
+
+    def add_retries(self, documents: int):
+        with self._lock:
+            self.retries += documents
+
+    def add_exhausted(self, documents: int):
+        """Documents toujours rejetés après BULK_MAX_RETRIES (comptés en échec)"""
+        with self._lock:
+            self.exhausted += documents
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'batch_size': self.batch_size,
+                'in_flight': self.in_flight,
+                'max_in_flight': IngestConfig.BULK_MAX_IN_FLIGHT,
+                'queue_depth': self.queue_depth,
+                'requests': self.requests,
+                'documents': self.documents,
+                'rejected_requests': self.rejected_requests,
+                'rejected_documents': self.rejected_documents,
+                'retried_documents': self.retries,
+                'exhausted_retries': self.exhausted,
+                'latency_ms': round(self.latency_ms, 1)
+            }
+
+
+# Partagés par tous les BulkIndexer du processus (jobs d'upload, loaders)
+bulk_metrics = BulkMetrics()
+in_flight_limiter = threading.BoundedSemaphore(IngestConfig.BULK_MAX_IN_FLIGHT)
+
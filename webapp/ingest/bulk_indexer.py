@@ -0,0 +1,295 @@
+"""
+Bulk Indexer for Elasticsearch
+Streams documents to the _bulk API in bounded chunks and collects per-item errors
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from elasticsearch import ApiError, TransportError
+from elasticsearch.helpers import streaming_bulk, parallel_bulk, expand_action
+
+from .backpressure import AdaptiveBatchSize, backoff_delay, bulk_metrics, in_flight_limiter
+from .config import IngestConfig
+
+
+class BulkResult:
+    """Résultat agrégé d'une opération d'indexation bulk"""
+
+    def __init__(self, max_errors: int = IngestConfig.MAX_REPORTED_ERRORS):
+        self.indexed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.dead_lettered = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.max_errors = max_errors
+        self.started_at = time.time()
+        self.duration = 0.0
+
+    def add_success(self):
+        self.indexed += 1
+
+    def add_duplicate(self):
+        """Document déjà présent (op_type=create avec un _id existant)"""
+        self.duplicates += 1
+
+    def add_failure(self, item: Dict[str, Any]):
+        """Enregistre un échec (seules les premières erreurs sont détaillées)"""
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(item)
+
+    def finish(self):
+        self.duration = time.time() - self.started_at
+        return self
+
+    @property
+    def docs_per_sec(self) -> float:
+        return round(self.indexed / self.duration, 2) if self.duration > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'indexed': self.indexed,
+            'failed': self.failed,
+            'duplicates': self.duplicates,
+            'dead_lettered': self.dead_lettered,
+            'errors': self.errors,
+            'duration_seconds': round(self.duration, 3),
+            'docs_per_sec': self.docs_per_sec
+        }
+
+
+def _describe_failure(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Extrait les informations utiles d'un item en échec renvoyé par streaming_bulk"""
+    op_type, item = next(iter(info.items()))
+    error = item.get('error', item.get('exception'))
+    if isinstance(error, dict):
+        reason = f"{error.get('type', 'error')}: {error.get('reason', '')}"
+    else:
+        reason = str(error)
+    return {
+        'op_type': op_type,
+        'index': item.get('_index'),
+        'id': item.get('_id'),
+        'status': item.get('status'),
+        'reason': reason
+    }
+
+
+def _is_duplicate(info: Dict[str, Any]) -> bool:
+    """Un create en conflit (409) signifie que le document est déjà indexé"""
+    op_type, item = next(iter(info.items()))
+    return op_type == 'create' and item.get('status') == 409
+
+
+class BulkIndexer:
+    """
+    Indexeur bulk Elasticsearch
+
+    Consomme un itérable d'actions (format elasticsearch.helpers) sans le
+    matérialiser : les documents sont envoyés par lots bornés en nombre
+    (chunk_size) et en octets (max_chunk_bytes).
+
+    En mode adaptatif, la taille des lots suit la latence et les rejets 429
+    d'Elasticsearch (AIMD), les documents rejetés sont renvoyés avec un backoff
+    aléatoire et au plus thread_count requêtes par indexeur (BULK_MAX_IN_FLIGHT
+    pour tout le processus) sont en cours.
+    """
+
+    def __init__(
+        self,
+        es_client,
+        chunk_size: Optional[int] = None,
+        max_chunk_bytes: Optional[int] = None,
+        thread_count: Optional[int] = None,
+        max_errors: Optional[int] = None,
+        adaptive: Optional[bool] = None,
+        max_retries: Optional[int] = None
+    ):
+        self.es_client = es_client
+        self.chunk_size = chunk_size or IngestConfig.BULK_CHUNK_SIZE
+        self.max_chunk_bytes = max_chunk_bytes or IngestConfig.BULK_MAX_CHUNK_BYTES
+        self.thread_count = thread_count or IngestConfig.BULK_THREAD_COUNT
+        self.max_errors = max_errors if max_errors is not None else IngestConfig.MAX_REPORTED_ERRORS
+        self.adaptive = IngestConfig.BULK_ADAPTIVE if adaptive is None else adaptive
+        self.max_retries = max_retries if max_retries is not None else IngestConfig.BULK_MAX_RETRIES
+        self.batch_size = AdaptiveBatchSize(initial=chunk_size or bulk_metrics.batch_size)
+
+    def _results(self, actions: Iterable[Dict[str, Any]]):
+        """Choisit le mode adaptatif, streaming_bulk ou parallel_bulk selon la configuration"""
+        if self.adaptive:
+            return self._adaptive_results(actions)
+        if self.thread_count > 1:
+            return parallel_bulk(
+                self.es_client,
+                actions,
+                thread_count=self.thread_count,
+                chunk_size=self.chunk_size,
+                max_chunk_bytes=self.max_chunk_bytes,
+                raise_on_error=False,
+                raise_on_exception=False
+            )
+        return streaming_bulk(
+            self.es_client,
+            actions,
+            chunk_size=self.chunk_size,
+            max_chunk_bytes=self.max_chunk_bytes,
+            raise_on_error=False,
+            raise_on_exception=False
+        )
+
+    # --- Mode adaptatif ---
+
+    def _batches(self, actions: Iterable[Dict[str, Any]]) -> Iterator[List[Tuple[Any, ...]]]:
+        """Découpe les actions en lots (taille courante de l'AIMD, bornés en octets)"""
+        serializer = self.es_client.transport.serializers.get_serializer('application/json')
+        batch, size = [], 0
+        for action in actions:
+            header, data = expand_action(action)
+            header_bytes = serializer.dumps(header)
+            data_bytes = serializer.dumps(data) if data is not None else None
+            entry_size = len(header_bytes) + 1 + (len(data_bytes) + 1 if data_bytes is not None else 0)
+            if batch and (len(batch) >= self.batch_size.size or size + entry_size > self.max_chunk_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append((header, data, header_bytes, data_bytes))
+            size += entry_size
+        if batch:
+            yield batch
+
+    def _send(self, batch: List[Tuple[Any, ...]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        """
+        Envoie un lot et renvoie les documents rejetés (429) jusqu'à max_retries fois
+
+        Returns:
+            list de (ok, {op_type: item}) comme streaming_bulk
+        """
+        try:
+            return self._send_batch(batch)
+        finally:
+            bulk_metrics.add_queued(-len(batch))
+
+    def _send_batch(self, batch: List[Tuple[Any, ...]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        results = []
+        attempt = 0
+        while batch:
+            body = []
+            for _, _, header_bytes, data_bytes in batch:
+                body.append(header_bytes)
+                if data_bytes is not None:
+                    body.append(data_bytes)
+
+            in_flight_limiter.acquire()
+            bulk_metrics.request_started()
+            started = time.monotonic()
+            try:
+                response, error = self.es_client.bulk(operations=body), None
+            except (ApiError, TransportError) as e:
+                response, error = None, e
+            finally:
+                # Toute issue, y compris une exception inattendue, libère la place
+                latency = time.monotonic() - started
+                bulk_metrics.request_ended()
+                in_flight_limiter.release()
+
+            retry, rejected = [], 0
+            if error is not None:
+                status = getattr(error, 'status_code', None)
+                if status == 429:
+                    rejected = len(batch)
+                if status == 429 and attempt < self.max_retries:
+                    retry = batch
+                else:
+                    for header, data, _, _ in batch:
+                        op_type, meta = next(iter(header.items()))
+                        info = {'error': str(error), 'status': status, 'exception': error, **meta}
+                        if data is not None:
+                            info['data'] = data
+                        results.append((False, {op_type: info}))
+            else:
+                for entry, item in zip(batch, response['items']):
+                    op_type, info = next(iter(item.items()))
+                    status = info.get('status', 500)
+                    if status == 429:
+                        rejected += 1
+                        if attempt < self.max_retries:
+                            retry.append(entry)
+                            continue
+                    ok = 200 <= status < 300
+                    if not ok and entry[1] is not None:
+                        info['data'] = entry[1]
+                    results.append((ok, {op_type: info}))
+
+            new_size = self.batch_size.record(latency, len(batch), rejected)
+            bulk_metrics.request_finished(latency, len(batch), rejected, new_size)
+            if rejected and not retry:
+                bulk_metrics.add_exhausted(rejected)
+
+            batch = retry
+            if batch:
+                attempt += 1
+                bulk_metrics.add_retries(len(batch))
+                time.sleep(backoff_delay(attempt))
+        return results
+
+    def _adaptive_results(self, actions: Iterable[Dict[str, Any]]):
+        """Envoie les lots en parallèle (au plus thread_count requêtes en cours)"""
+        max_in_flight = max(1, self.thread_count)
+        pending = set()
+        batches = self._batches(actions)
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            while True:
+                # Le lot suivant n'est découpé qu'une fois un envoi possible : il suit la dernière taille de l'AIMD
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                bulk_metrics.add_queued(len(batch))
+                pending.add(pool.submit(self._send, batch))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+    def index(
+        self,
+        actions: Iterable[Dict[str, Any]],
+        on_progress: Optional[Callable[[BulkResult], None]] = None,
+        dead_letter=None,
+        source_file: Optional[str] = None
+    ) -> BulkResult:
+        """
+        Indexe toutes les actions et retourne un BulkResult
+
+        Args:
+            actions: Itérable (ou générateur) d'actions bulk
+            on_progress: Callback appelé avec le résultat partiel tous les chunk_size documents
+            dead_letter: DeadLetterStore recevant chaque document rejeté avec sa raison
+            source_file: Fichier d'origine enregistré avec les rejets
+
+        Returns:
+            BulkResult: compteurs indexed/failed et erreurs détaillées
+        """
+        result = BulkResult(max_errors=self.max_errors)
+        processed = 0
+        for ok, info in self._results(actions):
+            if ok:
+                result.add_success()
+            elif _is_duplicate(info):
+                result.add_duplicate()
+            else:
+                failure = _describe_failure(info)
+                result.add_failure(failure)
+                if dead_letter is not None:
+                    dead_letter.add(failure, next(iter(info.values())).get('data'), source_file)
+                    result.dead_lettered += 1
+            processed += 1
+            if on_progress is not None and processed % self.chunk_size == 0:
+                on_progress(result)
+        if dead_letter is not None:
+            dead_letter.flush()
+        return result.finish()
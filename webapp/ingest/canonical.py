@@ -0,0 +1,133 @@
+"""
+Canonical Log Fields
+Writes the unified level/service/message/user fields once at ingest, in Python and as an ES ingest pipeline
+"""
+
+from typing import Any, Dict
+
+
+# Version des règles ci-dessous (champ canonical_version des documents canonicalisés)
+CANONICAL_VERSION = 2
+
+CANONICAL_PIPELINE = 'ecommerce-logs-canonical'
+
+CANONICAL_FIELDS = ('level', 'service', 'message', 'user')
+
+# Champs candidats pour le service, par ordre de priorité
+SERVICE_FIELDS = ('Service', 'service', 'source', 'Source', 'event', 'Event',
+                  'application', 'Application', 'app', 'App', 'component', 'Component')
+
+# Champs lus par les règles : suffisent pour canonicaliser un document ancien (voir query/projection.py)
+LEGACY_SOURCE_FIELDS = ('@timestamp', 'Level', 'Message', 'User', 'level', 'severity', 'message', 'msg',
+                        'user', 'page', 'product_name', 'customer_name') + SERVICE_FIELDS
+
+
+def _service(source: Dict[str, Any]) -> Any:
+    for field in SERVICE_FIELDS:
+        value = source.get(field)
+        # Un objet ou une liste n'est pas un nom de service (champ keyword)
+        if value and not isinstance(value, (dict, list)):
+            return value
+    # Pas de champ service : déduit du contenu
+    if 'product_name' in source or 'customer_name' in source:
+        return 'E-commerce'
+    return 'Application'
+
+
+def canonical_fields(source: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Champs canonicaux d'un document selon sa forme
+
+    Log applicatif (Level/Service/Message/User), événement e-commerce (event
+    texte, user, page) ou document générique (level/severity, message/msg).
+    Un message déjà présent n'est jamais remplacé ; un document générique
+    sans message ni msg reçoit un message vide.
+    """
+    if 'Level' in source:
+        return {
+            'level': source.get('Level', ''),
+            'service': _service(source),
+            'message': source['message'] if 'message' in source else source.get('Message', ''),
+            'user': source.get('User', '')
+        }
+    if isinstance(source.get('event'), str):
+        return {
+            'level': 'INFO',
+            'service': source.get('event', 'E-commerce'),
+            'message': f"{source.get('event', '')} - User: {source.get('user', '')} - Page: {source.get('page', '')}",
+            'user': source.get('user', '')
+        }
+    return {
+        'level': source.get('level', source.get('severity', 'INFO')),
+        'service': _service(source),
+        'message': source.get('message', source.get('msg', '')),
+        'user': source.get('user', source.get('User', ''))
+    }
+
+
+def canonicalize(source: Dict[str, Any]) -> Dict[str, Any]:
+    """Ajoute les champs canonicaux au document (en place, idempotent) et le renvoie"""
+    if source.get('canonical_version') != CANONICAL_VERSION:
+        source.update(canonical_fields(source))
+        source['canonical_version'] = CANONICAL_VERSION
+    return source
+
+
+# Mêmes règles en Painless pour les documents qui n'ont pas été canonicalisés par
+# Python (Logstash) : pipeline par défaut des index ecommerce-logs-*
+_PAINLESS = """
+if (ctx.canonical_version != null && ctx.canonical_version == params.version) { return; }
+def service = null;
+for (def field : params.service_fields) {
+  def value = ctx[field];
+  if (value != null && value != '' && value != false && !(value instanceof Map) && !(value instanceof List)) {
+    service = value; break;
+  }
+}
+if (service == null) {
+  service = (ctx.containsKey('product_name') || ctx.containsKey('customer_name')) ? 'E-commerce' : 'Application';
+}
+if (ctx.containsKey('Level')) {
+  ctx.level = ctx.Level; ctx.service = service;
+  if (!ctx.containsKey('message')) { ctx.message = ctx.containsKey('Message') ? ctx.Message : ''; }
+  ctx.user = ctx.containsKey('User') ? ctx.User : '';
+} else if (ctx.event instanceof String) {
+  def user = ctx.containsKey('user') ? ctx.user : '';
+  def page = ctx.containsKey('page') ? ctx.page : '';
+  ctx.level = 'INFO'; ctx.service = ctx.event;
+  ctx.message = ctx.event + ' - User: ' + user + ' - Page: ' + page;
+  ctx.user = user;
+} else {
+  if (!ctx.containsKey('level')) { ctx.level = ctx.containsKey('severity') ? ctx.severity : 'INFO'; }
+  ctx.service = service;
+  if (!ctx.containsKey('message')) { ctx.message = ctx.containsKey('msg') ? ctx.msg : ''; }
+  if (!ctx.containsKey('user')) { ctx.user = ctx.containsKey('User') ? ctx.User : ''; }
+}
+ctx.canonical_version = params.version;
+"""
+
+
+def ingest_pipeline() -> Dict[str, Any]:
+    """Pipeline d'ingestion Elasticsearch équivalent à canonicalize()"""
+    return {
+        'description': 'Canonical level/service/message/user fields of ecommerce-logs-* documents',
+        'version': CANONICAL_VERSION,
+        'processors': [{
+            'script': {
+                'lang': 'painless',
+                'source': _PAINLESS.strip(),
+                'params': {'version': CANONICAL_VERSION, 'service_fields': list(SERVICE_FIELDS)}
+            }
+        }]
+    }
+
+
+def ensure_ingest_pipeline(es_client) -> None:
+    """Installe (ou remplace) le pipeline de canonicalisation"""
+    body = ingest_pipeline()
+    es_client.ingest.put_pipeline(
+        id=CANONICAL_PIPELINE,
+        description=body['description'],
+        version=body['version'],
+        processors=body['processors']
+    )
@@ -0,0 +1,316 @@
+"""
+Resumable Chunked Uploads
+Writes upload chunks straight to UPLOAD_FOLDER and tracks received offsets in Redis
+"""
+
+import glob
+import io
+import math
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import IngestConfig
+
+
+class ChunkedUploadError(Exception):
+    """Erreur de protocole d'upload par morceaux (session inconnue, chunk invalide...)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ChunkedUploadManager:
+    """
+    Gestionnaire des uploads par morceaux (init / PUT chunk N / complete)
+
+    Le fichier est pré-alloué dans UPLOAD_FOLDER sous le nom <fichier>.part et
+    chaque chunk est écrit à son offset (index * chunk_size). L'ensemble des
+    chunks reçus est conservé dans Redis : un client interrompu interroge la
+    session pour connaître les chunks manquants et reprend là où il en était.
+
+    Au plus CHUNKED_MAX_OPEN_SESSIONS sessions en cours d'upload à la fois
+    (chacune réserve jusqu'à CHUNKED_MAX_FILE_SIZE sur disque). Les .part
+    dont la session a expiré (upload abandonné) sont supprimés par sweep().
+    """
+
+    KEY_PREFIX = 'upload:session:'
+    OPEN_SESSIONS_KEY = 'upload:sessions:open'
+
+    def __init__(self, redis_client, upload_folder: str):
+        self.redis_client = redis_client
+        self.upload_folder = upload_folder
+        self._last_sweep = float('-inf')
+
+    def _session_key(self, upload_id: str) -> str:
+        return f"{self.KEY_PREFIX}{upload_id}"
+
+    def _chunks_key(self, upload_id: str) -> str:
+        return f"{self.KEY_PREFIX}{upload_id}:chunks"
+
+    def _complete_key(self, upload_id: str) -> str:
+        return f"{self.KEY_PREFIX}{upload_id}:complete"
+
+    def _touch(self, upload_id: str):
+        """Prolonge la durée de vie de la session à chaque activité"""
+        self.redis_client.expire(self._session_key(upload_id), IngestConfig.CHUNKED_SESSION_TTL)
+        self.redis_client.expire(self._chunks_key(upload_id), IngestConfig.CHUNKED_SESSION_TTL)
+
+    def _load(self, upload_id: str) -> Dict[str, Any]:
+        session = self.redis_client.hgetall(self._session_key(upload_id))
+        if not session:
+            raise ChunkedUploadError('Upload session not found', 404)
+        for field in ('total_size', 'chunk_size', 'total_chunks'):
+            session[field] = int(session[field])
+        return session
+
+    def _open_sessions(self) -> Dict[str, Dict[str, Any]]:
+        """Sessions en cours d'upload ; les sessions expirées ou terminées sortent de l'ensemble"""
+        sessions = {}
+        for upload_id in self.redis_client.smembers(self.OPEN_SESSIONS_KEY):
+            session = self.redis_client.hgetall(self._session_key(upload_id))
+            if session and session.get('status') == 'uploading':
+                sessions[upload_id] = session
+            else:
+                self.redis_client.srem(self.OPEN_SESSIONS_KEY, upload_id)
+        return sessions
+
+    def _discard(self, upload_id: str):
+        self.redis_client.srem(self.OPEN_SESSIONS_KEY, upload_id)
+        self.redis_client.delete(self._session_key(upload_id))
+        self.redis_client.delete(self._chunks_key(upload_id))
+
+    def sweep(self, force: bool = False) -> List[str]:
+        """
+        Supprime les fichiers .part sans session en cours (upload abandonné, session expirée)
+
+        Exécuté au plus une fois par CHUNKED_SWEEP_INTERVAL (sauf force). Un
+        .part modifié depuis moins de CHUNKED_SWEEP_GRACE secondes est gardé :
+        sa session peut être en train d'être créée.
+
+        Returns:
+            list: noms des fichiers supprimés
+        """
+        now = time.monotonic()
+        if self.redis_client is None or (not force and now - self._last_sweep < IngestConfig.CHUNKED_SWEEP_INTERVAL):
+            return []
+        self._last_sweep = now
+        live = {f"{session['unique_filename']}.part" for session in self._open_sessions().values()}
+        cutoff = time.time() - IngestConfig.CHUNKED_SWEEP_GRACE
+        removed = []
+        for path in glob.glob(os.path.join(self.upload_folder, '*.part')):
+            name = os.path.basename(path)
+            try:
+                if name not in live and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed.append(name)
+            except OSError:
+                pass  # renommé ou supprimé entre-temps
+        return removed
+
+    def part_path(self, session: Dict[str, Any]) -> str:
+        return os.path.join(self.upload_folder, f"{session['unique_filename']}.part")
+
+    def final_path(self, session: Dict[str, Any]) -> str:
+        return os.path.join(self.upload_folder, session['unique_filename'])
+
+    def init(self, filename: str, file_type: str, total_size: int, chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ouvre une session d'upload et pré-alloue le fichier .part
+
+        Args:
+            filename: Nom de fichier déjà nettoyé (secure_filename)
+            file_type: Type détecté ('csv', 'json'...)
+            total_size: Taille totale annoncée en octets
+            chunk_size: Taille des chunks (bornée par CHUNKED_MAX_CHUNK_SIZE)
+        """
+        if total_size <= 0:
+            raise ChunkedUploadError('total_size must be positive')
+        if total_size > IngestConfig.CHUNKED_MAX_FILE_SIZE:
+            raise ChunkedUploadError(f'File too large (max {IngestConfig.CHUNKED_MAX_FILE_SIZE} bytes)', 413)
+        self.sweep()
+
+        chunk_size = min(chunk_size or IngestConfig.CHUNKED_DEFAULT_CHUNK_SIZE, IngestConfig.CHUNKED_MAX_CHUNK_SIZE)
+        upload_id = uuid.uuid4().hex
+        session = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'unique_filename': f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}",
+            'file_type': file_type,
+            'total_size': total_size,
+            'chunk_size': chunk_size,
+            'total_chunks': math.ceil(total_size / chunk_size),
+            'status': 'uploading',
+            'job_id': '',
+            'created_at': datetime.now().isoformat()
+        }
+
+        self.redis_client.hset(self._session_key(upload_id), mapping=session)
+        self._touch(upload_id)
+        # Ajout puis comptage : deux init simultanés ne peuvent pas dépasser la limite
+        self.redis_client.sadd(self.OPEN_SESSIONS_KEY, upload_id)
+        if len(self._open_sessions()) > IngestConfig.CHUNKED_MAX_OPEN_SESSIONS:
+            self._discard(upload_id)
+            raise ChunkedUploadError(
+                f'Too many uploads in progress (max {IngestConfig.CHUNKED_MAX_OPEN_SESSIONS}), retry later', 429)
+
+        # Pré-allocation (fichier creux) pour écrire les chunks dans n'importe quel ordre
+        try:
+            with open(self.part_path(session), 'wb') as f:
+                f.truncate(total_size)
+        except OSError:
+            self._discard(upload_id)
+            raise
+        return self.status(upload_id)
+
+    def write_chunk(self, upload_id: str, index: int, data: bytes) -> Dict[str, Any]:
+        """Écrit le chunk index à son offset (ré-envoyer un chunk est sans effet de bord)"""
+        session = self._load(upload_id)
+        if session['status'] != 'uploading':
+            raise ChunkedUploadError('Upload already completed', 409)
+        if index < 0 or index >= session['total_chunks']:
+            raise ChunkedUploadError(f"Chunk index out of range (0-{session['total_chunks'] - 1})")
+
+        offset = index * session['chunk_size']
+        expected = min(session['chunk_size'], session['total_size'] - offset)
+        if len(data) != expected:
+            raise ChunkedUploadError(f'Chunk {index} must be {expected} bytes, got {len(data)}')
+
+        with open(self.part_path(session), 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+        self.redis_client.sadd(self._chunks_key(upload_id), index)
+        self._touch(upload_id)
+        return self.status(upload_id)
+
+    def received_chunks(self, upload_id: str):
+        return sorted(int(i) for i in self.redis_client.smembers(self._chunks_key(upload_id)))
+
+    def has_chunk(self, upload_id: str, index: int) -> bool:
+        return bool(self.redis_client.sismember(self._chunks_key(upload_id), index))
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        """État de la session : chunks reçus / manquants pour la reprise"""
+        session = self._load(upload_id)
+        received = set(self.received_chunks(upload_id))
+        missing = [i for i in range(session['total_chunks']) if i not in received]
+
+        contiguous = missing[0] if missing else session['total_chunks']
+        return {
+            'upload_id': upload_id,
+            'filename': session['unique_filename'],
+            'file_type': session['file_type'],
+            'status': session['status'],
+            'total_size': session['total_size'],
+            'chunk_size': session['chunk_size'],
+            'total_chunks': session['total_chunks'],
+            'received_chunks': len(received),
+            'missing_chunks': missing,
+            'bytes_received': sum(min(session['chunk_size'], session['total_size'] - i * session['chunk_size'])
+                                  for i in received),
+            'contiguous_bytes': min(contiguous * session['chunk_size'], session['total_size']),
+            'job_id': session.get('job_id') or None
+        }
+
+    def complete(self, upload_id: str, on_complete: Optional[Callable[[Dict[str, Any]], str]] = None) -> Dict[str, Any]:
+        """
+        Vérifie que tous les chunks sont présents et publie le fichier final
+
+        Une seule requête finalise l'upload : elle prend un verrou Redis
+        (SET NX) avant le renommage et le garde jusqu'au passage en
+        'completed'. Un appel concurrent reçoit 409, on_complete (démarrage
+        de l'ingestion, renvoie l'identifiant du job) n'est exécuté qu'une
+        fois et seulement si aucun job n'est déjà attaché à la session.
+        """
+        state = self.status(upload_id)
+        if state['status'] == 'completed':
+            return state
+        if state['missing_chunks']:
+            raise ChunkedUploadError(f"{len(state['missing_chunks'])} chunks missing", 409)
+
+        lock = self._complete_key(upload_id)
+        if not self.redis_client.set(lock, '1', nx=True, ex=IngestConfig.CHUNKED_COMPLETE_LOCK_TTL):
+            raise ChunkedUploadError('Upload is already being completed', 409)
+        try:
+            session = self._load(upload_id)
+            if session['status'] == 'completed':  # finalisé entre status() et la prise du verrou
+                return self.status(upload_id)
+            # Reprise après un échec : le fichier peut déjà avoir été renommé
+            if os.path.exists(self.part_path(session)):
+                os.replace(self.part_path(session), self.final_path(session))
+            state = dict(self.status(upload_id), status='completed')
+            if on_complete is not None and not state['job_id']:
+                self.set_job(upload_id, on_complete(state))
+            self.redis_client.hset(self._session_key(upload_id), 'status', 'completed')
+            self.redis_client.srem(self.OPEN_SESSIONS_KEY, upload_id)
+            self._touch(upload_id)
+        finally:
+            self.redis_client.delete(lock)
+        return self.status(upload_id)
+
+    def set_job(self, upload_id: str, job_id: str):
+        self.redis_client.hset(self._session_key(upload_id), 'job_id', job_id)
+
+    def open_stream(self, upload_id: str) -> 'ChunkedFileReader':
+        """Flux binaire qui suit les chunks contigus reçus (ingestion avant la fin de l'upload)"""
+        session = self._load(upload_id)
+        path = self.final_path(session) if session['status'] == 'completed' else self.part_path(session)
+        # Sans tampon : le fichier est encore en cours d'écriture par d'autres requêtes
+        raw = open(path, 'rb', buffering=0)
+        return ChunkedFileReader(self, upload_id, raw, session['chunk_size'], session['total_size'])
+
+
+class ChunkedFileReader(io.RawIOBase):
+    """
+    Lecteur d'un fichier en cours d'upload
+
+    Ne lit jamais au-delà du dernier chunk contigu reçu : quand il rattrape
+    l'upload, il attend l'arrivée du chunk suivant. Le descripteur reste
+    valide après le renommage .part -> fichier final en fin d'upload.
+    """
+
+    def __init__(self, manager: ChunkedUploadManager, upload_id: str, raw, chunk_size: int, total_size: int):
+        self.manager = manager
+        self.upload_id = upload_id
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.total_size = total_size
+        self.position = 0
+        self._next_chunk = 0
+        self._watermark = 0
+
+    def readable(self):
+        return True
+
+    def _advance_watermark(self):
+        while self._watermark < self.total_size and self.manager.has_chunk(self.upload_id, self._next_chunk):
+            self._next_chunk += 1
+            self._watermark = min(self._next_chunk * self.chunk_size, self.total_size)
+
+    def readinto(self, buffer):
+        if self.position >= self.total_size:
+            return 0
+
+        deadline = time.monotonic() + IngestConfig.CHUNKED_STALL_TIMEOUT
+        while self.position >= self._watermark:
+            self._advance_watermark()
+            if self.position < self._watermark:
+                break
+            if time.monotonic() > deadline:
+                raise IOError(f"Upload {self.upload_id} stalled: no chunk received for "
+                              f"{IngestConfig.CHUNKED_STALL_TIMEOUT}s")
+            time.sleep(IngestConfig.CHUNKED_POLL_INTERVAL)
+
+        size = min(len(buffer), self._watermark - self.position)
+        self.raw.seek(self.position)
+        n = self.raw.readinto(memoryview(buffer)[:size])
+        self.position += n
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
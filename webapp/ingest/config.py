@@ -0,0 +1,87 @@
+"""
+Ingestion Configuration
+Defines batch sizes and limits used by the upload and loader indexing paths
+"""
+
+import os
+
+
+class IngestConfig:
+    """Configuration centralisée de l'ingestion (upload + loaders)"""
+
+    # Taille des lots envoyés à l'API _bulk (en documents)
+    BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 1000))
+
+    # Taille maximale d'une requête _bulk (en octets)
+    BULK_MAX_CHUNK_BYTES = int(os.getenv('BULK_MAX_CHUNK_BYTES', 10 * 1024 * 1024))  # 10MB
+
+    # Nombre de threads pour parallel_bulk (1 = streaming_bulk séquentiel)
+    BULK_THREAD_COUNT = int(os.getenv('BULK_THREAD_COUNT', 1))
+
+    # Nombre maximum d'erreurs détaillées conservées par opération
+    MAX_REPORTED_ERRORS = int(os.getenv('BULK_MAX_REPORTED_ERRORS', 20))
+
+    # Taille de lot adaptative (AIMD) pilotée par la latence et les rejets 429
+    BULK_ADAPTIVE = os.getenv('BULK_ADAPTIVE', 'true').lower() == 'true'
+    BULK_MIN_CHUNK_SIZE = int(os.getenv('BULK_MIN_CHUNK_SIZE', 100))
+    BULK_MAX_CHUNK_SIZE = int(os.getenv('BULK_MAX_CHUNK_SIZE', 5000))
+    BULK_CHUNK_STEP = int(os.getenv('BULK_CHUNK_STEP', 250))  # augmentation additive
+    BULK_DECREASE_FACTOR = float(os.getenv('BULK_DECREASE_FACTOR', 0.5))  # diminution multiplicative
+    BULK_TARGET_LATENCY = float(os.getenv('BULK_TARGET_LATENCY', 2.0))  # secondes par requête _bulk
+
+    # Rejets 429 (es_rejected_execution_exception) : retry avec backoff aléatoire
+    BULK_MAX_RETRIES = int(os.getenv('BULK_MAX_RETRIES', 8))
+    BULK_INITIAL_BACKOFF = float(os.getenv('BULK_INITIAL_BACKOFF', 0.5))  # secondes
+    BULK_MAX_BACKOFF = float(os.getenv('BULK_MAX_BACKOFF', 30.0))  # secondes
+
+    # Requêtes _bulk simultanées, tous indexeurs du processus confondus
+    BULK_MAX_IN_FLIGHT = int(os.getenv('BULK_MAX_IN_FLIGHT', 4))
+
+    # Documents rejetés (dead-letter) : collection MongoDB pour les uploads, NDJSON pour les loaders
+    DEAD_LETTER_COLLECTION = os.getenv('DEAD_LETTER_COLLECTION', 'dead_letters')
+    DEAD_LETTER_PATH = os.getenv('DEAD_LETTER_PATH', 'dead-letters.ndjson')
+    DEAD_LETTER_BATCH_SIZE = int(os.getenv('DEAD_LETTER_BATCH_SIZE', 500))
+
+    # Écritures MongoDB bufferisées (insert_many ordered=False)
+    MONGO_BATCH_SIZE = int(os.getenv('MONGO_BATCH_SIZE', 1000))
+    MONGO_MAX_BATCH_BYTES = int(os.getenv('MONGO_MAX_BATCH_BYTES', 8 * 1024 * 1024))  # 8MB
+    MONGO_FLUSH_INTERVAL = float(os.getenv('MONGO_FLUSH_INTERVAL', 2.0))  # secondes
+    MONGO_QUEUE_SIZE = int(os.getenv('MONGO_QUEUE_SIZE', 10000))
+
+    # Lecture streaming des fichiers uploadés
+    READ_BATCH_SIZE = int(os.getenv('READ_BATCH_SIZE', 1000))  # documents par lot
+    JSON_READ_SIZE = int(os.getenv('JSON_READ_SIZE', 64 * 1024))  # caractères lus par appel
+    MAX_JSON_DOCUMENT_BYTES = int(os.getenv('MAX_JSON_DOCUMENT_BYTES', 16 * 1024 * 1024))  # 16MB
+
+    # Jobs d'ingestion en arrière-plan
+    JOB_WORKERS = int(os.getenv('INGEST_WORKERS', 2))
+    JOB_BACKEND = os.getenv('INGEST_QUEUE_BACKEND', 'local')  # 'local' ou 'redis'
+    JOB_TTL = int(os.getenv('INGEST_JOB_TTL', 86400))  # état conservé 24h dans Redis
+    JOB_PROGRESS_INTERVAL = float(os.getenv('INGEST_PROGRESS_INTERVAL', 1.0))  # secondes
+    JOB_HISTORY_SIZE = int(os.getenv('INGEST_JOB_HISTORY', 200))  # jobs gardés en mémoire
+
+    # Uploads par morceaux (reprise après coupure)
+    CHUNKED_DEFAULT_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # 8MB
+    CHUNKED_MAX_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_MAX_CHUNK_SIZE', 32 * 1024 * 1024))  # 32MB
+    CHUNKED_MAX_FILE_SIZE = int(os.getenv('CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))  # 2GB
+    CHUNKED_SESSION_TTL = int(os.getenv('CHUNKED_UPLOAD_TTL', 86400))  # session conservée 24h
+    CHUNKED_POLL_INTERVAL = float(os.getenv('CHUNKED_UPLOAD_POLL_INTERVAL', 0.5))  # secondes
+    CHUNKED_STALL_TIMEOUT = float(os.getenv('CHUNKED_UPLOAD_STALL_TIMEOUT', 600))  # secondes
+    CHUNKED_COMPLETE_LOCK_TTL = int(os.getenv('CHUNKED_UPLOAD_COMPLETE_LOCK_TTL', 300))  # verrou de finalisation
+    CHUNKED_MAX_OPEN_SESSIONS = int(os.getenv('CHUNKED_UPLOAD_MAX_SESSIONS', 20))  # sessions en cours d'upload
+    CHUNKED_SWEEP_INTERVAL = int(os.getenv('CHUNKED_UPLOAD_SWEEP_INTERVAL', 300))  # nettoyage des .part orphelins
+    CHUNKED_SWEEP_GRACE = int(os.getenv('CHUNKED_UPLOAD_SWEEP_GRACE', 60))  # .part récents conservés (secondes)
+
+    # Template des index ecommerce-logs-* (voir index_templates.py)
+    TEMPLATE_REFRESH_INTERVAL = os.getenv('INDEX_REFRESH_INTERVAL', '5s')
+
+    # Cycle de vie des index quotidiens (voir lifecycle.py)
+    LIFECYCLE_WRITE_WINDOW_DAYS = int(os.getenv('LIFECYCLE_WRITE_WINDOW_DAYS', 2))  # jours encore écrits
+    LIFECYCLE_RETENTION_DAYS = int(os.getenv('LIFECYCLE_RETENTION_DAYS', 90))
+    LIFECYCLE_MAX_SEGMENTS = int(os.getenv('LIFECYCLE_MAX_SEGMENTS', 1))
+    LIFECYCLE_MAX_INDEX_BYTES = int(os.getenv('LIFECYCLE_MAX_INDEX_BYTES', 10 * 1024 ** 3))  # 10GB
+    LIFECYCLE_SNAPSHOT_REPOSITORY = os.getenv('LIFECYCLE_SNAPSHOT_REPOSITORY', '')  # vide : suppression sans snapshot
+
+    # Manifeste des fichiers indexés par les loaders (reprise incrémentale)
+    MANIFEST_PATH = os.getenv('INGEST_MANIFEST_PATH', '.ingest-manifest.sqlite')
+    MANIFEST_HEAD_BYTES = int(os.getenv('INGEST_MANIFEST_HEAD_BYTES', 64 * 1024))  # octets hashés
@@ -0,0 +1,279 @@
+"""
+Dead-Letter Store
+Keeps every document rejected by Elasticsearch with its error so it can be replayed in bulk
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from .bulk_indexer import BulkIndexer
+from .config import IngestConfig
+from .doc_ids import create_action
+
+
+def _entry_key(entry: Dict[str, Any]) -> str:
+    return f"{entry.get('index')}:{entry.get('id')}"
+
+
+class DeadLetterStore(ABC):
+    """
+    Base des stores de documents rejetés
+
+    Les échecs sont bufferisés puis écrits par lots (_write). Chaque entrée
+    garde le document d'origine, l'index, l'_id déterministe et la raison du
+    rejet : replay() renvoie les documents sans relire le fichier source.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or IngestConfig.DEAD_LETTER_BATCH_SIZE
+        self.added = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, failure: Dict[str, Any], document: Optional[Dict[str, Any]] = None,
+            source_file: Optional[str] = None):
+        """
+        Enregistre un document rejeté
+
+        Args:
+            failure: Échec décrit par _describe_failure (op_type, index, id, status, reason)
+            document: Source du document (None si le helper ne l'a pas renvoyée)
+            source_file: Fichier d'origine
+        """
+        entry = {
+            **failure,
+            'error_type': failure.get('reason', '').split(':', 1)[0],
+            'source_file': source_file,
+            'document': document,
+            'failed_at': datetime.now().isoformat(),
+            'attempts': 1
+        }
+        with self._lock:
+            self._buffer.append(entry)
+            self.added += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+        if entries:
+            self._write(entries)
+
+    # --- À implémenter par les stores ---
+
+    @abstractmethod
+    def _write(self, entries: List[Dict[str, Any]]):
+        """Écrit un lot d'entrées"""
+
+    @abstractmethod
+    def _select(self, source_file: Optional[str], error_type: Optional[str]) -> Iterator[Dict[str, Any]]:
+        """Entrées à rejouer, filtrées par fichier source et type d'erreur"""
+
+    @abstractmethod
+    def _resolve(self, replayed: Set[str], failures: Dict[str, Dict[str, Any]]):
+        """Supprime les entrées ré-indexées et met à jour celles toujours en échec"""
+
+    def count(self, source_file: Optional[str] = None, error_type: Optional[str] = None) -> int:
+        return sum(1 for _ in self._select(source_file, error_type))
+
+    # --- Rejeu ---
+
+    def replay(self, es_client, source_file: Optional[str] = None, error_type: Optional[str] = None,
+               chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ré-indexe les documents rejetés (après correction du mapping par exemple)
+
+        Les documents sont renvoyés en op_type=create avec leur _id d'origine :
+        un document déjà présent (409) est considéré comme rejoué.
+
+        Args:
+            es_client: Client Elasticsearch
+            source_file: Ne rejouer que les rejets de ce fichier
+            error_type: Ne rejouer que ce type d'erreur (ex: mapper_parsing_exception)
+            chunk_size: Documents par lot
+
+        Returns:
+            dict: replayed, failed (toujours en échec) et skipped (document absent)
+        """
+        self.flush()
+        chunk_size = chunk_size or IngestConfig.BULK_CHUNK_SIZE
+        stats = {'replayed': 0, 'failed': 0, 'skipped': 0}
+        replayed: Set[str] = set()
+        failures: Dict[str, Dict[str, Any]] = {}
+
+        batch: List[Dict[str, Any]] = []
+        for entry in self._select(source_file, error_type):
+            if entry.get('document') is None or entry.get('id') is None:
+                stats['skipped'] += 1
+                continue
+            batch.append(entry)
+            if len(batch) >= chunk_size:
+                self._replay_batch(es_client, batch, replayed, failures)
+                batch = []
+        if batch:
+            self._replay_batch(es_client, batch, replayed, failures)
+
+        self._resolve(replayed, failures)
+        stats['replayed'] = len(replayed)
+        stats['failed'] = len(failures)
+        return stats
+
+    def _replay_batch(self, es_client, batch: List[Dict[str, Any]], replayed: Set[str],
+                      failures: Dict[str, Dict[str, Any]]):
+        collector = _FailureCollector()
+        actions = (create_action(e['index'], e['document'], e['id']) for e in batch)
+        BulkIndexer(es_client).index(actions, dead_letter=collector)
+        still_failing = {_entry_key(f): f for f in collector.entries}
+        for entry in batch:
+            key = _entry_key(entry)
+            if key in still_failing:
+                failures[key] = still_failing[key]
+            else:
+                replayed.add(key)
+
+
+class _FailureCollector(DeadLetterStore):
+    """Collecte en mémoire les échecs d'un lot rejoué"""
+
+    def __init__(self):
+        super().__init__(batch_size=1)
+        self.entries: List[Dict[str, Any]] = []
+
+    def _write(self, entries):
+        self.entries.extend(entries)
+
+    def _select(self, source_file, error_type):
+        return (e for e in self.entries
+                if (source_file is None or e.get('source_file') == source_file)
+                and (error_type is None or e.get('error_type') == error_type))
+
+    def _resolve(self, replayed, failures):
+        # Le collecteur ne sert qu'à lire les échecs d'un replay : rien à persister
+        pass
+
+
+class NdjsonDeadLetterStore(DeadLetterStore):
+    """
+    Store NDJSON (loaders en ligne de commande)
+
+    Une entrée par ligne, ajoutée en O_APPEND par un seul write() : plusieurs
+    processus workers peuvent écrire dans le même fichier.
+    """
+
+    def __init__(self, path: Optional[str] = None, batch_size: Optional[int] = None):
+        super().__init__(batch_size)
+        self.path = path or IngestConfig.DEAD_LETTER_PATH
+
+    def _write(self, entries: List[Dict[str, Any]]):
+        data = ''.join(json.dumps(e, ensure_ascii=False, default=str) + '\n' for e in entries)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _iter_all(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _select(self, source_file, error_type):
+        for entry in self._iter_all():
+            if source_file is not None and entry.get('source_file') != source_file:
+                continue
+            if error_type is not None and entry.get('error_type') != error_type:
+                continue
+            yield entry
+
+    def _resolve(self, replayed, failures):
+        """Réécrit le fichier sans les entrées rejouées (remplacement atomique)"""
+        if not replayed and not failures:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            for entry in self._iter_all():
+                key = _entry_key(entry)
+                if key in replayed:
+                    continue
+                if key in failures:
+                    failure = failures[key]
+                    entry.update(status=failure['status'], reason=failure['reason'],
+                                 error_type=failure['error_type'], failed_at=failure['failed_at'],
+                                 attempts=entry.get('attempts', 1) + 1)
+                out.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        os.replace(tmp_path, self.path)
+
+
+class MongoDeadLetterStore(DeadLetterStore):
+    """
+    Store MongoDB (uploads de la webapp)
+
+    L'_id de l'entrée est « index:_id du document » : un document rejeté
+    plusieurs fois n'a qu'une entrée, dont le compteur attempts augmente.
+    """
+
+    def __init__(self, collection, batch_size: Optional[int] = None):
+        super().__init__(batch_size)
+        self.collection = collection
+
+    def _write(self, entries: List[Dict[str, Any]]):
+        operations = []
+        for entry in entries:
+            entry = dict(entry)
+            attempts = entry.pop('attempts')
+            operations.append(UpdateOne(
+                {'_id': _entry_key(entry)},
+                {'$set': entry, '$inc': {'attempts': attempts}},
+                upsert=True
+            ))
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            print(f"[ERROR] Could not write {len(entries)} dead-letter entries: {e}")
+
+    def _select(self, source_file, error_type):
+        query = {}
+        if source_file is not None:
+            query['source_file'] = source_file
+        if error_type is not None:
+            query['error_type'] = error_type
+        return iter(self.collection.find(query))
+
+    def count(self, source_file: Optional[str] = None, error_type: Optional[str] = None) -> int:
+        query = {k: v for k, v in (('source_file', source_file), ('error_type', error_type)) if v is not None}
+        return self.collection.count_documents(query)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Nombre d'entrées par fichier source et type d'erreur"""
+        pipeline = [
+            {'$group': {'_id': {'source_file': '$source_file', 'error_type': '$error_type'},
+                        'count': {'$sum': 1}, 'last_failed_at': {'$max': '$failed_at'}}},
+            {'$sort': {'count': -1}}
+        ]
+        return [
+            {**row['_id'], 'count': row['count'], 'last_failed_at': row['last_failed_at']}
+            for row in self.collection.aggregate(pipeline)
+        ]
+
+    def _resolve(self, replayed, failures):
+        if replayed:
+            self.collection.delete_many({'_id': {'$in': list(replayed)}})
+        if failures:
+            self.collection.bulk_write([
+                UpdateOne({'_id': key}, {
+                    '$set': {k: failure[k] for k in ('status', 'reason', 'error_type', 'failed_at')},
+                    '$inc': {'attempts': 1}
+                })
+                for key, failure in failures.items()
+            ], ordered=False)
@@ -0,0 +1,109 @@
+"""
+Deterministic Document IDs
+Derives stable _id values from document content so that retried ingestion is idempotent
+"""
+
+import hashlib
+import json
+import math
+import numbers
+import re
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+
+# Champs ajoutés par l'ingestion, exclus du hash (ils changent d'un essai à l'autre)
+ID_EXCLUDED_FIELDS = frozenset({'source_file', 'file_type', 'uploaded_at'})
+
+# Préfixe des index quotidiens (même nommage que Logstash: ecommerce-logs-%{+YYYY.MM.dd})
+INDEX_PREFIX = 'ecommerce-logs'
+
+# Index fixe des documents sans date d'événement (jamais l'index du jour de chargement)
+UNDATED_SUFFIX = 'undated'
+
+_NUMBER = re.compile(r'[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?')
+
+
+def _normalize_value(value: Any) -> Any:
+    """
+    Forme hashée d'une valeur, identique quel que soit le lecteur du fichier
+
+    Un CSV est lu en chaînes par csv.DictReader (scripts) et typé par pandas
+    (uploads) : nombres, booléens et vides sont ramenés à une même chaîne
+    ("42.50" et 42.5 -> "42.5", "" / NaN / None -> "", True / "true" -> "true").
+    """
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, numbers.Number):
+        if isinstance(value, float) and not math.isfinite(value):
+            return '' if math.isnan(value) else str(value)
+        text = str(value)
+    elif isinstance(value, str):
+        if value.lower() in ('true', 'false'):
+            return value.lower()
+        if not _NUMBER.fullmatch(value):
+            return value
+        text = value
+    else:
+        return value
+    return format(Decimal(text).normalize(), 'f')
+
+
+def document_id(source: Dict[str, Any], source_file: Optional[str] = None) -> str:
+    """
+    Calcule l'identifiant déterministe d'un document
+
+    Hash blake2b (128 bits) des champs du document, triés et normalisés, et
+    du nom du fichier source. Deux lignes identiques d'un même fichier ont
+    donc le même identifiant. source est le document brut tel que lu dans
+    le fichier (voir document_route).
+    """
+    payload = {
+        str(k): _normalize_value(v)
+        for k, v in source.items()
+        if k not in ID_EXCLUDED_FIELDS
+    }
+    data = json.dumps([source_file or '', payload], sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False, default=str)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def event_index(timestamp: Optional[datetime], prefix: str = INDEX_PREFIX) -> str:
+    """
+    Index quotidien de l'événement (date de l'événement, pas date d'ingestion)
+
+    Un document ré-ingéré un autre jour retombe ainsi dans le même index et
+    son _id déterministe y est dédupliqué. Sans date, le document va dans
+    l'index fixe <prefix>-undated, pour la même raison.
+    """
+    if timestamp is None:
+        return f"{prefix}-{UNDATED_SUFFIX}"
+    if timestamp.tzinfo is not None:
+        # Logstash nomme les index d'après la date UTC
+        timestamp = timestamp.astimezone(timezone.utc)
+    return f"{prefix}-{timestamp.strftime('%Y.%m.%d')}"
+
+
+def document_route(raw: Dict[str, Any], source_file: Optional[str], event_time: Optional[datetime],
+                   prefix: str = INDEX_PREFIX) -> Tuple[str, str]:
+    """
+    (_index, _id) d'un document, communs à tous les loaders (upload, scripts)
+
+    L'_id est calculé sur le document brut tel que lu dans le fichier, avant
+    normalisation du timestamp et ajout des champs d'ingestion ; l'index est
+    celui de la date de l'événement. Un même fichier chargé par n'importe
+    quel loader, n'importe quel jour, retombe sur les mêmes (_index, _id).
+    """
+    return event_index(event_time, prefix), document_id(raw, source_file)
+
+
+def create_action(index_name: str, source: Dict[str, Any], doc_id: str) -> Dict[str, Any]:
+    """Action bulk op_type=create : un document déjà présent renvoie 409 au lieu d'être dupliqué"""
+    return {'_op_type': 'create', '_index': index_name, '_id': doc_id, '_source': source}
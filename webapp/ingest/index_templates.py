@@ -0,0 +1,181 @@
+"""
+Index Templates
+Versioned mappings and settings of the ecommerce-logs-* indices, installed idempotently
+"""
+
+from typing import Any, Dict
+
+from elasticsearch import NotFoundError
+
+from .canonical import CANONICAL_PIPELINE, ensure_ingest_pipeline
+from .config import IngestConfig
+from .doc_ids import INDEX_PREFIX
+
+
+# À incrémenter à chaque modification des mappings ou des settings ci-dessous
+SCHEMA_VERSION = 5
+
+INDEX_TEMPLATE_NAME = 'ecommerce-logs-template'
+
+# Formats acceptés pour les timestamps bruts conservés dans les documents
+DATE_FORMATS = 'strict_date_optional_time||yyyy-MM-dd HH:mm:ss||epoch_millis'
+
+
+def _keyword(searchable: bool = False, legacy_keyword: bool = False) -> Dict[str, Any]:
+    """
+    Champ keyword (filtres term, agrégations) ; sous-champ .text pour la recherche plein texte
+
+    legacy_keyword garde le sous-champ .keyword des anciens mappings text + .keyword,
+    encore agrégé par les visualisations Kibana (create_kibana_visualizations.py).
+    """
+    field: Dict[str, Any] = {'type': 'keyword', 'ignore_above': 1024}
+    if searchable:
+        field['fields'] = {'text': {'type': 'text'}}
+    if legacy_keyword:
+        field.setdefault('fields', {})['keyword'] = {'type': 'keyword', 'ignore_above': 1024}
+    return field
+
+
+def _amount() -> Dict[str, Any]:
+    """Montant stocké en centimes (scaled_float) : plus compact qu'un double"""
+    return {'type': 'scaled_float', 'scaling_factor': 100}
+
+
+def _timestamp() -> Dict[str, Any]:
+    return {'type': 'date', 'format': DATE_FORMATS, 'ignore_malformed': True}
+
+
+def _component_templates() -> Dict[str, Dict[str, Any]]:
+    """Templates de composants : settings communs puis mappings logs, commandes et événements"""
+    return {
+        'ecommerce-settings': {
+            'settings': {
+                'number_of_shards': 1,
+                'number_of_replicas': 0,
+                'refresh_interval': IngestConfig.TEMPLATE_REFRESH_INTERVAL,
+                # Segments triés par date : les requêtes « derniers logs » s'arrêtent tôt
+                'index.sort.field': '@timestamp',
+                'index.sort.order': 'desc',
+                # Champs canonicaux des documents non canonicalisés par Python (Logstash)
+                'index.default_pipeline': CANONICAL_PIPELINE
+            },
+            'mappings': {
+                'properties': {
+                    '@timestamp': {'type': 'date'},
+                    'source_file': _keyword(),
+                    'file_type': _keyword(),
+                    'uploaded_at': _timestamp(),
+                    'type': _keyword(),
+                    'tags': _keyword(),
+                    # Champs canonicaux (voir canonical.py), lus directement par les handlers
+                    'level': _keyword(),
+                    'service': _keyword(searchable=True),
+                    'message': {'type': 'match_only_text'},
+                    'user': _keyword(),
+                    'canonical_version': {'type': 'short'}
+                }
+            }
+        },
+        'ecommerce-logs-mappings': {
+            'mappings': {
+                'properties': {
+                    'Timestamp': _timestamp(),
+                    'Level': _keyword(searchable=True, legacy_keyword=True),
+                    'Service': _keyword(searchable=True, legacy_keyword=True),
+                    'Message': {'type': 'text'},
+                    'User': _keyword(searchable=True, legacy_keyword=True)
+                }
+            }
+        },
+        'ecommerce-orders-mappings': {
+            'mappings': {
+                'properties': {
+                    'timestamp': _timestamp(),
+                    'order_id': _keyword(),
+                    'customer_id': _keyword(),
+                    'customer_name': {'type': 'text', 'fields': {'keyword': {'type': 'keyword', 'ignore_above': 256}}},
+                    'customer_email': _keyword(),
+                    'customer_ip': {'type': 'ip', 'ignore_malformed': True},
+                    'customer_country': _keyword(searchable=True),
+                    'customer_city': _keyword(searchable=True),
+                    'product_id': _keyword(),
+                    'product_name': {'type': 'text', 'fields': {'keyword': {'type': 'keyword', 'ignore_above': 256}}},
+                    'product_category': _keyword(searchable=True),
+                    'quantity': {'type': 'integer'},
+                    'unit_price': _amount(),
+                    'total_amount': _amount(),
+                    'payment_method': _keyword(),
+                    'order_status': _keyword(),
+                    'shipping_method': _keyword(),
+                    'geoip': {'properties': {'location': {'type': 'geo_point'}}}
+                }
+            }
+        },
+        'ecommerce-events-mappings': {
+            'mappings': {
+                'properties': {
+                    'event_type': _keyword(searchable=True),
+                    'session_id': _keyword(),
+                    'user_id': _keyword(),
+                    'device': _keyword()
+                }
+            }
+        }
+    }
+
+
+def index_template() -> Dict[str, Any]:
+    """Template d'index composé des templates de composants"""
+    return {
+        'index_patterns': [f'{INDEX_PREFIX}-*'],
+        'composed_of': list(_component_templates()),
+        'priority': 200,
+        'version': SCHEMA_VERSION,
+        '_meta': {'managed_by': 'webapp.ingest.index_templates', 'schema_version': SCHEMA_VERSION}
+    }
+
+
+def _installed_version(es_client):
+    """Version du template installé (None s'il est absent, 0 s'il n'est pas versionné)"""
+    try:
+        response = es_client.indices.get_index_template(name=INDEX_TEMPLATE_NAME)
+    except NotFoundError:
+        return None
+    for item in response.get('index_templates', []):
+        if item.get('name') == INDEX_TEMPLATE_NAME:
+            return item['index_template'].get('version', 0)
+    return None
+
+
+def ensure_index_templates(es_client, force: bool = False) -> str:
+    """
+    Installe ou met à jour les templates si leur version est antérieure à SCHEMA_VERSION
+
+    Idempotent : appelé au démarrage de la webapp et de chaque loader, il ne
+    réécrit rien quand les templates sont à jour. Les nouveaux mappings
+    s'appliquent aux index créés ensuite (index quotidiens).
+
+    Returns:
+        str: 'created', 'updated' ou 'unchanged'
+    """
+    installed = _installed_version(es_client)
+    if not force and installed is not None and installed >= SCHEMA_VERSION:
+        return 'unchanged'
+
+    # Le pipeline par défaut doit exister avant la création d'un index qui le référence
+    ensure_ingest_pipeline(es_client)
+    for name, template in _component_templates().items():
+        es_client.cluster.put_component_template(
+            name=name, template=template, version=SCHEMA_VERSION,
+            meta={'schema_version': SCHEMA_VERSION}
+        )
+    body = index_template()
+    es_client.indices.put_index_template(
+        name=INDEX_TEMPLATE_NAME,
+        index_patterns=body['index_patterns'],
+        composed_of=body['composed_of'],
+        priority=body['priority'],
+        version=body['version'],
+        meta=body['_meta']
+    )
+    return 'created' if installed is None else 'updated'
@@ -0,0 +1,286 @@
+"""
+Background Ingestion Jobs
+Runs upload ingestion in a worker pool with progress tracked in memory and Redis
+"""
+
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from .config import IngestConfig
+
+
+class JobStatus:
+    """États possibles d'un job d'ingestion"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    @staticmethod
+    def is_terminal(status):
+        return status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+
+class IngestJob:
+    """Job d'ingestion d'un fichier uploadé et sa progression"""
+
+    # Champs de l'état persisté jamais renvoyés aux clients (chemins du serveur)
+    PRIVATE_FIELDS = ('filepath',)
+
+    def __init__(self, filepath: str, file_type: str, filename: str, total_bytes: int,
+                 job_id: Optional[str] = None, **state):
+        self.id = job_id or uuid.uuid4().hex
+        self.filepath = filepath
+        self.file_type = file_type
+        self.filename = filename
+        self.total_bytes = total_bytes
+        self.status = state.get('status', JobStatus.QUEUED)
+        self.rows_processed = state.get('rows_processed', 0)
+        self.rows_failed = state.get('rows_failed', 0)
+        self.bytes_read = state.get('bytes_read', 0)
+        self.errors = state.get('errors', [])
+        self.result = state.get('result')
+        self.created_at = state.get('created_at', datetime.now().isoformat())
+        self.started_at = state.get('started_at')
+        self.finished_at = state.get('finished_at')
+        # Upload par morceaux en cours : le job lit le fichier au fil des chunks reçus
+        self.upload_id = state.get('upload_id')
+        self.progress_callback: Optional[Callable[..., None]] = None
+
+    def update_progress(self, rows_processed: int, rows_failed: int, bytes_read: int, errors=None):
+        self.rows_processed = rows_processed
+        self.rows_failed = rows_failed
+        self.bytes_read = min(bytes_read, self.total_bytes) if self.total_bytes else bytes_read
+        if errors is not None:
+            self.errors = list(errors)
+
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = datetime.fromisoformat(self.finished_at) if self.finished_at else datetime.now()
+        return max((end - datetime.fromisoformat(self.started_at)).total_seconds(), 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Représentation JSON exposée par /api/upload/jobs/<id>"""
+        elapsed = self.elapsed_seconds()
+        rows_per_sec = round(self.rows_processed / elapsed, 2) if elapsed > 0 else 0.0
+
+        progress = 0.0
+        eta_seconds = None
+        if self.status == JobStatus.COMPLETED:
+            progress = 100.0
+            eta_seconds = 0
+        elif self.total_bytes and self.bytes_read:
+            progress = round(self.bytes_read / self.total_bytes * 100, 1)
+            if self.status == JobStatus.RUNNING and elapsed > 0:
+                eta_seconds = round(elapsed * (self.total_bytes - self.bytes_read) / self.bytes_read, 1)
+
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'file_type': self.file_type,
+            'total_bytes': self.total_bytes,
+            'bytes_read': self.bytes_read,
+            'progress': progress,
+            'rows_processed': self.rows_processed,
+            'rows_failed': self.rows_failed,
+            'rows_per_sec': rows_per_sec,
+            'eta_seconds': eta_seconds,
+            'errors': self.errors,
+            'result': self.result,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'upload_id': self.upload_id,
+            'elapsed_seconds': round(elapsed, 2)
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        """État persisté dans Redis (relu par from_dict) : to_dict() et le chemin du fichier"""
+        return dict(self.to_dict(), filepath=self.filepath)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'IngestJob':
+        data = dict(data)
+        return cls(
+            filepath=data.pop('filepath'),
+            file_type=data.pop('file_type'),
+            filename=data.pop('filename'),
+            total_bytes=data.pop('total_bytes', 0),
+            job_id=data.pop('job_id'),
+            **data
+        )
+
+
+class JobManager:
+    """
+    Gestionnaire des jobs d'ingestion en arrière-plan
+
+    - Mode 'local' : les jobs sont exécutés par un ThreadPoolExecutor du process.
+    - Mode 'redis' : les jobs sont poussés dans une liste Redis partagée et
+      consommés par les workers de toutes les répliques de la webapp (le
+      dossier d'upload doit alors être un volume partagé).
+
+    Dans les deux modes, l'état des jobs est copié dans Redis (si disponible)
+    pour que n'importe quelle réplique puisse répondre au polling.
+    """
+
+    KEY_PREFIX = 'ingest:job:'
+    QUEUE_KEY = 'ingest:queue'
+
+    def __init__(
+        self,
+        runner: Callable[[IngestJob], Dict[str, Any]],
+        redis_client=None,
+        max_workers: Optional[int] = None,
+        backend: Optional[str] = None
+    ):
+        self.runner = runner
+        self.redis_client = redis_client
+        self.max_workers = max_workers or IngestConfig.JOB_WORKERS
+        self.backend = backend or IngestConfig.JOB_BACKEND
+        if self.backend == 'redis' and redis_client is None:
+            print("[WARNING] Redis queue requested but Redis is unavailable, using local worker pool")
+            self.backend = 'local'
+
+        self._jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest-job')
+        self._consumers_started = False
+
+    # --- Persistance de l'état ---
+
+    def _save(self, job: IngestJob):
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.setex(
+                f"{self.KEY_PREFIX}{job.id}",
+                IngestConfig.JOB_TTL,
+                json.dumps(job.to_state())
+            )
+        except Exception as e:
+            print(f"[WARNING] Could not persist job {job.id}: {e}")
+
+    def _prune(self):
+        """Oublie les jobs terminés les plus anciens (l'état reste dans Redis)"""
+        finished = [j for j in self._jobs.values() if JobStatus.is_terminal(j.status)]
+        excess = len(self._jobs) - IngestConfig.JOB_HISTORY_SIZE
+        for job in sorted(finished, key=lambda j: j.finished_at or '')[:max(excess, 0)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retourne l'état d'un job (local d'abord, puis Redis)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+
+        if self.redis_client is not None:
+            try:
+                data = self.redis_client.get(f"{self.KEY_PREFIX}{job_id}")
+                if data:
+                    return {name: value for name, value in json.loads(data).items()
+                            if name not in IngestJob.PRIVATE_FIELDS}
+            except Exception as e:
+                print(f"[WARNING] Could not read job {job_id}: {e}")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Nombre de jobs par statut (jobs connus de ce processus) et longueur de la file Redis"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        stats = {'backend': self.backend, 'workers': self.max_workers,
+                 'jobs': {status: statuses.count(status) for status in set(statuses)}}
+        if self.backend == 'redis':
+            try:
+                stats['queued'] = self.redis_client.llen(self.QUEUE_KEY)
+            except Exception as e:
+                print(f"[WARNING] Could not read ingestion queue length: {e}")
+        return stats
+
+    # --- Soumission / exécution ---
+
+    def submit(self, job: IngestJob) -> IngestJob:
+        """Enregistre le job et le confie au pool local ou à la file Redis"""
+        if self.backend == 'redis':
+            # L'état fait foi dans Redis : une autre réplique peut exécuter le job
+            self._save(job)
+            self.redis_client.rpush(self.QUEUE_KEY, job.id)
+            self.start_consumers()
+            return job
+
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._save(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def run_sync(self, job: IngestJob) -> IngestJob:
+        """Exécute un job dans le thread appelant (mode ?wait=true)"""
+        with self._lock:
+            self._jobs[job.id] = job
+        self._run(job)
+        return job
+
+    def _run(self, job: IngestJob):
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now().isoformat()
+        self._save(job)
+
+        last_save = [time.monotonic()]
+
+        def on_progress(rows_processed, rows_failed, bytes_read, errors=None):
+            job.update_progress(rows_processed, rows_failed, bytes_read, errors)
+            # Limiter les écritures Redis pendant l'ingestion
+            now = time.monotonic()
+            if now - last_save[0] >= IngestConfig.JOB_PROGRESS_INTERVAL:
+                last_save[0] = now
+                self._save(job)
+
+        job.progress_callback = on_progress
+        try:
+            job.result = self.runner(job)
+            job.status = JobStatus.COMPLETED
+        except Exception as e:
+            print(f"[ERROR] Ingestion job {job.id} failed: {e}")
+            job.errors = job.errors + [{'reason': str(e)}]
+            job.status = JobStatus.FAILED
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            self._save(job)
+
+    def start_consumers(self):
+        """Démarre les threads consommateurs de la file Redis (mode 'redis')"""
+        with self._lock:
+            if self._consumers_started or self.backend != 'redis':
+                return
+            self._consumers_started = True
+        for _ in range(self.max_workers):
+            self._executor.submit(self._consume_queue)
+
+    def _consume_queue(self):
+        while True:
+            try:
+                item = self.redis_client.blpop(self.QUEUE_KEY, timeout=5)
+                if item is None:
+                    continue
+                job_id = item[1]
+                data = self.redis_client.get(f"{self.KEY_PREFIX}{job_id}")
+                if not data:
+                    continue
+                job = IngestJob.from_dict(json.loads(data))
+                with self._lock:
+                    self._prune()
+                    self._jobs[job.id] = job
+                self._run(job)
+            except Exception as e:
+                print(f"[ERROR] Ingestion queue consumer: {e}")
+                time.sleep(1)
@@ -0,0 +1,235 @@
+"""
+Index Lifecycle
+Force-merges, write-blocks and expires the daily ecommerce-logs-* indices by the date in their name
+"""
+
+import re
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from elasticsearch import ApiError, TransportError
+
+from .config import IngestConfig
+from .doc_ids import INDEX_PREFIX
+
+
+READ_ONLY = 'read_only'
+DROP_REPLICAS = 'drop_replicas'
+FORCEMERGE = 'forcemerge'
+SNAPSHOT = 'snapshot'
+DELETE = 'delete'
+
+# Un force-merge ou un snapshot d'un gros index dépasse largement le timeout par défaut
+LONG_REQUEST_TIMEOUT = 3600
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class IndexLifecycleManager:
+    """
+    Cycle de vie des index quotidiens
+
+    L'âge d'un index est celui du jour de son nom (et non de sa date de
+    création : un backfill crée aujourd'hui des index de l'an dernier, ce qui
+    fausserait une politique ILM). Les index quotidiens « roulent » déjà
+    chaque jour ; passé LIFECYCLE_WRITE_WINDOW_DAYS un jour n'est plus écrit :
+    blocage des écritures, suppression des réplicas (jamais allouées sur un
+    seul nœud) et force-merge à LIFECYCLE_MAX_SEGMENTS segments. Passé
+    LIFECYCLE_RETENTION_DAYS l'index est supprimé, après un snapshot si un
+    dépôt est configuré.
+    """
+
+    def __init__(self, es_client, prefix: Optional[str] = None,
+                 write_window_days: Optional[int] = None, retention_days: Optional[int] = None,
+                 max_segments: Optional[int] = None, snapshot_repository: Optional[str] = None,
+                 max_index_bytes: Optional[int] = None):
+        self.es_client = es_client
+        self.prefix = prefix or INDEX_PREFIX
+        self.write_window_days = (IngestConfig.LIFECYCLE_WRITE_WINDOW_DAYS
+                                  if write_window_days is None else write_window_days)
+        self.retention_days = IngestConfig.LIFECYCLE_RETENTION_DAYS if retention_days is None else retention_days
+        self.max_segments = max_segments or IngestConfig.LIFECYCLE_MAX_SEGMENTS
+        self.snapshot_repository = (IngestConfig.LIFECYCLE_SNAPSHOT_REPOSITORY
+                                    if snapshot_repository is None else snapshot_repository)
+        self.max_index_bytes = max_index_bytes or IngestConfig.LIFECYCLE_MAX_INDEX_BYTES
+        self._pattern = re.compile(rf'^{re.escape(self.prefix)}-(\d{{4}})\.(\d{{2}})\.(\d{{2}})$')
+
+    @property
+    def wildcard(self) -> str:
+        return f"{self.prefix}-*"
+
+    def _day(self, name: str) -> Optional[date]:
+        match = self._pattern.match(name)
+        if not match:
+            return None
+        try:
+            return date(*(int(part) for part in match.groups()))
+        except ValueError:
+            return None
+
+    # --- État du cluster ---
+
+    def indices(self) -> List[Dict[str, Any]]:
+        """Index quotidiens du préfixe avec shards, segments, taille et blocage d'écriture"""
+        rows = self.es_client.cat.indices(
+            index=self.wildcard, h='index,status,pri,rep,docs.count,store.size',
+            bytes='b', format='json', expand_wildcards='open,closed'
+        )
+        stats = self.es_client.indices.stats(index=self.wildcard, metric='segments').get('indices', {})
+        settings = self.es_client.indices.get_settings(
+            index=self.wildcard, name='index.blocks.write', flat_settings=True
+        )
+
+        indices = []
+        for row in rows:
+            name = row['index']
+            day = self._day(name)
+            if day is None:
+                continue
+            primaries = _int(row.get('pri')) or 1
+            replicas = _int(row.get('rep'))
+            blocks = settings.get(name, {}).get('settings', {})
+            indices.append({
+                'index': name,
+                'day': day,
+                'status': row.get('status', 'open'),
+                'primaries': primaries,
+                'replicas': replicas,
+                'shards': primaries * (1 + replicas),
+                'segments': _int(stats.get(name, {}).get('total', {}).get('segments', {}).get('count')),
+                'docs': _int(row.get('docs.count')),
+                'size_bytes': _int(row.get('store.size')),
+                'write_blocked': str(blocks.get('index.blocks.write', 'false')).lower() == 'true'
+            })
+        indices.sort(key=lambda item: item['day'])
+        return indices
+
+    # --- Plan ---
+
+    def plan(self, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        Actions à appliquer à chaque index et leur effet sur shards et segments
+
+        Returns:
+            list: une étape par index quotidien, actions vides pour les jours encore écrits
+        """
+        today = today or datetime.now(timezone.utc).date()
+        steps = []
+        for state in self.indices():
+            age = (today - state['day']).days
+            actions: List[str] = []
+            shards_after = state['shards']
+            segments_after = state['segments']
+
+            if age >= self.retention_days:
+                if self.snapshot_repository:
+                    actions.append(SNAPSHOT)
+                actions.append(DELETE)
+                shards_after = segments_after = 0
+            elif age >= self.write_window_days and state['status'] == 'open':
+                if not state['write_blocked']:
+                    actions.append(READ_ONLY)
+                if state['replicas'] > 0:
+                    actions.append(DROP_REPLICAS)
+                    shards_after = state['primaries']
+                    segments_after = state['segments'] // (1 + state['replicas'])
+                if segments_after > self.max_segments * state['primaries']:
+                    actions.append(FORCEMERGE)
+                    segments_after = self.max_segments * state['primaries']
+
+            steps.append(dict(
+                state,
+                age_days=age,
+                actions=actions,
+                shards_after=shards_after,
+                segments_after=segments_after,
+                oversized=state['size_bytes'] > self.max_index_bytes
+            ))
+        return steps
+
+    @staticmethod
+    def report(steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Synthèse d'un plan : shards, segments et octets avant/après"""
+        deleted = [step for step in steps if DELETE in step['actions']]
+        return {
+            'indices': len(steps),
+            'indices_changed': sum(1 for step in steps if step['actions']),
+            'indices_deleted': len(deleted),
+            'shards_before': sum(step['shards'] for step in steps),
+            'shards_after': sum(step['shards_after'] for step in steps),
+            'segments_before': sum(step['segments'] for step in steps),
+            'segments_after': sum(step['segments_after'] for step in steps),
+            'bytes_deleted': sum(step['size_bytes'] for step in deleted),
+            'actions': {
+                action: sum(1 for step in steps if action in step['actions'])
+                for action in (READ_ONLY, DROP_REPLICAS, FORCEMERGE, SNAPSHOT, DELETE)
+            },
+            # La taille n'est pas un critère de rollover (un index par jour) : signalée seulement
+            'oversized': [step['index'] for step in steps if step['oversized']]
+        }
+
+    # --- Application ---
+
+    def _snapshot(self, index: str, today: date):
+        name = f"{index}-{today.strftime('%Y%m%d')}"
+        response = self.es_client.options(request_timeout=LONG_REQUEST_TIMEOUT).snapshot.create(
+            repository=self.snapshot_repository, snapshot=name, indices=index,
+            include_global_state=False, wait_for_completion=True
+        )
+        state = response.get('snapshot', {}).get('state')
+        if state != 'SUCCESS':
+            raise RuntimeError(f"snapshot {name} finished in state {state}")
+
+    def _run(self, action: str, index: str, today: date):
+        if action == READ_ONLY:
+            self.es_client.indices.put_settings(index=index, settings={'index.blocks.write': True})
+        elif action == DROP_REPLICAS:
+            self.es_client.indices.put_settings(index=index, settings={'index.number_of_replicas': 0})
+        elif action == FORCEMERGE:
+            self.es_client.options(request_timeout=LONG_REQUEST_TIMEOUT).indices.forcemerge(
+                index=index, max_num_segments=self.max_segments
+            )
+        elif action == SNAPSHOT:
+            self._snapshot(index, today)
+        elif action == DELETE:
+            self.es_client.indices.delete(index=index)
+
+    def apply(self, steps: List[Dict[str, Any]], today: Optional[date] = None,
+              dry_run: bool = False) -> List[Dict[str, Any]]:
+        """
+        Exécute les actions du plan, index par index
+
+        Une action en échec interrompt la suite pour cet index (pas de
+        suppression après un snapshot raté) sans bloquer les autres index.
+
+        Returns:
+            list: {index, action, status ('ok', 'error', 'dry_run'), error}
+        """
+        today = today or datetime.now(timezone.utc).date()
+        results = []
+        for step in steps:
+            for action in step['actions']:
+                if dry_run:
+                    results.append({'index': step['index'], 'action': action, 'status': 'dry_run'})
+                    continue
+                try:
+                    self._run(action, step['index'], today)
+                except (ApiError, TransportError, RuntimeError) as e:
+                    results.append({'index': step['index'], 'action': action, 'status': 'error', 'error': str(e)})
+                    break
+                results.append({'index': step['index'], 'action': action, 'status': 'ok'})
+        return results
+
+    def run(self, today: Optional[date] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Plan + application : rapport et résultats par action"""
+        steps = self.plan(today)
+        return {
+            'report': self.report(steps),
+            'steps': steps,
+            'results': self.apply(steps, today, dry_run=dry_run)
+        }
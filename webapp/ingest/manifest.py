@@ -0,0 +1,172 @@
+"""
+Ingestion Manifest
+Records which bytes of each data file were indexed so that loader re-runs are incremental
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from .config import IngestConfig
+
+
+class ManifestAction:
+    """Décision prise pour un fichier lors d'une relance"""
+    SKIP = 'skip'      # inchangé et entièrement indexé
+    RESUME = 'resume'  # indexation interrompue : reprendre à l'offset enregistré
+    TAIL = 'tail'      # données ajoutées en fin de fichier : indexer la suite
+    FULL = 'full'      # nouveau fichier ou contenu réécrit
+
+
+def file_fingerprint(filepath: str, head_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Empreinte d'un fichier : taille, mtime et hash blake2b des premiers octets
+
+    Le hash de l'en-tête suffit à distinguer un fichier réécrit d'un fichier
+    auquel des lignes ont été ajoutées (cas des logs en append).
+    """
+    head_bytes = head_bytes or IngestConfig.MANIFEST_HEAD_BYTES
+    stat = os.stat(filepath)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        digest.update(f.read(head_bytes))
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'head_hash': digest.hexdigest(),
+        'head_size': min(stat.st_size, head_bytes)
+    }
+
+
+class IngestManifest:
+    """
+    Manifeste SQLite des fichiers indexés (équivalent du sincedb de Logstash)
+
+    Pour chaque fichier : taille, mtime, hash de l'en-tête et offset jusqu'auquel
+    toutes les lignes ont été indexées. Les plages terminées sont enregistrées
+    au fil de l'eau (checkpoint) ; l'offset avance tant qu'elles sont contiguës.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or IngestConfig.MANIFEST_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    head_hash TEXT NOT NULL,
+                    head_size INTEGER NOT NULL,
+                    indexed_offset INTEGER NOT NULL DEFAULT 0,
+                    target_size INTEGER NOT NULL DEFAULT 0,
+                    documents INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ranges (
+                    path TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    PRIMARY KEY (path, start)
+                )
+            """)
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, filepath: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT * FROM files WHERE path = ?", (os.path.abspath(filepath),)).fetchone()
+        return dict(row) if row else None
+
+    def plan(self, filepath: str, resumable: bool = True) -> Tuple[str, int, Dict[str, Any]]:
+        """
+        Décide quoi indexer pour un fichier
+
+        Args:
+            filepath: Chemin du fichier de données
+            resumable: False pour les formats non découpables (tableau JSON)
+
+        Returns:
+            tuple (ManifestAction, offset de départ, empreinte actuelle)
+        """
+        current = file_fingerprint(filepath)
+        entry = self.get(filepath)
+        if entry is None:
+            return ManifestAction.FULL, 0, current
+
+        # En-tête modifié ou fichier tronqué : contenu réécrit
+        same_head = (entry['head_hash'] == current['head_hash']
+                     or (entry['head_size'] < current['head_size']
+                         and entry['head_hash'] == file_fingerprint(filepath, entry['head_size'])['head_hash']))
+        if not same_head or current['size'] < entry['indexed_offset']:
+            return ManifestAction.FULL, 0, current
+        # Même taille mais modifié depuis : réécrit sur place
+        if current['size'] == entry['size'] and current['mtime'] != entry['mtime']:
+            return ManifestAction.FULL, 0, current
+
+        if entry['indexed_offset'] >= current['size']:
+            return ManifestAction.SKIP, current['size'], current
+        if not resumable:
+            return ManifestAction.FULL, 0, current
+        if entry['indexed_offset'] < entry['target_size']:
+            return ManifestAction.RESUME, entry['indexed_offset'], current
+        return ManifestAction.TAIL, entry['indexed_offset'], current
+
+    def begin(self, filepath: str, fingerprint: Dict[str, Any], start_offset: int):
+        """Enregistre le début de l'indexation de [start_offset, taille actuelle)"""
+        path = os.path.abspath(filepath)
+        with self._lock, self._conn:
+            if start_offset == 0:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.execute("DELETE FROM ranges WHERE path = ?", (path,))
+            self._conn.execute("""
+                INSERT INTO files (path, size, mtime, head_hash, head_size, indexed_offset, target_size,
+                                   documents, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size, mtime = excluded.mtime, head_hash = excluded.head_hash,
+                    head_size = excluded.head_size, indexed_offset = excluded.indexed_offset,
+                    target_size = excluded.target_size, updated_at = excluded.updated_at
+            """, (path, fingerprint['size'], fingerprint['mtime'], fingerprint['head_hash'],
+                  fingerprint['head_size'], start_offset, fingerprint['size'], datetime.now().isoformat()))
+
+    def complete_range(self, filepath: str, start: int, end: int, documents: int = 0) -> int:
+        """
+        Checkpoint d'une plage terminée
+
+        Returns:
+            int: nouvel offset contigu indexé
+        """
+        path = os.path.abspath(filepath)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO ranges (path, start, end) VALUES (?, ?, ?)",
+                               (path, start, end))
+            offset = self._conn.execute("SELECT indexed_offset FROM files WHERE path = ?", (path,)).fetchone()[0]
+
+            # Avancer l'offset sur les plages contiguës terminées
+            while True:
+                row = self._conn.execute("SELECT end FROM ranges WHERE path = ? AND start = ?",
+                                         (path, offset)).fetchone()
+                if row is None:
+                    break
+                self._conn.execute("DELETE FROM ranges WHERE path = ? AND start = ?", (path, offset))
+                offset = row[0]
+
+            self._conn.execute("""
+                UPDATE files SET indexed_offset = ?, documents = documents + ?, updated_at = ?
+                WHERE path = ?
+            """, (offset, documents, datetime.now().isoformat(), path))
+        return offset
+
+    def forget(self, filepath: str):
+        path = os.path.abspath(filepath)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.execute("DELETE FROM ranges WHERE path = ?", (path,))
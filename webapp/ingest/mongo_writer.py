@@ -0,0 +1,174 @@
+"""
+Buffered MongoDB Writer
+Batches documents into insert_many(ordered=False) calls from a background thread
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from .config import IngestConfig
+
+
+_STOP = object()
+
+# Code d'erreur MongoDB E11000 (clé dupliquée)
+_DUPLICATE_KEY = 11000
+
+
+def _estimate_size(doc: Dict[str, Any]) -> int:
+    """Estimation grossière de la taille d'un document (en octets)"""
+    return sum(len(str(key)) + len(str(value)) for key, value in doc.items())
+
+
+class BufferedMongoWriter:
+    """
+    Écrivain MongoDB bufferisé
+
+    Les documents sont placés dans une file bornée par write() et un thread
+    dédié les envoie par lots insert_many(ordered=False). Un lot part dès que
+    batch_size documents ou max_batch_bytes octets sont atteints, ou après
+    flush_interval secondes. Le producteur (ex: l'indexeur Elasticsearch)
+    n'attend donc jamais les acquittements MongoDB.
+
+    Usage:
+        with BufferedMongoWriter(db.uploads) as writer:
+            for doc in documents:
+                writer.write(doc)
+        print(writer.get_stats())
+    """
+
+    def __init__(
+        self,
+        collection,
+        batch_size: Optional[int] = None,
+        max_batch_bytes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_queue_size: Optional[int] = None
+    ):
+        self.collection = collection
+        self.batch_size = batch_size or IngestConfig.MONGO_BATCH_SIZE
+        self.max_batch_bytes = max_batch_bytes or IngestConfig.MONGO_MAX_BATCH_BYTES
+        self.flush_interval = flush_interval or IngestConfig.MONGO_FLUSH_INTERVAL
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size or IngestConfig.MONGO_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self.stats = {
+            "inserted": 0,
+            "failed": 0,
+            "duplicates": 0,
+            "batches": 0,
+            "batch_latencies_ms": []
+        }
+        self.errors: List[str] = []
+        self._thread = threading.Thread(target=self._run, name='mongo-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, doc: Dict[str, Any]):
+        """Ajoute un document au buffer (bloque seulement si la file est pleine)"""
+        self._queue.put(doc)
+
+    def close(self):
+        """Vide le buffer et attend la fin du thread d'écriture"""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                return
+
+            if item is not None:
+                batch.append(item)
+                batch_bytes += _estimate_size(item)
+
+            if (len(batch) >= self.batch_size
+                    or batch_bytes >= self.max_batch_bytes
+                    or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                batch_bytes = 0
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        """Envoie un lot avec insert_many(ordered=False) et mesure sa latence"""
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        inserted = len(batch)
+        failed = 0
+        duplicates = 0
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            # Clé _id déjà présente : document déjà copié (ré-ingestion)
+            duplicates = sum(1 for err in write_errors if err.get('code') == _DUPLICATE_KEY)
+            write_errors = [err for err in write_errors if err.get('code') != _DUPLICATE_KEY]
+            failed = len(write_errors)
+            inserted = e.details.get('nInserted', len(batch) - failed - duplicates)
+            if write_errors or not duplicates:
+                self._record_error(f"{failed} write errors: {write_errors[0].get('errmsg', '') if write_errors else e}")
+        except Exception as e:
+            failed = len(batch)
+            inserted = 0
+            self._record_error(str(e))
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.stats["inserted"] += inserted
+            self.stats["failed"] += failed
+            self.stats["duplicates"] += duplicates
+            self.stats["batches"] += 1
+            self.stats["batch_latencies_ms"].append(round(latency_ms, 2))
+
+    def _record_error(self, message: str):
+        print(f"[MONGO WRITER ERROR] {message}")
+        with self._lock:
+            if len(self.errors) < IngestConfig.MAX_REPORTED_ERRORS:
+                self.errors.append(message)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs et les latences par lot (en ms)"""
+        with self._lock:
+            latencies = list(self.stats["batch_latencies_ms"])
+            stats = {
+                "inserted": self.stats["inserted"],
+                "failed": self.stats["failed"],
+                "duplicates": self.stats["duplicates"],
+                "batches": self.stats["batches"],
+                "errors": list(self.errors)
+            }
+
+        if latencies:
+            ordered = sorted(latencies)
+            stats["batch_latency_ms"] = {
+                "avg": round(sum(latencies) / len(latencies), 2),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                "max": ordered[-1],
+                "last": latencies[-1]
+            }
+        else:
+            stats["batch_latency_ms"] = None
+        return stats
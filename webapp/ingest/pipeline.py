@@ -0,0 +1,112 @@
+"""
+Upload Ingestion Pipeline
+Streams an uploaded file into Elasticsearch (bulk) and MongoDB (buffered) with progress reporting
+"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .bulk_indexer import BulkIndexer, BulkResult
+from .canonical import canonicalize
+from .config import IngestConfig
+from .dead_letter import MongoDeadLetterStore
+from .doc_ids import create_action, document_route
+from .mongo_writer import BufferedMongoWriter
+from .readers import iter_documents, open_text_stream
+from .timestamps import TimestampNormalizer
+
+
+def iter_upload_actions(documents: Iterable[Dict[str, Any]], source_file: str,
+                        mongo_writer: Optional[BufferedMongoWriter] = None,
+                        id_source: Optional[str] = None):
+    """
+    Génère les actions bulk des documents uploadés, en les copiant vers MongoDB
+
+    Chaque document reçoit un _id déterministe (contenu + fichier d'origine)
+    et est envoyé en op_type=create dans l'index du jour de son timestamp
+    (champ détecté par TimestampNormalizer, index fixe sans date) :
+    ré-uploader le même fichier, ou le charger avec un script, ne crée pas
+    de doublons. Les champs canonicaux sont ajoutés après le calcul de l'_id.
+    """
+    uploaded_at = datetime.now().isoformat()
+    normalizer = TimestampNormalizer()
+    for doc in documents:
+        field = normalizer.find_field(doc)
+        event_time = normalizer.parse(doc[field]) if field is not None else None
+        # Index et identifiant calculés avant l'ajout des champs propres à cet upload
+        index_name, doc_id = document_route(doc, id_source or source_file, event_time)
+
+        # @timestamp absent : date de l'événement, sinon date d'ingestion
+        if '@timestamp' not in doc:
+            doc['@timestamp'] = (event_time or datetime.now()).isoformat()
+
+        # Copie MongoDB (bufferisée, vidée par un thread d'arrière-plan)
+        if mongo_writer is not None:
+            mongo_writer.write({
+                '_id': doc_id,
+                **doc,
+                'source_file': source_file,
+                'uploaded_at': uploaded_at
+            })
+
+        # Champs canonicaux (level, service, message, user) pour les handlers de lecture
+        yield create_action(index_name, canonicalize(doc), doc_id)
+
+
+def ingest_file(
+    filepath: str,
+    file_type: str,
+    source_file: str,
+    es_client,
+    db=None,
+    on_progress: Optional[Callable[[BulkResult, int], None]] = None,
+    compression: Optional[str] = None,
+    id_source: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Indexe un fichier uploadé de bout en bout
+
+    Args:
+        filepath: Chemin du fichier sur disque ou flux binaire (upload par morceaux en cours)
+        file_type: 'csv', 'json' ou 'ndjson'
+        source_file: Nom enregistré dans MongoDB (champ source_file)
+        es_client: Client Elasticsearch (None = MongoDB uniquement)
+        db: Base MongoDB (None = pas de copie ni de dead-letter)
+        on_progress: Callback(résultat partiel, octets lus) appelé après chaque lot
+        compression: None, 'gzip' ou 'zstd' (décompression en flux, voir detect_format)
+        id_source: Nom utilisé dans le calcul des _id (défaut: source_file)
+
+    Returns:
+        dict: compteurs Elasticsearch (indexed/failed/duplicates/dead_lettered/errors) et statistiques MongoDB
+    """
+    stream, counter = open_text_stream(filepath, compression)
+    mongo_writer = BufferedMongoWriter(db.uploads) if db is not None else None
+    # Chaque document rejeté est conservé avec sa raison pour être rejoué
+    dead_letter = MongoDeadLetterStore(db[IngestConfig.DEAD_LETTER_COLLECTION]) if db is not None else None
+
+    progress = None
+    if on_progress is not None:
+        def progress(result):
+            on_progress(result, counter.bytes_read)
+
+    try:
+        documents = iter_documents(stream, file_type)
+        actions = iter_upload_actions(documents, source_file, mongo_writer, id_source)
+
+        # Indexation bulk pendant que MongoDB écrit ses lots en parallèle
+        if es_client is not None:
+            bulk_result = BulkIndexer(es_client).index(actions, on_progress=progress,
+                                                       dead_letter=dead_letter, source_file=source_file)
+        else:
+            # Vider le générateur pour que MongoDB reçoive tout de même les documents
+            for _ in actions:
+                pass
+            bulk_result = BulkResult().finish()
+    finally:
+        stream.close()
+        if mongo_writer is not None:
+            mongo_writer.close()
+
+    summary = bulk_result.to_dict()
+    summary['mongo'] = mongo_writer.get_stats() if mongo_writer is not None else None
+    return summary
@@ -0,0 +1,335 @@
+"""
+Streaming File Readers
+Yield uploaded CSV/JSON records in bounded batches instead of loading whole files
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import re
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from .config import IngestConfig
+
+try:
+    import zstandard
+except ImportError:  # zstd optionnel
+    zstandard = None
+
+
+# Extensions de fichiers acceptées et type de lecteur associé
+FILE_TYPES = {'csv': 'csv', 'json': 'json', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}
+
+# Suffixes de compression reconnus (décompression en flux)
+COMPRESSION_SUFFIXES = {'gz': 'gzip', 'zst': 'zstd', 'zstd': 'zstd'}
+
+# Séparateurs ignorés entre deux documents JSON (tableau ou NDJSON)
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+class CountingReader(io.RawIOBase):
+    """Flux binaire brut qui compte les octets lus (progression / ETA)"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        if n:
+            self.bytes_read += n
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+class _GzipReader(gzip.GzipFile):
+    """GzipFile qui ferme aussi le flux compressé sous-jacent"""
+
+    def close(self):
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+
+def detect_format(filename: str):
+    """
+    Déduit le type de lecteur et la compression d'un nom de fichier
+
+    Exemples: 'logs.csv' -> ('csv', None), 'events.ndjson.gz' -> ('ndjson', 'gzip')
+
+    Returns:
+        tuple (file_type, compression) ou (None, None) si le format n'est pas supporté
+    """
+    parts = filename.lower().rsplit('.', 2)
+    compression = None
+    if len(parts) > 1 and parts[-1] in COMPRESSION_SUFFIXES:
+        compression = COMPRESSION_SUFFIXES[parts.pop()]
+        if compression == 'zstd' and zstandard is None:
+            return None, None
+    if len(parts) < 2 or parts[-1] not in FILE_TYPES:
+        return None, None
+    return FILE_TYPES[parts[-1]], compression
+
+
+def open_text_stream(source, compression: Optional[str] = None):
+    """
+    Ouvre un fichier uploadé en texte UTF-8 avec comptage des octets lus
+
+    Les fichiers compressés sont décompressés à la volée : seul le tampon du
+    décompresseur est en mémoire et le fichier reste compressé sur disque.
+
+    Args:
+        source: Chemin du fichier ou flux binaire brut déjà ouvert
+        compression: None, 'gzip' ou 'zstd'
+
+    Returns:
+        tuple (flux texte, CountingReader) ; counter.bytes_read donne la position
+        dans le fichier tel que stocké (octets compressés le cas échéant)
+    """
+    raw = open(source, 'rb') if isinstance(source, str) else source
+    counter = CountingReader(raw)
+    binary = io.BufferedReader(counter)
+    if compression == 'gzip':
+        binary = _GzipReader(fileobj=binary, mode='rb')
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        binary = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(binary, closefd=True))
+    elif compression is not None:
+        raise ValueError(f"Unsupported compression: {compression}")
+    stream = io.TextIOWrapper(binary, encoding='utf-8')
+    return stream, counter
+
+
+def iter_batches(records: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Regroupe un flux de documents en lots de batch_size"""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_csv_batches(source, batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Lit un CSV par blocs avec pd.read_csv(chunksize=...)
+
+    Seul un bloc de batch_size lignes est présent en mémoire à la fois ;
+    l'inférence de types de pandas est conservée (nombres, NaN).
+    """
+    batch_size = batch_size or IngestConfig.READ_BATCH_SIZE
+    with pd.read_csv(source, chunksize=batch_size) as reader:
+        for chunk in reader:
+            yield chunk.to_dict('records')
+
+
+def iter_json_records(
+    fileobj,
+    read_size: Optional[int] = None,
+    max_document_bytes: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Parse incrémental d'un flux JSON texte
+
+    Accepte un tableau d'objets, un objet unique ou des objets concaténés
+    (NDJSON). Le flux est lu par blocs de read_size caractères et chaque
+    objet est décodé dès qu'il est complet, la mémoire reste donc bornée
+    par la taille du plus gros document. Un document incomplet double la
+    lecture suivante : un gros document est redécodé O(log n) fois, pas
+    une fois par bloc.
+
+    Raises:
+        ValueError: JSON invalide, tronqué, ou document plus grand que max_document_bytes
+    """
+    read_size = read_size or IngestConfig.JSON_READ_SIZE
+    max_document_bytes = max_document_bytes or IngestConfig.MAX_JSON_DOCUMENT_BYTES
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    in_array = None
+
+    while True:
+        pos = _SEPARATORS.match(buf, pos).end()
+
+        if pos >= len(buf):
+            if eof:
+                return
+            chunk = fileobj.read(read_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        if in_array is None:
+            in_array = buf[pos] == '['
+            if in_array:
+                pos += 1
+                continue
+
+        if in_array and buf[pos] == ']':
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            # Document incomplet : lire la suite du flux
+            if eof:
+                raise ValueError(f"Invalid JSON near character {e.pos}: {e.msg}") from e
+            pending = len(buf) - pos
+            if pending > max_document_bytes:
+                raise ValueError(f"JSON document exceeds {max_document_bytes} bytes") from e
+            chunk = fileobj.read(max(read_size, pending))
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        if not isinstance(obj, dict):
+            raise ValueError(f"Expected JSON objects, got {type(obj).__name__}")
+        pos = end
+        yield obj
+
+
+def iter_json_batches(source, batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Lit un fichier (ou flux texte) JSON/NDJSON et le découpe en lots de documents"""
+    batch_size = batch_size or IngestConfig.READ_BATCH_SIZE
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as f:
+            yield from iter_batches(iter_json_records(f), batch_size)
+    else:
+        yield from iter_batches(iter_json_records(source), batch_size)
+
+
+def _parse_ndjson_line(line, line_no: int) -> Optional[Dict[str, Any]]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        obj = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON on line {line_no}: {e.msg}") from e
+    if not isinstance(obj, dict):
+        raise ValueError(f"Expected JSON objects, got {type(obj).__name__} on line {line_no}")
+    return obj
+
+
+def iter_ndjson_records(fileobj) -> Iterator[Dict[str, Any]]:
+    """
+    Lit un flux NDJSON (JSON Lines) ligne par ligne
+
+    Une ligne = un document ; les lignes vides sont ignorées. La mémoire est
+    bornée par la plus longue ligne.
+
+    Raises:
+        ValueError: ligne invalide (le numéro de ligne est indiqué)
+    """
+    for line_no, line in enumerate(fileobj, 1):
+        obj = _parse_ndjson_line(line, line_no)
+        if obj is not None:
+            yield obj
+
+
+def iter_line_range(filepath: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Lit les lignes (octets bruts) qui commencent dans la plage [start, end)
+
+    Plusieurs workers peuvent se partager un même fichier avec des plages
+    contiguës (voir split_byte_ranges) : chaque ligne est lue par un et un
+    seul worker, même si une limite tombe au milieu d'une ligne.
+    """
+    with open(filepath, 'rb') as f:
+        if start > 0:
+            # Finir la ligne en cours : elle appartient à la plage précédente
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while end is None or position < end:
+            line = f.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line
+
+
+def iter_ndjson_range(filepath: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Lit les documents NDJSON dont la ligne commence dans la plage d'octets [start, end)"""
+    for line_no, line in enumerate(iter_line_range(filepath, start, end), 1):
+        obj = _parse_ndjson_line(line.decode('utf-8'), line_no)
+        if obj is not None:
+            yield obj
+
+
+def iter_csv_range(filepath: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict[str, str]]:
+    """
+    Lit les lignes CSV de la plage d'octets [start, end) avec l'en-tête du fichier
+
+    Les valeurs restent des chaînes (comme csv.DictReader). Le découpage
+    suppose qu'aucun champ ne contient de retour à la ligne.
+    """
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        header = next(csv.reader([f.readline()]), [])
+    lines = (line.decode('utf-8') for line in iter_line_range(filepath, start, end))
+    if start == 0:
+        next(lines, None)  # ligne d'en-tête
+    for row in csv.reader(lines):
+        if row:
+            yield dict(zip(header, row))
+
+
+def split_byte_ranges(filepath: str, parts: int, start: int = 0):
+    """Découpe [start, fin du fichier) en parts plages d'octets contiguës [(start, end), ...]"""
+    size = os.path.getsize(filepath)
+    if size <= start:
+        return [(start, start)]
+    step = -(-(size - start) // max(1, min(parts, size - start)))
+    return [(offset, min(offset + step, size)) for offset in range(start, size, step)]
+
+
+def iter_ndjson_batches(source, batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Lit un fichier (ou flux texte) NDJSON et le découpe en lots de documents"""
+    batch_size = batch_size or IngestConfig.READ_BATCH_SIZE
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as f:
+            yield from iter_batches(iter_ndjson_records(f), batch_size)
+    else:
+        yield from iter_batches(iter_ndjson_records(source), batch_size)
+
+
+def read_batches(filepath, file_type: str, batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Point d'entrée du lecteur streaming
+
+    Args:
+        filepath: Chemin du fichier uploadé ou flux texte déjà ouvert
+        file_type: 'csv', 'json' ou 'ndjson'
+        batch_size: Nombre de documents par lot
+
+    Returns:
+        Itérateur de lots (listes de documents)
+    """
+    if file_type == 'csv':
+        return iter_csv_batches(filepath, batch_size)
+    if file_type == 'json':
+        return iter_json_batches(filepath, batch_size)
+    if file_type == 'ndjson':
+        return iter_ndjson_batches(filepath, batch_size)
+    raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def iter_documents(filepath, file_type: str, batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Aplatit read_batches() en un flux de documents"""
+    return chain.from_iterable(read_batches(filepath, file_type, batch_size))
@@ -0,0 +1,212 @@
+"""
+Timestamp Normalization
+Detects the timestamp column and format once per file and parses rows on a fast path
+"""
+
+import math
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from dateutil import parser as date_parser
+
+
+# Champs reconnus comme timestamp (insensible à la casse, par ordre de priorité)
+TIMESTAMP_FIELDS = ('@timestamp', 'timestamp', 'time', 'date')
+
+# Formats strptime essayés à la détection (le premier est celui de csv-pipeline.conf).
+# Une date ambiguë (01/02/2025) est lue mois en premier, comme dateutil.parse
+# utilisé avant ce module ; le jour en premier n'est retenu que si le mois est invalide.
+STRPTIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%b/%Y:%H:%M:%S %z',  # format des access logs Apache/Nginx
+    '%Y-%m-%d',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+)
+
+_EPOCH = re.compile(r'^\d{9,13}(\.\d+)?$')
+
+# Au-delà, un epoch numérique est exprimé en millisecondes
+_EPOCH_MS_THRESHOLD = 10 ** 11
+
+
+class TimestampNormalizer:
+    """
+    Normaliseur de timestamps pour un fichier
+
+    Le champ timestamp est recherché une seule fois par ensemble de clés et le
+    format est détecté sur la première valeur (epoch, ISO 8601 ou strptime).
+    Les lignes suivantes sont parsées par ce chemin rapide ; une valeur qui ne
+    respecte pas le format courant déclenche une nouvelle détection (fichier
+    concaténé, première date ambiguë) et le format trouvé remplace le
+    précédent. dateutil n'est utilisé que pour les valeurs qu'aucun format
+    connu ne reconnaît.
+    """
+
+    def __init__(self):
+        self.format: Optional[str] = None
+        self.field: Optional[str] = None
+        self._fields_by_keys: Dict[Tuple[str, ...], Optional[str]] = {}
+        self.rows = 0
+        self.fast_path = 0
+        self.slow_path = 0
+        self.failed = 0
+        self.missing = 0
+
+    # --- Détection ---
+
+    def find_field(self, item: Dict[str, Any]) -> Optional[str]:
+        """Retourne la clé timestamp du document (résultat mis en cache par jeu de clés)"""
+        keys = tuple(item.keys())
+        if keys not in self._fields_by_keys:
+            lowered = {key.lower(): key for key in reversed(keys)}
+            self._fields_by_keys[keys] = next(
+                (lowered[name] for name in TIMESTAMP_FIELDS if name in lowered), None
+            )
+        field = self._fields_by_keys[keys]
+        if field is not None and self.field is None:
+            self.field = field
+        return field
+
+    @staticmethod
+    def detect_format(value: Any) -> Optional[str]:
+        """Détecte le format d'une valeur: 'epoch_s', 'epoch_ms', 'iso', un format strptime ou None"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return 'epoch_ms' if value >= _EPOCH_MS_THRESHOLD else 'epoch_s'
+        value = str(value).strip()
+        if _EPOCH.match(value):
+            return 'epoch_ms' if float(value) >= _EPOCH_MS_THRESHOLD else 'epoch_s'
+        try:
+            datetime.fromisoformat(value)
+            return 'iso'
+        except ValueError:
+            pass
+        for fmt in STRPTIME_FORMATS:
+            try:
+                datetime.strptime(value, fmt)
+                return fmt
+            except ValueError:
+                continue
+        return None
+
+    # --- Parsing ---
+
+    def _parse_fast(self, value: Any) -> datetime:
+        if self.format in ('epoch_s', 'epoch_ms'):
+            seconds = float(value) / (1000 if self.format == 'epoch_ms' else 1)
+            return datetime.fromtimestamp(seconds, tz=timezone.utc)
+        if self.format == 'iso':
+            return datetime.fromisoformat(str(value).strip())
+        return datetime.strptime(str(value).strip(), self.format)
+
+    def parse(self, value: Any) -> Optional[datetime]:
+        """Parse une valeur (chemin rapide, puis dateutil pour les cas atypiques)"""
+        self.rows += 1
+        # Cellule CSV vide lue par pandas : NaN
+        if value is None or value == '' or (isinstance(value, float) and math.isnan(value)):
+            self.failed += 1
+            return None
+
+        if self.format is None:
+            self.format = self.detect_format(value)
+
+        if self.format is not None:
+            try:
+                dt = self._parse_fast(value)
+                self.fast_path += 1
+                return dt
+            except (ValueError, TypeError, OverflowError, OSError):
+                pass
+
+            # Le format courant ne convient plus : re-détection sur cette valeur
+            detected = self.detect_format(value)
+            if detected is not None and detected != self.format:
+                self.format = detected
+                try:
+                    dt = self._parse_fast(value)
+                    self.fast_path += 1
+                    return dt
+                except (ValueError, TypeError, OverflowError, OSError):
+                    pass
+
+        self.slow_path += 1
+        try:
+            return date_parser.parse(str(value))
+        except (ValueError, OverflowError):
+            self.failed += 1
+            return None
+
+    def normalize(self, item: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Sépare le timestamp d'un document
+
+        Returns:
+            tuple (document sans le champ timestamp, timestamp ISO 8601 ou None)
+        """
+        field = self.find_field(item)
+        if field is None:
+            self.missing += 1
+            return item, None
+        dt = self.parse(item[field])
+        source = {k: v for k, v in item.items() if k != field}
+        return source, dt.isoformat() if dt is not None else None
+
+    def normalize_batch(self, items: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Optional[str]]]:
+        """
+        Normalise un lot de documents
+
+        Pour un format strptime, le lot est converti en une seule passe par
+        pd.to_datetime(format=...) ; les valeurs rejetées repassent par parse().
+        """
+        if not items:
+            return []
+
+        fields = [self.find_field(item) for item in items]
+        if self.format is None:
+            first = next((item[f] for item, f in zip(items, fields) if f is not None and item[f] not in (None, '')),
+                         None)
+            if first is not None:
+                self.format = self.detect_format(first)
+
+        if self.format is None or self.format in ('iso', 'epoch_s', 'epoch_ms') or '%z' in self.format:
+            return [self.normalize(item) for item in items]
+
+        # Chemin vectorisé pour les formats strptime
+        values = [item[f] if f is not None else None for item, f in zip(items, fields)]
+        parsed = pd.to_datetime(pd.Series(values, dtype=object), format=self.format, errors='coerce')
+
+        results = []
+        for item, field, value, ts in zip(items, fields, values, parsed):
+            if field is None:
+                self.missing += 1
+                results.append((item, None))
+                continue
+            source = {k: v for k, v in item.items() if k != field}
+            if pd.isna(ts):
+                dt = self.parse(value)
+                results.append((source, dt.isoformat() if dt is not None else None))
+            else:
+                self.rows += 1
+                self.fast_path += 1
+                results.append((source, ts.isoformat()))
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'field': self.field,
+            'format': self.format,
+            'rows': self.rows,
+            'fast_path': self.fast_path,
+            'slow_path': self.slow_path,
+            'failed': self.failed,
+            'missing': self.missing
+        }
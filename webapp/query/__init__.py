@@ -0,0 +1,38 @@
+"""
+Query Module for Flask API
+Resolves the Elasticsearch indices targeted by search, export and dashboard requests
+and normalizes their hits
+"""
+
+from .index_resolver import IndexResolver, data_version, parse_day
+from .hit_normalizer import HitNormalizer
+from .cursor import SearchCursors, CursorError
+from .export import HitExporter, csv_chunks, export_query
+from .export_jobs import ExportJobManager, ExportJobError
+from .rollups import OrderRollups
+from .params import search_params, range_is_closed
+from .projection import LOG_SOURCE, LOG_FILTER_PATH, LEGACY_DOCUMENTS, canonical_term, complete_legacy_sources
+from .config import QueryConfig
+
+__all__ = [
+    'IndexResolver',
+    'parse_day',
+    'data_version',
+    'HitNormalizer',
+    'SearchCursors',
+    'CursorError',
+    'HitExporter',
+    'csv_chunks',
+    'export_query',
+    'ExportJobManager',
+    'ExportJobError',
+    'OrderRollups',
+    'search_params',
+    'range_is_closed',
+    'LOG_SOURCE',
+    'LOG_FILTER_PATH',
+    'LEGACY_DOCUMENTS',
+    'canonical_term',
+    'complete_legacy_sources',
+    'QueryConfig'
+]
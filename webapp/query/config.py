@@ -0,0 +1,58 @@
+"""
+Query Configuration
+Defines index targeting limits used by the search, export and dashboard endpoints
+"""
+
+import os
+
+
+class QueryConfig:
+    """Configuration centralisée des requêtes Elasticsearch de l'API"""
+
+    # Préfixe des index quotidiens (ecommerce-logs-YYYY.MM.dd)
+    INDEX_PREFIX = os.getenv('INDEX_PREFIX', 'ecommerce-logs')
+
+    # Durée de vie du catalogue des index en cache (secondes)
+    INDEX_CATALOGUE_TTL = float(os.getenv('INDEX_CATALOGUE_TTL', 60))
+
+    # Marge (jours) autour de la fenêtre demandée : index nommés en UTC, dates client en heure locale
+    INDEX_DATE_MARGIN_DAYS = int(os.getenv('INDEX_DATE_MARGIN_DAYS', 1))
+
+    # Au-delà, les mois entièrement couverts sont remplacés par un wildcard mensuel
+    MAX_INDEX_EXPRESSION_LENGTH = int(os.getenv('MAX_INDEX_EXPRESSION_LENGTH', 2048))
+
+    # Index interrogés pour les « derniers logs » avant d'élargir à tous les index
+    RECENT_INDEX_COUNT = int(os.getenv('RECENT_INDEX_COUNT', 3))
+
+    # Formes de documents (jeux de clés) dont le plan de normalisation compilé est gardé en cache
+    MAX_NORMALIZER_PLANS = int(os.getenv('MAX_NORMALIZER_PLANS', 256))
+
+    # Hits indexés avant la canonicalisation rechargés par requête mget
+    LEGACY_MGET_BATCH_SIZE = int(os.getenv('LEGACY_MGET_BATCH_SIZE', 1000))
+
+    # Pagination par curseur (PIT + search_after) de /api/search
+    CURSOR_KEEP_ALIVE = os.getenv('SEARCH_CURSOR_KEEP_ALIVE', '2m')  # prolongé à chaque page
+    CURSOR_MAX_SIZE = int(os.getenv('SEARCH_CURSOR_MAX_SIZE', 1000))  # hits par page
+
+    # Export CSV en flux (PIT + search_after)
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))  # hits par requête
+    EXPORT_KEEP_ALIVE = os.getenv('EXPORT_KEEP_ALIVE', '5m')  # entre deux lots (client lent)
+    EXPORT_MAX_SLICES = int(os.getenv('EXPORT_MAX_SLICES', 8))  # tranches lues en parallèle
+    EXPORT_SLICE_QUEUE_SIZE = int(os.getenv('EXPORT_SLICE_QUEUE_SIZE', 2))  # lots d'avance par tranche
+
+    # Jobs d'export (artefacts csv.gz / parquet réutilisés tant que les index couverts ne changent pas)
+    EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS', 2))
+    EXPORT_JOB_SLICES = int(os.getenv('EXPORT_JOB_SLICES', 4))  # tranches PIT par job
+    EXPORT_ARTIFACT_TTL = int(os.getenv('EXPORT_ARTIFACT_TTL', 86400))  # secondes sur disque
+
+    # Rollups horaires des commandes pour /api/results
+    ROLLUP_INDEX = os.getenv('ROLLUP_INDEX', 'ecommerce-rollups-hourly')  # hors du wildcard ecommerce-logs-*
+    ROLLUP_MIN_AGE_DAYS = int(os.getenv('ROLLUP_MIN_AGE_DAYS', 1))  # jours plus récents servis en brut
+    ROLLUP_COMPOSITE_SIZE = int(os.getenv('ROLLUP_COMPOSITE_SIZE', 1000))  # buckets par page composite (au plus)
+    ROLLUP_MAX_CUSTOMERS = int(os.getenv('ROLLUP_MAX_CUSTOMERS', 100))  # clients lus avec la page, au-delà requête dédiée
+    ROLLUP_MAX_BUCKETS = int(os.getenv('ROLLUP_MAX_BUCKETS', 65536))  # search.max_buckets du cluster
+    ROLLUP_LOCK_TTL = int(os.getenv('ROLLUP_LOCK_TTL', 3600))  # verrou Redis d'une matérialisation (secondes)
+    ROLLUP_LOCK_RETRY = float(os.getenv('ROLLUP_LOCK_RETRY', 30))  # attente si un autre processus matérialise
+
+    # Plage de recherche finissant moins de SEARCH_LIVE_MARGIN secondes avant maintenant : encore alimentée
+    SEARCH_LIVE_MARGIN = int(os.getenv('SEARCH_LIVE_MARGIN', 3600))
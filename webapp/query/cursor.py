@@ -0,0 +1,129 @@
+"""
+Search Cursors
+Deep pagination with a point-in-time and search_after, exposed to clients as a signed opaque token
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from elasticsearch import NotFoundError
+
+from .config import QueryConfig
+from .projection import LOG_FILTER_PATH, LOG_SOURCE
+
+
+# Tri stable : @timestamp puis _shard_doc (départage implicite d'un PIT, sans coût de fielddata)
+CURSOR_SORT = [{'@timestamp': {'order': 'desc'}}, {'_shard_doc': {'order': 'desc'}}]
+
+CURSOR_FILTER_PATH = LOG_FILTER_PATH + ['pit_id', 'hits.hits.sort']
+
+
+class CursorError(Exception):
+    """Curseur invalide (signature, format) ou expiré (PIT fermé)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SearchCursors:
+    """
+    Pagination profonde de /api/search
+
+    La première page ouvre un point-in-time sur les index résolus ; chaque
+    page suivante est un search_after sur [@timestamp, _shard_doc] qui
+    prolonge le PIT de CURSOR_KEEP_ALIVE : le coût d'une page ne dépend
+    pas de sa profondeur et la limite des 10 000 résultats de from/size ne
+    s'applique pas. L'état (PIT, requête, dernière clé de tri, total) voyage
+    dans le jeton renvoyé au client, signé HMAC avec la clé de l'application :
+    aucun état serveur, et un jeton modifié est refusé. Le PIT est fermé à la
+    dernière page ou sur demande ; sinon il expire seul.
+    """
+
+    def __init__(self, es_client, secret: str, keep_alive: Optional[str] = None):
+        self.es_client = es_client
+        self._secret = secret.encode('utf-8')
+        self.keep_alive = keep_alive or QueryConfig.CURSOR_KEEP_ALIVE
+
+    # --- Jeton ---
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()[:16]
+
+    def encode(self, state: Dict[str, Any]) -> str:
+        payload = json.dumps(state, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            payload_part, signature_part = token.split('.')
+            payload, signature = _b64decode(payload_part), _b64decode(signature_part)
+        except (ValueError, AttributeError):
+            raise CursorError('Invalid cursor')
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise CursorError('Invalid cursor')
+        return json.loads(payload)
+
+    # --- Pages ---
+
+    def open(self, index: str, query: Dict[str, Any], size: int) -> Dict[str, Any]:
+        """Ouvre le PIT de la première page"""
+        pit = self.es_client.open_point_in_time(index=index, keep_alive=self.keep_alive, ignore_unavailable=True)
+        return {'pit': pit['id'], 'query': query, 'size': min(size, QueryConfig.CURSOR_MAX_SIZE),
+                'after': None, 'total': None}
+
+    def page(self, state: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int, int, Optional[str]]:
+        """
+        Page suivante d'un curseur
+
+        Returns:
+            tuple: (hits bruts, total, took, jeton de la page suivante ou None à la fin)
+        """
+        body = {
+            'query': state['query'],
+            'size': state['size'],
+            'sort': CURSOR_SORT,
+            'pit': {'id': state['pit'], 'keep_alive': self.keep_alive},
+            '_source': LOG_SOURCE,
+            # Total compté une seule fois, puis transporté dans le jeton
+            'track_total_hits': state['total'] is None
+        }
+        if state['after'] is not None:
+            body['search_after'] = state['after']
+        try:
+            result = self.es_client.search(body=body, filter_path=CURSOR_FILTER_PATH).body
+        except NotFoundError:
+            raise CursorError('Cursor expired, restart the search', 410)
+
+        hits = result.get('hits', {}).get('hits', [])
+        total = state['total']
+        if total is None:
+            total = result.get('hits', {}).get('total', {}).get('value', 0)
+        pit_id = result.get('pit_id', state['pit'])
+
+        if len(hits) < state['size']:
+            self._close(pit_id)
+            return hits, total, result.get('took', 0), None
+        next_state = dict(state, pit=pit_id, after=hits[-1]['sort'], total=total)
+        return hits, total, result.get('took', 0), self.encode(next_state)
+
+    def _close(self, pit_id: str):
+        try:
+            self.es_client.close_point_in_time(id=pit_id)
+        except NotFoundError:
+            pass
+
+    def close(self, token: str):
+        """Ferme le PIT d'un curseur abandonné avant la dernière page"""
+        self._close(self.decode(token)['pit'])
@@ -0,0 +1,204 @@
+"""
+Streaming Export
+Walks a whole result set with a point-in-time and search_after and encodes it as CSV chunks, optionally gzipped
+"""
+
+import csv
+import heapq
+import io
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from elasticsearch import NotFoundError
+
+from .config import QueryConfig
+from .cursor import CURSOR_FILTER_PATH, CURSOR_SORT
+from .projection import LOG_SOURCE, canonical_term, complete_legacy_sources
+
+
+EXPORT_HEADER = ('Timestamp', 'Level', 'Service', 'Message', 'User')
+
+
+def export_query(query: str = '', level: str = '', service: str = '',
+                 start_date: str = '', end_date: str = '') -> Dict[str, Any]:
+    """Requête des filtres d'export (API et CLI)"""
+    must = []
+    if query:
+        must.append({"query_string": {"query": f"*{query}*", "fields": ["*"]}})
+    if level:
+        must.append(canonical_term('level', level))
+    if service:
+        must.append(canonical_term('service', service))
+    if start_date or end_date:
+        date_range = {}
+        if start_date:
+            date_range["gte"] = start_date
+        if end_date:
+            date_range["lte"] = end_date
+        must.append({"range": {"@timestamp": date_range}})
+    return {"bool": {"must": must}} if must else {"match_all": {}}
+
+
+def _sort_key(hit: Dict[str, Any]) -> List[Any]:
+    return hit['sort']
+
+
+class HitExporter:
+    """
+    Parcours complet d'un résultat de recherche pour l'export
+
+    Remplace la page unique de 10 000 hits : un PIT est ouvert sur les index
+    ciblés puis lu par lots de EXPORT_BATCH_SIZE avec search_after sur
+    [@timestamp, _shard_doc]. Aucune limite de taille, un seul lot en
+    mémoire à la fois, total non compté. Le PIT est fermé en fin de
+    parcours, sur erreur ou si le client abandonne le téléchargement
+    (fermeture du générateur).
+
+    Avec slices > 1, le PIT est découpé en tranches (`slice`) lues en
+    parallèle par un pool de threads. Chaque tranche reste triée : une
+    fusion k-way (heapq.merge) restitue l'ordre chronologique global, ou
+    les lots sont émis dans leur ordre d'arrivée (ordered=False, plus
+    rapide). Des files bornées limitent la mémoire à quelques lots par
+    tranche.
+    """
+
+    def __init__(self, es_client, batch_size: Optional[int] = None, keep_alive: Optional[str] = None):
+        self.es_client = es_client
+        self.batch_size = batch_size or QueryConfig.EXPORT_BATCH_SIZE
+        self.keep_alive = keep_alive or QueryConfig.EXPORT_KEEP_ALIVE
+
+    def open(self, index: str) -> str:
+        """Ouvre le PIT (avant la réponse : une erreur reste un 500 JSON)"""
+        return self.es_client.open_point_in_time(index=index, keep_alive=self.keep_alive,
+                                                 ignore_unavailable=True)['id']
+
+    def _walk(self, pit: List[str], query: Dict[str, Any],
+              slice_spec: Optional[Dict[str, int]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Lots d'une tranche (ou du PIT entier) ; pit[0] suit le dernier identifiant renvoyé"""
+        after = None
+        while True:
+            body = {
+                'query': query,
+                'size': self.batch_size,
+                'sort': CURSOR_SORT,
+                'pit': {'id': pit[0], 'keep_alive': self.keep_alive},
+                '_source': LOG_SOURCE,
+                'track_total_hits': False
+            }
+            if slice_spec is not None:
+                body['slice'] = slice_spec
+            if after is not None:
+                body['search_after'] = after
+            result = self.es_client.search(body=body, filter_path=CURSOR_FILTER_PATH).body
+            pit[0] = result.get('pit_id', pit[0])
+            hits = result.get('hits', {}).get('hits', [])
+            if hits:
+                complete_legacy_sources(self.es_client, hits)
+                yield hits
+            if len(hits) < self.batch_size:
+                return
+            after = hits[-1]['sort']
+
+    def batches(self, pit_id: str, query: Dict[str, Any], slices: int = 1,
+                ordered: bool = True) -> Iterator[List[Dict[str, Any]]]:
+        """Lots de hits bruts (legacy complétés), dans l'ordre de CURSOR_SORT sauf si ordered=False"""
+        pit = [pit_id]
+        try:
+            if slices <= 1:
+                yield from self._walk(pit, query)
+            else:
+                yield from self._sliced(pit, query, slices, ordered)
+        finally:
+            try:
+                self.es_client.close_point_in_time(id=pit[0])
+            except NotFoundError:
+                pass
+
+    def _sliced(self, pit: List[str], query: Dict[str, Any], slices: int,
+                ordered: bool) -> Iterator[List[Dict[str, Any]]]:
+        stop = threading.Event()
+        # Ordonné : une file par tranche (entrées de la fusion) ; sinon une file commune
+        queues = [queue.Queue(QueryConfig.EXPORT_SLICE_QUEUE_SIZE) for _ in range(slices if ordered else 1)]
+
+        def put(out: queue.Queue, item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(slice_id: int):
+            out = queues[slice_id if ordered else 0]
+            try:
+                for hits in self._walk(pit, query, {'id': slice_id, 'max': slices}):
+                    if not put(out, hits):
+                        return
+            except Exception as e:
+                put(out, e)
+            finally:
+                put(out, None)
+
+        def drain(out: queue.Queue, producers: int) -> Iterator[List[Dict[str, Any]]]:
+            while producers:
+                item = out.get()
+                if item is None:
+                    producers -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+
+        executor = ThreadPoolExecutor(max_workers=slices, thread_name_prefix='export-slice')
+        try:
+            for slice_id in range(slices):
+                executor.submit(fetch, slice_id)
+            if not ordered:
+                yield from drain(queues[0], slices)
+                return
+            streams = [(hit for hits in drain(out, 1) for hit in hits) for out in queues]
+            merged = heapq.merge(*streams, key=_sort_key, reverse=True)
+            while True:
+                batch = list(islice(merged, self.batch_size))
+                if not batch:
+                    return
+                yield batch
+        finally:
+            # Fin, erreur ou téléchargement abandonné : libérer les threads avant de fermer le PIT
+            stop.set()
+            executor.shutdown(wait=True)
+
+
+def csv_chunks(batches: Iterable[List[Dict[str, Any]]], row: Callable[[Dict[str, Any]], Sequence[Any]],
+               header: Sequence[str] = EXPORT_HEADER, compress: bool = False) -> Iterator[bytes]:
+    """
+    Fichier CSV produit morceau par morceau
+
+    L'en-tête est émis avant la première requête de lot (premier octet
+    immédiat), puis un morceau par lot. Avec compress, le flux est un gzip
+    valide dont chaque lot est vidé (Z_SYNC_FLUSH) pour ne rien retenir.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take() -> bytes:
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor is not None:
+            return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+    writer.writerow(header)
+    yield take()
+    for hits in batches:
+        writer.writerows(row(hit['_source']) for hit in hits)
+        yield take()
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,258 @@
+"""
+Export Jobs
+Runs heavy exports in the background and keeps their artifacts on disk, deduplicated by filters and data version
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from ingest.jobs import JobManager, JobStatus
+
+from .config import QueryConfig
+from .export import EXPORT_HEADER, HitExporter, csv_chunks, export_query
+from .hit_normalizer import hit_normalizer
+from .index_resolver import data_version
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet optionnel
+    pyarrow = None
+
+
+# Format -> extension de l'artefact
+EXPORT_FORMATS = {'csv.gz': 'csv.gz', 'parquet': 'parquet'}
+
+EXPORT_FILTERS = ('query', 'level', 'service', 'start_date', 'end_date')
+
+
+class ExportJobError(Exception):
+    """Demande d'export invalide (format, dépendance manquante)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def export_key(filters: Dict[str, str], fmt: str) -> str:
+    """Empreinte des filtres normalisés et du format"""
+    payload = json.dumps([filters, fmt], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class ExportJob:
+    """Job d'export et sa progression"""
+
+    def __init__(self, filters: Dict[str, str], fmt: str, key: str, fingerprint: str, artifact: str,
+                 job_id: Optional[str] = None, **state):
+        self.id = job_id or uuid.uuid4().hex
+        self.filters = filters
+        self.format = fmt
+        self.key = key
+        self.fingerprint = fingerprint
+        self.artifact = artifact
+        self.status = state.get('status', JobStatus.QUEUED)
+        self.cached = state.get('cached', False)
+        self.rows_exported = state.get('rows_exported', 0)
+        self.bytes_written = state.get('bytes_written', 0)
+        self.errors = state.get('errors', [])
+        self.result = state.get('result')
+        self.created_at = state.get('created_at', datetime.now().isoformat())
+        self.started_at = state.get('started_at')
+        self.finished_at = state.get('finished_at')
+        self.progress_callback = None
+
+    def update_progress(self, rows_processed: int, rows_failed: int, bytes_read: int, errors=None):
+        """Même signature que IngestJob (callback de JobManager)"""
+        self.rows_exported = rows_processed
+        self.bytes_written = bytes_read
+        if errors is not None:
+            self.errors = list(errors)
+
+    def to_state(self) -> Dict[str, Any]:
+        """État persisté dans Redis (aucun champ privé : l'artefact est exposé par son nom)"""
+        return self.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Représentation JSON exposée par /api/export/jobs/<id>"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'format': self.format,
+            'filters': self.filters,
+            'cached': self.cached,
+            'rows_exported': self.rows_exported,
+            'bytes_written': self.bytes_written,
+            'errors': self.errors,
+            'result': self.result,
+            'artifact': os.path.basename(self.artifact),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class ExportJobManager(JobManager):
+    """
+    Exports en arrière-plan avec artefacts réutilisables
+
+    Le nom de l'artefact combine l'empreinte des filtres normalisés et du
+    format avec celle des données couvertes (nombre de documents de chaque
+    index ciblé) : tant qu'aucun document n'arrive dans ces index, une
+    demande identique renvoie immédiatement le fichier existant ; sinon un
+    nouvel artefact remplace l'ancien. Les demandes identiques en cours
+    sont regroupées sur un seul job. Les artefacts sont écrits dans un
+    fichier temporaire puis renommés (jamais de fichier partiel servi) et
+    supprimés après EXPORT_ARTIFACT_TTL.
+
+    Exécution sur le pool local de JobManager, état copié dans Redis.
+    """
+
+    KEY_PREFIX = 'export:job:'
+
+    def __init__(self, es_client, index_resolver, export_dir: str, redis_client=None,
+                 max_workers: Optional[int] = None):
+        super().__init__(self._export, redis_client=redis_client,
+                         max_workers=max_workers or QueryConfig.EXPORT_JOB_WORKERS, backend='local')
+        self.es_client = es_client
+        self.index_resolver = index_resolver
+        self.export_dir = export_dir
+        self.exporter = HitExporter(es_client)
+        self._inflight: Dict[str, ExportJob] = {}
+        self._inflight_lock = threading.Lock()
+        os.makedirs(export_dir, exist_ok=True)
+
+    # --- Empreintes ---
+
+    def _index_expression(self, filters: Dict[str, str]) -> Optional[str]:
+        indices = self.index_resolver.resolve(filters.get('start_date'), filters.get('end_date'))
+        return None if indices == [] else self.index_resolver.expression(indices)
+
+    def fingerprint(self, index: Optional[str]) -> str:
+        """Version des données des index couverts (change dès qu'un document y est ajouté ou supprimé)"""
+        return data_version(self.es_client, index)
+
+    def _artifact_path(self, key: str, fingerprint: str, fmt: str) -> str:
+        return os.path.join(self.export_dir, f"{key}-{fingerprint}.{EXPORT_FORMATS[fmt]}")
+
+    # --- Demandes ---
+
+    def request_export(self, filters: Dict[str, str], fmt: str = 'csv.gz') -> Dict[str, Any]:
+        """
+        Job d'export des filtres donnés
+
+        Returns:
+            dict: état du job ; 'cached' vrai et statut completed si un
+            artefact à jour existait déjà
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ExportJobError(f"Unsupported format: {fmt} (expected {', '.join(EXPORT_FORMATS)})")
+        if fmt == 'parquet' and pyarrow is None:
+            raise ExportJobError("parquet export requires the 'pyarrow' package", 501)
+
+        filters = {name: filters[name] for name in EXPORT_FILTERS if filters.get(name)}
+        key = export_key(filters, fmt)
+        fingerprint = self.fingerprint(self._index_expression(filters))
+        artifact = self._artifact_path(key, fingerprint, fmt)
+        self._expire_artifacts()
+
+        if os.path.exists(artifact):
+            job = ExportJob(filters, fmt, key, fingerprint, artifact, status=JobStatus.COMPLETED,
+                            cached=True, bytes_written=os.path.getsize(artifact),
+                            result={'bytes': os.path.getsize(artifact), 'format': fmt})
+            job.started_at = job.finished_at = job.created_at
+            with self._lock:
+                self._prune()
+                self._jobs[job.id] = job
+            self._save(job)
+            return job.to_dict()
+
+        with self._inflight_lock:
+            for path in [path for path, job in self._inflight.items() if JobStatus.is_terminal(job.status)]:
+                del self._inflight[path]
+            job = self._inflight.get(artifact)
+            if job is not None and not JobStatus.is_terminal(job.status):
+                return job.to_dict()
+            job = self._inflight[artifact] = ExportJob(filters, fmt, key, fingerprint, artifact)
+        self.submit(job)
+        return job.to_dict()
+
+    def artifact_path(self, job_id: str) -> Optional[str]:
+        """Fichier d'un job terminé (None si inconnu, non terminé ou expiré)"""
+        job = self.get(job_id)
+        if job is None or job['status'] != JobStatus.COMPLETED:
+            return None
+        path = os.path.join(self.export_dir, job['artifact'])
+        return path if os.path.exists(path) else None
+
+    # --- Exécution ---
+
+    def _export(self, job: ExportJob) -> Dict[str, Any]:
+        index = self._index_expression(job.filters)
+        batches = iter(())
+        if index is not None:
+            batches = self.exporter.batches(self.exporter.open(index), export_query(**job.filters),
+                                            slices=QueryConfig.EXPORT_JOB_SLICES)
+
+        rows = [0]
+
+        def counted():
+            for hits in batches:
+                rows[0] += len(hits)
+                yield hits
+
+        partial = f"{job.artifact}.{job.id}.part"
+        try:
+            if job.format == 'parquet':
+                self._write_parquet(partial, counted(), job, rows)
+            else:
+                written = 0
+                with open(partial, 'wb') as output:
+                    for chunk in csv_chunks(counted(), hit_normalizer.row, compress=True):
+                        output.write(chunk)
+                        written += len(chunk)
+                        job.progress_callback(rows[0], 0, written)
+            os.replace(partial, job.artifact)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+        # L'artefact précédent des mêmes filtres est périmé
+        for path in glob.glob(os.path.join(self.export_dir, f"{job.key}-*.{EXPORT_FORMATS[job.format]}")):
+            if path != job.artifact:
+                os.remove(path)
+        size = os.path.getsize(job.artifact)
+        job.progress_callback(rows[0], 0, size)
+        return {'rows': rows[0], 'bytes': size, 'format': job.format}
+
+    @staticmethod
+    def _write_parquet(path: str, batches, job: ExportJob, rows):
+        """Un row group par lot non vide, colonnes texte"""
+        columns = [name.lower() for name in EXPORT_HEADER]
+        schema = pyarrow.schema([(name, pyarrow.string()) for name in columns])
+        with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+            for hits in batches:
+                if not hits:
+                    continue
+                values = list(zip(*(hit_normalizer.row(hit['_source']) for hit in hits)))
+                writer.write_table(pyarrow.table(
+                    [[None if value is None else str(value) for value in column] for column in values],
+                    schema=schema
+                ))
+                job.progress_callback(rows[0], 0, os.path.getsize(path))
+
+    def _expire_artifacts(self):
+        cutoff = time.time() - QueryConfig.EXPORT_ARTIFACT_TTL
+        for path in glob.glob(os.path.join(self.export_dir, '*-*.*')):
+            try:
+                if not path.endswith('.part') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
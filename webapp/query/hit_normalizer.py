@@ -0,0 +1,135 @@
+"""
+Hit Normalizer
+Maps search hits of any document shape to timestamp/level/service/message/user with a plan compiled per key set
+"""
+
+import threading
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from ingest.canonical import CANONICAL_FIELDS, SERVICE_FIELDS
+
+from .config import QueryConfig
+
+
+Row = Tuple[Any, Any, Any, Any, Any]
+
+
+Getter = Callable[[Dict[str, Any]], Any]
+
+
+def _constant(value: Any) -> Getter:
+    return lambda s: value
+
+
+def _get(keys, field: str, default: Any) -> Getter:
+    """Lit field s'il fait partie de la forme, sinon renvoie la valeur par défaut"""
+    return itemgetter(field) if field in keys else _constant(default)
+
+
+def _first(keys, fields: Tuple[str, ...], default: str) -> Getter:
+    """Premier champ non vide parmi ceux présents dans la forme"""
+    present = tuple(field for field in fields if field in keys)
+    if not present:
+        return _constant(default)
+
+    def first(s):
+        for field in present:
+            value = s[field]
+            if value and not isinstance(value, (dict, list)):
+                return value
+        return default
+    return first
+
+
+def _plan_getters(keys) -> Tuple[Getter, Getter, Getter, Getter, Getter]:
+    """
+    Accesseurs (timestamp, level, service, message, user) d'une forme de document
+
+    Mêmes règles que ingest.canonical.canonical_fields(), mais les tests de
+    présence sont résolus une fois pour toutes à partir du jeu de clés.
+    """
+    timestamp = _get(keys, '@timestamp', '')
+    if 'canonical_version' in keys and all(field in keys for field in CANONICAL_FIELDS):
+        return (timestamp, *(itemgetter(field) for field in CANONICAL_FIELDS))
+
+    fallback = 'E-commerce' if 'product_name' in keys or 'customer_name' in keys else 'Application'
+    service = _first(keys, SERVICE_FIELDS, fallback)
+    if 'Level' in keys:
+        message = itemgetter('message') if 'message' in keys else _get(keys, 'Message', '')
+        return timestamp, itemgetter('Level'), service, message, _get(keys, 'User', '')
+
+    level = itemgetter('level') if 'level' in keys else _get(keys, 'severity', 'INFO')
+    message = itemgetter('message') if 'message' in keys else _get(keys, 'msg', '')
+    user = itemgetter('user') if 'user' in keys else _get(keys, 'User', '')
+    if 'event' not in keys:
+        return timestamp, level, service, message, user
+
+    # Branche événement seulement si event est un texte : décidé par document
+    event_user, page = _get(keys, 'user', ''), _get(keys, 'page', '')
+
+    def pick(event_getter, generic_getter):
+        return lambda s: event_getter(s) if isinstance(s['event'], str) else generic_getter(s)
+
+    return (timestamp,
+            pick(_constant('INFO'), level),
+            pick(itemgetter('event'), service),
+            pick(lambda s: f"{s['event']} - User: {event_user(s)} - Page: {page(s)}", message),
+            pick(event_user, user))
+
+
+def compile_plan(keys: Iterable[str]) -> Callable[[Dict[str, Any]], Row]:
+    """Plan d'une forme : une fonction sans test de clé à l'exécution"""
+    keys = frozenset(keys)
+    if 'canonical_version' in keys and '@timestamp' in keys and all(field in keys for field in CANONICAL_FIELDS):
+        # Document canonicalisé : un seul itemgetter renvoie directement la ligne
+        return itemgetter('@timestamp', *CANONICAL_FIELDS)
+
+    timestamp, level, service, message, user = _plan_getters(keys)
+    return lambda s: (timestamp(s), level(s), service(s), message(s), user(s))
+
+
+class HitNormalizer:
+    """
+    Normalisation des hits partagée par la recherche, l'export CSV et le dashboard
+
+    Les documents canonicalisés à l'ingestion sont lus tels quels ; les plus
+    anciens passent par le plan compilé de leur forme. Le plan est mis en
+    cache par tuple de clés (l'ordre des clés d'une même forme est stable
+    dans _source) : le coût par hit est un lookup de dict et un appel.
+    """
+
+    def __init__(self, max_plans: Optional[int] = None):
+        self.max_plans = max_plans or QueryConfig.MAX_NORMALIZER_PLANS
+        self._plans: Dict[Tuple[str, ...], Callable[[Dict[str, Any]], Row]] = {}
+        self._lock = threading.Lock()
+
+    def _plan(self, keys: Tuple[str, ...]) -> Callable[[Dict[str, Any]], Row]:
+        with self._lock:
+            plan = self._plans.get(keys)
+            if plan is None:
+                if len(self._plans) >= self.max_plans:
+                    # Formes pathologiques (clés dynamiques) : repartir d'un cache vide
+                    self._plans.clear()
+                plan = self._plans[keys] = compile_plan(keys)
+            return plan
+
+    def row(self, source: Dict[str, Any]) -> Row:
+        """(timestamp, level, service, message, user) d'un _source"""
+        keys = tuple(source)
+        plan = self._plans.get(keys) or self._plan(keys)
+        return plan(source)
+
+    def hit(self, hit: Dict[str, Any]) -> Dict[str, Any]:
+        """Hit au format de l'API (_id, timestamp, level, service, message, user)"""
+        timestamp, level, service, message, user = self.row(hit['_source'])
+        return {'_id': hit['_id'], 'timestamp': timestamp, 'level': level,
+                'service': service, 'message': message, 'user': user}
+
+    @property
+    def plan_count(self) -> int:
+        return len(self._plans)
+
+
+# Instance partagée par les handlers (les plans compilés sont réutilisés entre requêtes)
+hit_normalizer = HitNormalizer()
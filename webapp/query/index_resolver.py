@@ -0,0 +1,265 @@
+"""
+Index Resolver
+Turns a requested date range into the concrete daily indices to query instead of a global wildcard
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from dateutil import parser as date_parser
+from dateutil.relativedelta import relativedelta
+
+from .config import QueryConfig
+
+
+# Sous-ensemble de la date math Elasticsearch : now, now-7d, now/d, now-1M/M...
+_DATE_MATH = re.compile(r'^now(?:([+-])(\d+)([smhdwMy]))?(?:/([dwMy]))?$')
+
+_UNITS = {
+    's': lambda n: relativedelta(seconds=n),
+    'm': lambda n: relativedelta(minutes=n),
+    'h': lambda n: relativedelta(hours=n),
+    'd': lambda n: relativedelta(days=n),
+    'w': lambda n: relativedelta(weeks=n),
+    'M': lambda n: relativedelta(months=n),
+    'y': lambda n: relativedelta(years=n),
+}
+
+
+def parse_day(value: Any, now: Optional[datetime] = None) -> Optional[date]:
+    """
+    Jour (UTC) d'une borne de plage : ISO 8601, epoch millisecondes ou date math « now-7d/d »
+
+    Returns:
+        date, ou None si la valeur n'est pas interprétable
+    """
+    if value is None or value == '':
+        return None
+    now = now or datetime.now(timezone.utc)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).date()
+
+    value = str(value).strip()
+    match = _DATE_MATH.match(value)
+    if match:
+        sign, amount, unit, _rounding = match.groups()
+        moment = now
+        if sign:
+            delta = _UNITS[unit](int(amount))
+            moment = moment + delta if sign == '+' else moment - delta
+        # L'arrondi (/d, /M...) ne change pas le jour de la borne basse ; la marge couvre la borne haute
+        return moment.astimezone(timezone.utc).date()
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc).date()
+    try:
+        parsed = date_parser.isoparse(value.split('||')[0])
+    except (ValueError, OverflowError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.date()
+
+
+def data_version(es_client, index: Optional[str]) -> str:
+    """
+    Version des données d'une expression d'index (None : aucun index)
+
+    Empreinte du nombre de documents et de suppressions de chaque index :
+    elle change dès qu'un document y est ajouté, modifié ou supprimé.
+    """
+    if index is None:
+        return 'empty'
+    stats = es_client.indices.stats(index=index, metric='docs', ignore_unavailable=True)
+    state = sorted((name, data['primaries']['docs']['count'], data['primaries']['docs']['deleted'])
+                   for name, data in stats['indices'].items())
+    return hashlib.sha256(json.dumps(state).encode('utf-8')).hexdigest()[:16]
+
+
+class IndexResolver:
+    """
+    Résolution des index quotidiens couvrant une plage de dates
+
+    Le catalogue des index est mis en cache INDEX_CATALOGUE_TTL secondes
+    (et rechargé au changement de jour UTC). Pour chaque index il retient le
+    jour du nom et les jours réellement couverts par son contenu : min/max
+    de @timestamp, étendus au jour du nom. Uploads, scripts et Logstash
+    routent par date d'événement, le nom suffit donc pour la plupart des
+    index ; les bornes restent nécessaires pour l'index fixe des documents
+    non datés (horodatés au chargement) et pour les index écrits avant ce
+    routage, qui regroupaient les documents au jour de chargement. Une
+    fenêtre « aujourd'hui » ou « 7 derniers jours » ne touche donc que les
+    index qui peuvent contenir des documents de la fenêtre. En cas de doute
+    (borne illisible, catalogue ou bornes indisponibles) le wildcard global
+    est utilisé.
+    """
+
+    def __init__(self, es_client, prefix: Optional[str] = None, ttl: Optional[float] = None,
+                 margin_days: Optional[int] = None):
+        self.es_client = es_client
+        self.prefix = prefix or QueryConfig.INDEX_PREFIX
+        self.ttl = QueryConfig.INDEX_CATALOGUE_TTL if ttl is None else ttl
+        self.margin = timedelta(days=QueryConfig.INDEX_DATE_MARGIN_DAYS if margin_days is None else margin_days)
+        self._pattern = re.compile(rf'^{re.escape(self.prefix)}-(\d{{4}})\.(\d{{2}})\.(\d{{2}})$')
+        self._catalogue: Optional[List[Tuple[str, Optional[date]]]] = None
+        self._spans: Optional[Dict[str, Optional[Tuple[date, date]]]] = None
+        self._loaded_at = 0.0
+        self._loaded_day: Optional[date] = None
+        self._lock = threading.Lock()
+
+    @property
+    def wildcard(self) -> str:
+        return f"{self.prefix}-*"
+
+    # --- Catalogue ---
+
+    def _load(self) -> List[Tuple[str, Optional[date]]]:
+        rows = self.es_client.cat.indices(index=self.wildcard, h='index,status', format='json')
+        catalogue = []
+        for row in rows:
+            if row.get('status') == 'close':
+                continue
+            name = row['index']
+            match = self._pattern.match(name)
+            day = None
+            if match:
+                try:
+                    day = date(*(int(part) for part in match.groups()))
+                except ValueError:
+                    day = None
+            catalogue.append((name, day))
+        # Index datés triés par jour, index non datés en tête
+        catalogue.sort(key=lambda item: (item[1] is not None, item[1] or date.min, item[0]))
+        return catalogue
+
+    def _load_spans(self, catalogue: List[Tuple[str, Optional[date]]]) -> Dict[str, Optional[Tuple[date, date]]]:
+        """
+        Jours couverts par chaque index (None : aucun document horodaté ni jour dans le nom)
+
+        Une seule agrégation terms sur _index avec min/max de @timestamp.
+        """
+        result = self.es_client.search(
+            index=self.wildcard,
+            size=0,
+            aggs={'indices': {
+                'terms': {'field': '_index', 'size': max(1, len(catalogue))},
+                'aggs': {'first': {'min': {'field': '@timestamp'}}, 'last': {'max': {'field': '@timestamp'}}}
+            }}
+        )
+        found = {}
+        for bucket in result['aggregations']['indices']['buckets']:
+            first, last = bucket['first'].get('value'), bucket['last'].get('value')
+            if first is not None and last is not None:
+                found[bucket['key']] = (datetime.fromtimestamp(first / 1000, tz=timezone.utc).date(),
+                                        datetime.fromtimestamp(last / 1000, tz=timezone.utc).date())
+
+        spans = {}
+        for name, day in catalogue:
+            span = found.get(name)
+            if day is not None:
+                span = (min(span[0], day), max(span[1], day)) if span else (day, day)
+            spans[name] = span
+        return spans
+
+    def _snapshot(self) -> Tuple[List[Tuple[str, Optional[date]]], Optional[Dict[str, Optional[Tuple[date, date]]]]]:
+        with self._lock:
+            today = datetime.now(timezone.utc).date()
+            if (self._catalogue is None or time.monotonic() - self._loaded_at > self.ttl
+                    or self._loaded_day != today):
+                catalogue = self._load()
+                try:
+                    self._spans = self._load_spans(catalogue)
+                except Exception as e:
+                    print(f"[WARNING] Index bounds unavailable, date ranges will query {self.wildcard}: {e}")
+                    self._spans = None
+                self._catalogue = catalogue
+                self._loaded_at = time.monotonic()
+                self._loaded_day = today
+            return self._catalogue, self._spans
+
+    def catalogue(self) -> List[Tuple[str, Optional[date]]]:
+        """Index ouverts du préfixe et leur jour (None pour un nom non daté)"""
+        return self._snapshot()[0]
+
+    def invalidate(self):
+        """Oublie le catalogue (après une ingestion qui a pu créer des index ou étendre leurs bornes)"""
+        with self._lock:
+            self._catalogue = None
+            self._spans = None
+
+    # --- Résolution ---
+
+    def resolve(self, start: Any = None, end: Any = None) -> Optional[List[str]]:
+        """
+        Index dont le contenu recoupe [start, end] (marge de INDEX_DATE_MARGIN_DAYS de chaque côté)
+
+        Returns:
+            list des index (vide : aucun index ne peut contenir de document
+            de la fenêtre, la requête peut être court-circuitée), ou None pour
+            interroger le wildcard global
+        """
+        if not start and not end:
+            return None
+        start_day = parse_day(start) if start else None
+        end_day = parse_day(end) if end else None
+        if (start and start_day is None) or (end and end_day is None):
+            return None
+
+        low = start_day - self.margin if start_day else None
+        high = end_day + self.margin if end_day else None
+        try:
+            catalogue, spans = self._snapshot()
+        except Exception as e:
+            print(f"[WARNING] Index catalogue unavailable, querying {self.wildcard}: {e}")
+            return None
+        if spans is None:
+            return None
+        indices = []
+        for name, _day in catalogue:
+            span = spans.get(name)
+            if span is None:
+                continue
+            first, last = span
+            if (low is None or last >= low) and (high is None or first <= high):
+                indices.append(name)
+        return indices
+
+    def latest(self, count: Optional[int] = None) -> Optional[List[str]]:
+        """Les count index quotidiens les plus récents (None si le catalogue est indisponible)"""
+        count = count or QueryConfig.RECENT_INDEX_COUNT
+        try:
+            catalogue = self.catalogue()
+        except Exception as e:
+            print(f"[WARNING] Index catalogue unavailable, querying {self.wildcard}: {e}")
+            return None
+        return [name for name, day in catalogue if day is not None][-count:]
+
+    def expression(self, indices: Optional[List[str]]) -> str:
+        """
+        Expression d'index pour l'API search/count
+
+        Les mois dont tous les index sont sélectionnés deviennent un wildcard
+        mensuel quand la liste dépasse MAX_INDEX_EXPRESSION_LENGTH (longueur d'URL).
+        """
+        if indices is None:
+            return self.wildcard
+        expression = ','.join(indices)
+        if len(expression) <= QueryConfig.MAX_INDEX_EXPRESSION_LENGTH:
+            return expression
+
+        selected = set(indices)
+        months = {}
+        for name, day in self.catalogue():
+            if day is not None:
+                months.setdefault(day.strftime('%Y.%m'), []).append(name)
+        parts, covered = [], set()
+        for month, names in sorted(months.items()):
+            if all(name in selected for name in names):
+                parts.append(f"{self.prefix}-{month}.*")
+                covered.update(names)
+        parts.extend(name for name in indices if name not in covered)
+        return ','.join(parts)
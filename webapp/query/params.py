@@ -0,0 +1,66 @@
+"""
+Search Parameters
+Normalizes /api/search GET and POST parameters into one canonical form shared by the handler and the cache key
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from dateutil import parser as date_parser
+
+from .config import QueryConfig
+
+
+# Noms GET -> noms du corps POST
+SEARCH_PARAM_ALIASES = {'q': 'query'}
+
+SEARCH_PARAMS = ('query', 'level', 'service', 'start_date', 'end_date', 'size', 'from', 'cursor', 'pagination')
+
+
+def search_params(request_obj) -> Dict[str, str]:
+    """
+    Paramètres de recherche normalisés (GET ou POST)
+
+    Les deux formes produisent le même dictionnaire : alias résolus
+    (q -> query), valeurs converties en chaînes sans espaces superflus,
+    paramètres vides ou inconnus supprimés.
+    """
+    raw: Dict[str, Any] = dict(request_obj.args.items())
+    if request_obj.method == 'POST':
+        raw.update(request_obj.get_json(silent=True) or {})
+
+    params = {}
+    for name, value in raw.items():
+        name = SEARCH_PARAM_ALIASES.get(name, name)
+        if name not in SEARCH_PARAMS or value is None:
+            continue
+        value = str(value).strip()
+        if value:
+            params[name] = value
+    return params
+
+
+def _parse_moment(value: str) -> Optional[datetime]:
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc)
+    try:
+        moment = date_parser.isoparse(value)
+    except (ValueError, OverflowError):
+        return None
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=timezone.utc)
+
+
+def range_is_closed(end_date: Optional[str], now: Optional[datetime] = None) -> bool:
+    """
+    Vrai si la plage se termine dans le passé (au-delà de SEARCH_LIVE_MARGIN)
+
+    Sans borne haute, avec une date math « now… » ou une borne illisible, la
+    plage est considérée ouverte : de nouveaux logs peuvent encore y entrer.
+    """
+    if not end_date or 'now' in end_date:
+        return False
+    end = _parse_moment(end_date)
+    if end is None:
+        return False
+    now = now or datetime.now(timezone.utc)
+    return end < now - timedelta(seconds=QueryConfig.SEARCH_LIVE_MARGIN)
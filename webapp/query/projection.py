@@ -0,0 +1,61 @@
+"""
+Source Projection
+Requests only the fields the log endpoints return and fetches the legacy fields of pre-canonical hits on demand
+"""
+
+from typing import Any, Dict, List
+
+from ingest.canonical import CANONICAL_FIELDS, LEGACY_SOURCE_FIELDS
+
+from .config import QueryConfig
+
+
+# _source des hits de /api/search, /api/export/csv et des « derniers logs » du dashboard
+LOG_SOURCE = ['@timestamp', 'canonical_version', *CANONICAL_FIELDS]
+
+# Réponse réduite à ce que les handlers lisent (ni _score, ni sort, ni _shards)
+LOG_FILTER_PATH = ['took', 'hits.total', 'hits.hits._id', 'hits.hits._index', 'hits.hits._source']
+
+# Champ historique des champs canoniques filtrés ou agrégés par les handlers
+LEGACY_FILTER_FIELDS = {'level': 'Level', 'service': 'Service'}
+
+# Documents indexés avant la canonicalisation
+LEGACY_DOCUMENTS = {'bool': {'must_not': [{'exists': {'field': 'canonical_version'}}]}}
+
+
+def canonical_term(field: str, value: Any) -> Dict[str, Any]:
+    """
+    Filtre term sur un champ canonique (level, service)
+
+    Les documents sans canonical_version n'ont que le champ historique
+    (Level, Service) : ils sont filtrés sur celui-ci, et seulement eux.
+    """
+    return {'bool': {'should': [
+        {'term': {field: value}},
+        {'bool': {'filter': [{'term': {LEGACY_FILTER_FIELDS[field]: value}}], **LEGACY_DOCUMENTS['bool']}}
+    ], 'minimum_should_match': 1}}
+
+
+def complete_legacy_sources(es_client, hits: List[Dict[str, Any]]) -> int:
+    """
+    Recharge les champs historiques des hits indexés avant la canonicalisation
+
+    La projection LOG_SOURCE suffit aux documents canonicalisés (le cas
+    courant). Pour les autres, un mget ne récupère que LEGACY_SOURCE_FIELDS
+    et remplace leur _source, en lots de LEGACY_MGET_BATCH_SIZE.
+
+    Returns:
+        int: nombre de hits complétés
+    """
+    legacy = [hit for hit in hits if 'canonical_version' not in hit.get('_source', {})]
+    batch_size = QueryConfig.LEGACY_MGET_BATCH_SIZE
+    for start in range(0, len(legacy), batch_size):
+        batch = legacy[start:start + batch_size]
+        response = es_client.mget(
+            docs=[{'_index': hit['_index'], '_id': hit['_id']} for hit in batch],
+            _source_includes=list(LEGACY_SOURCE_FIELDS)
+        )
+        for hit, doc in zip(batch, response['docs']):
+            if doc.get('found'):
+                hit['_source'] = doc.get('_source', {})
+    return len(legacy)
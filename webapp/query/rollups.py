@@ -0,0 +1,469 @@
+"""
+Order Rollups
+Materializes hourly order summaries per dimension and answers the /api/results analytics from them plus the raw tail
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from redis.exceptions import LockError
+
+from ingest.bulk_indexer import BulkIndexer
+
+from .config import QueryConfig
+from .index_resolver import parse_day
+
+
+ROLLUP_VERSION = 2
+
+# Nom de la source composite -> champ des documents bruts (mêmes noms dans les rollups)
+ROLLUP_DIMENSIONS = (
+    ('customer_country', 'customer_country'),
+    ('product_name', 'product_name.keyword'),
+    ('product_category', 'product_category'),
+    ('payment_method', 'payment_method'),
+    ('order_status', 'order_status'),
+)
+
+# Verrou Redis partagé par les processus qui matérialisent (webapp, materialize_rollups.py)
+ROLLUP_LOCK_KEY = 'rollups:materialize:lock'
+
+KIND_HOURLY = 'hourly'
+KIND_STATE = 'state'
+
+# Commande brute : 1 ; document de rollup : son order_count
+_ORDERS = {'sum': {'field': 'order_count', 'missing': 1}}
+
+
+def rollup_mappings() -> Dict[str, Any]:
+    """Mapping de l'index des rollups (mêmes noms et familles de types que ecommerce-logs-*)"""
+    keyword = {'type': 'keyword'}
+    return {
+        'dynamic': 'strict',
+        'properties': {
+            'kind': keyword,
+            'day': keyword,
+            'rollup_version': {'type': 'short'},
+            'source_docs': {'type': 'long'},
+            '@timestamp': {'type': 'date'},
+            'customer_country': keyword,
+            'product_name': {'type': 'text', 'fields': {'keyword': {'type': 'keyword', 'ignore_above': 256}}},
+            'product_category': keyword,
+            'payment_method': keyword,
+            'order_status': keyword,
+            'customer_id': keyword,
+            'order_count': {'type': 'integer'},
+            'total_amount': {'type': 'double'},
+            'quantity': {'type': 'long'}
+        }
+    }
+
+
+def results_aggs() -> Dict[str, Any]:
+    """
+    Agrégations de /api/results, valables sur les commandes brutes comme sur les rollups
+
+    Les comptes sont des sommes de order_count (1 pour une commande brute),
+    jamais des doc_count.
+    """
+    def by(field: str, size: int = 10, order: str = 'orders', **sums) -> Dict[str, Any]:
+        aggs = {'orders': _ORDERS}
+        aggs.update({name: {'sum': {'field': source}} for name, source in sums.items()})
+        return {'terms': {'field': field, 'size': size, 'order': {order: 'desc'}}, 'aggs': aggs}
+
+    return {
+        'total_revenue': {'sum': {'field': 'total_amount'}},
+        'total_orders': _ORDERS,
+        'unique_customers': {'cardinality': {'field': 'customer_id'}},
+        'orders_by_country': by('customer_country', country_revenue='total_amount'),
+        'top_products': by('product_name.keyword', order='product_revenue',
+                           product_revenue='total_amount', quantity_sold='quantity'),
+        'orders_by_category': by('product_category'),
+        'orders_over_time': {
+            'date_histogram': {'field': '@timestamp', 'calendar_interval': 'hour'},
+            'aggs': {'orders': _ORDERS, 'hourly_revenue': {'sum': {'field': 'total_amount'}}}
+        },
+        'payment_methods': by('payment_method'),
+        'order_status': by('order_status')
+    }
+
+
+def format_results(aggs: Dict[str, Any]) -> Dict[str, Any]:
+    """Réponse de /api/results à partir des agrégations de results_aggs()"""
+    def orders(bucket):
+        return int(bucket['orders']['value'])
+
+    total_orders = int(aggs['total_orders']['value'])
+    total_revenue = aggs['total_revenue']['value']
+    return {
+        'summary': {
+            'total_revenue': round(total_revenue, 2),
+            'total_orders': total_orders,
+            'avg_order_value': round(total_revenue / total_orders, 2) if total_orders else 0,
+            'unique_customers': aggs['unique_customers']['value']
+        },
+        'by_country': [
+            {'country': b['key'], 'orders': orders(b), 'revenue': round(b['country_revenue']['value'], 2)}
+            for b in aggs['orders_by_country']['buckets']
+        ],
+        'top_products': [
+            {'product': b['key'], 'orders': orders(b), 'revenue': round(b['product_revenue']['value'], 2),
+             'quantity': b['quantity_sold']['value']}
+            for b in aggs['top_products']['buckets']
+        ],
+        'by_category': [{'category': b['key'], 'count': orders(b)} for b in aggs['orders_by_category']['buckets']],
+        'over_time': [
+            {'timestamp': b['key_as_string'], 'orders': orders(b), 'revenue': round(b['hourly_revenue']['value'], 2)}
+            for b in aggs['orders_over_time']['buckets']
+        ],
+        'payment_methods': [{'method': b['key'], 'count': orders(b)} for b in aggs['payment_methods']['buckets']],
+        'order_status': [{'status': b['key'], 'count': orders(b)} for b in aggs['order_status']['buckets']]
+    }
+
+
+def _day_range(day) -> Dict[str, Any]:
+    """[day, day + 1) en UTC"""
+    return {'range': {'@timestamp': {'gte': f"{day.isoformat()}T00:00:00Z",
+                                     'lt': f"{(day + timedelta(days=1)).isoformat()}T00:00:00Z"}}}
+
+
+def _unit_filter(index: str, day) -> Dict[str, Any]:
+    """Documents d'un index quotidien datés de son jour : ce que résume le rollup de ce jour"""
+    return {'bool': {'filter': [{'term': {'_index': index}}, _day_range(day)]}}
+
+
+class OrderRollups:
+    """
+    Rollups horaires des commandes pour /api/results
+
+    Chaque jour révolu (au moins ROLLUP_MIN_AGE_DAYS) de ecommerce-logs-* est
+    résumé par une agrégation composite en un document par heure et par
+    combinaison pays / produit / catégorie / paiement / statut (nombre de
+    commandes, chiffre d'affaires, quantité, clients distincts). Le rollup
+    d'un jour ne porte que sur les commandes de l'index de ce jour dont le
+    @timestamp tombe dans le jour. Les documents sont routés par date
+    d'événement, mais ce filtre reste nécessaire pour l'index non daté et
+    les index écrits avant ce routage (documents groupés au jour de
+    chargement) : leurs commandes hors du jour restent lues brutes. Un document
+    d'état par jour retient ce nombre de commandes ; un upload qui en ajoute
+    rend le jour « sale » et il est recalculé au passage suivant.
+
+    /api/results interroge en une seule requête les rollups des jours à jour
+    entièrement inclus dans la fenêtre et les commandes brutes de tous les
+    index de la fenêtre, moins celles que résument ces rollups : le volume
+    brut lu ne dépend plus de l'historique. Les clients distincts
+    (cardinality, non additive) restent calculés sur les identifiants
+    stockés par heure.
+
+    Un seul passage de matérialisation à la fois : verrou du processus et,
+    avec Redis, verrou partagé entre réplicas. Après un upload, le passage
+    est demandé à un thread de fond (request_materialize), hors du chemin
+    de l'ingestion.
+    """
+
+    def __init__(self, es_client, index_resolver, rollup_index: Optional[str] = None, redis_client=None):
+        self.es_client = es_client
+        self.index_resolver = index_resolver
+        self.rollup_index = rollup_index or QueryConfig.ROLLUP_INDEX
+        self.redis_client = redis_client
+        self._lock = threading.Lock()
+        self._worker_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._requested = False
+
+    # --- Matérialisation ---
+
+    def ensure_index(self):
+        if not self.es_client.indices.exists(index=self.rollup_index):
+            self.es_client.indices.create(index=self.rollup_index, mappings=rollup_mappings(),
+                                          settings={'number_of_shards': 1})
+
+    def _source_counts(self, units: List[Tuple[str, Any]]) -> Dict[str, int]:
+        """Nombre de commandes de chaque index quotidien datées de son jour (une requête filters)"""
+        if not units:
+            return {}
+        response = self.es_client.search(
+            index=self.index_resolver.expression([name for name, _ in units]),
+            size=0,
+            query={'exists': {'field': 'order_id'}},
+            aggs={'units': {'filters': {'filters': {name: _unit_filter(name, day) for name, day in units}}}},
+            ignore_unavailable=True
+        )
+        return {name: bucket['doc_count'] for name, bucket in response['aggregations']['units']['buckets'].items()}
+
+    def _states(self, days: List[str]) -> Dict[str, int]:
+        """Nombre de commandes du jour au moment du dernier rollup de chaque jour"""
+        if not days:
+            return {}
+        # Index des rollups pas encore créé : aucun jour résumé
+        response = self.es_client.options(ignore_status=404).mget(index=self.rollup_index,
+                                                                 ids=[f"state-{day}" for day in days])
+        return {doc['_source']['day']: doc['_source']['source_docs']
+                for doc in response.body.get('docs', []) if doc.get('found')
+                and doc['_source'].get('rollup_version') == ROLLUP_VERSION}
+
+    @staticmethod
+    def _day_key(day) -> str:
+        return day.strftime('%Y.%m.%d')
+
+    @staticmethod
+    def _page_size() -> int:
+        """Buckets par page composite : page × (1 + clients par bucket) reste sous search.max_buckets"""
+        return max(1, min(QueryConfig.ROLLUP_COMPOSITE_SIZE,
+                          QueryConfig.ROLLUP_MAX_BUCKETS // (QueryConfig.ROLLUP_MAX_CUSTOMERS + 1)))
+
+    def _bucket_customers(self, index: str, filters: List[Dict[str, Any]], key: Dict[str, Any]) -> List[Any]:
+        """Tous les clients d'un bucket horaire qui dépasse ROLLUP_MAX_CUSTOMERS (composite paginé)"""
+        filters = filters + [{'range': {'@timestamp': {'gte': key['hour'], 'lt': key['hour'] + 3600 * 1000,
+                                                       'format': 'epoch_millis'}}}]
+        must_not = []
+        for name, field in ROLLUP_DIMENSIONS:
+            if key.get(name) is None:
+                must_not.append({'exists': {'field': field}})
+            else:
+                filters.append({'term': {field: key[name]}})
+        composite = {'size': QueryConfig.ROLLUP_COMPOSITE_SIZE,
+                     'sources': [{'customer': {'terms': {'field': 'customer_id'}}}]}
+        customers = []
+        while True:
+            response = self.es_client.search(index=index, size=0,
+                                             query={'bool': {'filter': filters, 'must_not': must_not}},
+                                             aggs={'customers': {'composite': composite}})
+            page = response['aggregations']['customers']
+            customers.extend(bucket['key']['customer'] for bucket in page['buckets'])
+            if len(page['buckets']) < composite['size'] or 'after_key' not in page:
+                return customers
+            composite = dict(composite, after=page['after_key'])
+
+    def _hourly_docs(self, index: str, day) -> Iterator[Dict[str, Any]]:
+        """Documents horaires des commandes d'un index datées de son jour, page par page d'agrégation composite"""
+        day_key = self._day_key(day)
+        filters = [{'exists': {'field': 'order_id'}}, _day_range(day)]
+        sources = [{'hour': {'date_histogram': {'field': '@timestamp', 'fixed_interval': '1h'}}}]
+        sources += [{name: {'terms': {'field': field, 'missing_bucket': True}}} for name, field in ROLLUP_DIMENSIONS]
+        composite = {'size': self._page_size(), 'sources': sources}
+        while True:
+            response = self.es_client.search(index=index, size=0, query={'bool': {'filter': filters}}, aggs={
+                'hours': {
+                    'composite': composite,
+                    'aggs': {
+                        'total_amount': {'sum': {'field': 'total_amount'}},
+                        'quantity': {'sum': {'field': 'quantity'}},
+                        'customers': {'terms': {'field': 'customer_id', 'size': QueryConfig.ROLLUP_MAX_CUSTOMERS}}
+                    }
+                }
+            })
+            hours = response['aggregations']['hours']
+            for bucket in hours['buckets']:
+                key = bucket['key']
+                customers = [customer['key'] for customer in bucket['customers']['buckets']]
+                if bucket['customers'].get('sum_other_doc_count'):
+                    customers = self._bucket_customers(index, filters, key)
+                doc = {
+                    'kind': KIND_HOURLY,
+                    'day': day_key,
+                    'rollup_version': ROLLUP_VERSION,
+                    '@timestamp': key['hour'],
+                    'order_count': bucket['doc_count'],
+                    'total_amount': bucket['total_amount']['value'],
+                    'quantity': int(bucket['quantity']['value']),
+                    'customer_id': customers
+                }
+                doc.update({name: key[name] for name, _ in ROLLUP_DIMENSIONS if key.get(name) is not None})
+                doc_id = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+                yield {'_index': self.rollup_index, '_id': f"{day_key}-{doc_id}", '_source': doc}
+            if len(hours['buckets']) < composite['size'] or 'after_key' not in hours:
+                return
+            composite = dict(composite, after=hours['after_key'])
+
+    def roll_day(self, index: str, day, source_docs: int) -> int:
+        """Recalcule les rollups d'un jour ; le jour n'est servi par les rollups qu'une fois l'état écrit"""
+        day_key = self._day_key(day)
+        self.es_client.options(ignore_status=404).delete(index=self.rollup_index, id=f"state-{day_key}",
+                                                          refresh=True)
+        self.es_client.delete_by_query(index=self.rollup_index, query={'term': {'day': day_key}},
+                                       conflicts='proceed', refresh=True)
+        result = BulkIndexer(self.es_client).index(self._hourly_docs(index, day))
+        if result.failed:
+            raise RuntimeError(f"{result.failed} rollup documents of {day_key} were rejected")
+        self.es_client.indices.refresh(index=self.rollup_index)
+        self.es_client.index(index=self.rollup_index, id=f"state-{day_key}", refresh=True, document={
+            'kind': KIND_STATE, 'day': day_key, 'source_docs': source_docs, 'rollup_version': ROLLUP_VERSION
+        })
+        return result.indexed
+
+    def materialize(self, today=None) -> Optional[Dict[str, Any]]:
+        """
+        Met à jour les rollups des jours nouveaux ou modifiés, supprime ceux des index disparus
+
+        Returns:
+            dict: jours recalculés, à jour, ignorés (trop récents), supprimés,
+            erreurs ; None si un autre processus matérialise déjà
+        """
+        with self._lock:
+            shared = None
+            if self.redis_client is not None:
+                shared = self.redis_client.lock(ROLLUP_LOCK_KEY, timeout=QueryConfig.ROLLUP_LOCK_TTL)
+                if not shared.acquire(blocking=False):
+                    return None
+            try:
+                return self._materialize(today)
+            finally:
+                if shared is not None:
+                    try:
+                        shared.release()
+                    except LockError:
+                        pass  # verrou expiré pendant un passage plus long que ROLLUP_LOCK_TTL
+
+    def _materialize(self, today=None) -> Dict[str, Any]:
+        self.ensure_index()
+        today = today or datetime.now(timezone.utc).date()
+        watermark = today - timedelta(days=QueryConfig.ROLLUP_MIN_AGE_DAYS)
+        dated = [(name, day) for name, day in self.index_resolver.catalogue() if day is not None]
+        past = [(name, day) for name, day in dated if day <= watermark]
+        counts = self._source_counts(past)
+        states = self._states([self._day_key(day) for _, day in past])
+
+        report = {'rolled': [], 'up_to_date': 0, 'pending': len(dated) - len(past), 'removed': [],
+                  'documents': 0, 'errors': []}
+        for name, day in past:
+            day_key = self._day_key(day)
+            if name not in counts:
+                continue
+            if states.get(day_key) == counts[name]:
+                report['up_to_date'] += 1
+                continue
+            try:
+                report['documents'] += self.roll_day(name, day, counts[name])
+                report['rolled'].append(day_key)
+            except Exception as e:
+                report['errors'].append({'day': day_key, 'error': str(e)})
+
+        # Index supprimés (rétention) : leurs rollups ne doivent plus compter
+        live = {self._day_key(day) for _, day in dated}
+        response = self.es_client.search(index=self.rollup_index, size=10000, source=['day'],
+                                         query={'term': {'kind': KIND_STATE}})
+        for hit in response['hits']['hits']:
+            day_key = hit['_source']['day']
+            if day_key not in live:
+                self.es_client.delete_by_query(index=self.rollup_index, query={'term': {'day': day_key}},
+                                               conflicts='proceed', refresh=True)
+                report['removed'].append(day_key)
+        return report
+
+    def request_materialize(self):
+        """
+        Demande un passage de matérialisation en arrière-plan
+
+        Les demandes reçues pendant un passage sont regroupées en un seul
+        passage suivant. Si un autre processus tient le verrou Redis, le
+        passage est retenté après ROLLUP_LOCK_RETRY secondes.
+        """
+        with self._worker_lock:
+            self._requested = True
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run_requested, name='order-rollups', daemon=True)
+                self._worker.start()
+
+    def _run_requested(self):
+        while True:
+            with self._worker_lock:
+                if not self._requested:
+                    self._worker = None
+                    return
+                self._requested = False
+            try:
+                report = self.materialize()
+            except Exception as e:
+                print(f"[WARNING] Order rollups not refreshed: {e}")
+                continue
+            if report is None:
+                with self._worker_lock:
+                    self._requested = True
+                time.sleep(QueryConfig.ROLLUP_LOCK_RETRY)
+            elif report['rolled'] or report['removed']:
+                print(f"[OK] Order rollups: {len(report['rolled'])} day(s) rolled up, "
+                      f"{len(report['removed'])} removed")
+
+    # --- Lecture ---
+
+    def plan(self, start: Any = None, end: Any = None, use_rollups: bool = True) -> Tuple[List[str], Optional[List[str]]]:
+        """
+        Jours servis par les rollups et index bruts de la fenêtre
+
+        Un jour passe par les rollups s'il est à jour et strictement compris
+        entre les jours des bornes (entièrement couvert quel que soit le
+        format ou le fuseau des bornes). Les index bruts sont tous ceux de la
+        fenêtre : les commandes d'un jour en rollup datées d'un autre jour y
+        restent lues. Ils valent None quand le catalogue est indisponible
+        (wildcard, sans rollups).
+
+        Returns:
+            tuple: (clés des jours en rollup, index bruts)
+        """
+        indices = self.index_resolver.resolve(start, end)
+        try:
+            catalogue = self.index_resolver.catalogue()
+        except Exception as e:
+            print(f"[WARNING] Index catalogue unavailable, aggregating raw orders: {e}")
+            return [], indices
+        scope = [(name, day) for name, day in catalogue if indices is None or name in indices]
+        start_day = parse_day(start) if start else None
+        end_day = parse_day(end) if end else None
+        if not use_rollups or (start and start_day is None) or (end and end_day is None):
+            return [], [name for name, _ in scope]
+
+        inner = [(name, day) for name, day in scope if day is not None
+                 and (start_day is None or day > start_day) and (end_day is None or day < end_day)]
+        try:
+            counts = self._source_counts(inner)
+            states = self._states([self._day_key(day) for _, day in inner])
+        except Exception as e:
+            print(f"[WARNING] Rollups unavailable, aggregating raw orders: {e}")
+            return [], [name for name, _ in scope]
+        rolled = [self._day_key(day) for name, day in inner
+                  if name in counts and states.get(self._day_key(day)) == counts[name]]
+        return sorted(rolled), [name for name, _ in scope]
+
+    def results(self, start: Any = None, end: Any = None, index: Optional[str] = None,
+                use_rollups: bool = True) -> Dict[str, Any]:
+        """Réponse de /api/results (index explicite : commandes brutes uniquement)"""
+        if index is not None:
+            rolled, tail = [], None
+        else:
+            rolled, tail = self.plan(start, end, use_rollups)
+
+        raw = [{'exists': {'field': 'order_id'}}]
+        if start or end:
+            date_range = {}
+            if start:
+                date_range['gte'] = start
+            if end:
+                date_range['lte'] = end
+            raw.append({'range': {'@timestamp': date_range}})
+        # Commandes déjà comptées par les rollups : celles de chaque jour résumé, dans son index
+        summarized = [_unit_filter(f"{self.index_resolver.prefix}-{day_key}",
+                                   datetime.strptime(day_key, '%Y.%m.%d').date()) for day_key in rolled]
+        should = []
+        targets = []
+        if tail != []:
+            should.append({'bool': {'filter': raw, 'must_not': summarized}})
+            targets.append(index or self.index_resolver.expression(tail))
+        if rolled:
+            should.append({'bool': {'filter': [{'term': {'_index': self.rollup_index}},
+                                               {'term': {'kind': KIND_HOURLY}},
+                                               {'terms': {'day': rolled}}]}})
+            targets.append(self.rollup_index)
+        if not should:
+            # Fenêtre sans index : mêmes agrégations (vides) sur le wildcard
+            should.append({'match_none': {}})
+            targets.append(self.index_resolver.wildcard)
+
+        result = self.es_client.search(index=','.join(targets), size=0, track_total_hits=False,
+                                       query={'bool': {'should': should, 'minimum_should_match': 1}},
+                                       aggs=results_aggs(), ignore_unavailable=True)
+        return format_results(result['aggregations'])
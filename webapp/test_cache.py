@@ -14,7 +14,10 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 from cache.config import CacheType, CacheConfig
-from cache.redis_cache import CacheManager, cache_response, invalidate_cache_type
+from cache.redis_cache import CacheManager, cache_response, invalidate_cache_type, params_cache_key
+from query.params import range_is_closed, search_params
+from datetime import datetime, timezone
+from flask import Flask, jsonify
 
 
 class TestCacheConfig(unittest.TestCase):
@@ -239,6 +242,92 @@ class TestCacheDecorator(unittest.TestCase):
                     self.assertEqual(mock_response.headers.get('X-Cache'), 'HIT')
 
 
+class TestSearchCache(unittest.TestCase):
+    """Tests de la clé et du TTL du cache de /api/search"""
+    
+    def setUp(self):
+        """Application Flask minimale (vrai contexte de requête)"""
+        self.app = Flask(__name__)
+    
+    def _key(self, **kwargs):
+        with self.app.test_request_context('/api/search', **kwargs):
+            from flask import request
+            return params_cache_key(CacheType.SEARCH, search_params(request), request.path)
+    
+    def test_get_and_post_share_key(self):
+        """GET ?q= et POST {query} normalisés produisent la même clé"""
+        get_key = self._key(method='GET', query_string={'q': 'error ', 'size': '50', 'level': ''})
+        post_key = self._key(method='POST', json={'size': 50, 'query': 'error', 'service': None})
+        self.assertEqual(get_key, post_key)
+        self.assertTrue(get_key.startswith("cache:search:"))
+    
+    def test_key_depends_on_parameters(self):
+        """Des paramètres différents donnent des clés différentes"""
+        self.assertNotEqual(
+            self._key(method='POST', json={'query': 'error', 'from': 0}),
+            self._key(method='POST', json={'query': 'error', 'from': 50})
+        )
+    
+    def test_range_is_closed(self):
+        """Plage terminée dans le passé : close ; ouverte ou proche de maintenant : vivante"""
+        now = datetime(2025, 6, 15, 12, 0, tzinfo=timezone.utc)
+        self.assertTrue(range_is_closed('2025-06-01T00:00:00Z', now))
+        self.assertTrue(range_is_closed('2025-06-14', now))
+        self.assertTrue(range_is_closed(str(int(datetime(2025, 6, 1, tzinfo=timezone.utc).timestamp() * 1000)), now))
+        self.assertFalse(range_is_closed('2025-06-15T11:30:00Z', now))
+        self.assertFalse(range_is_closed(None, now))
+        self.assertFalse(range_is_closed('now-1d', now))
+        self.assertFalse(range_is_closed('pas une date', now))
+    
+    @patch('cache.redis_cache.cache_manager')
+    def test_ttl_func(self, mock_cache_mgr):
+        """Le TTL vient de ttl_func ; None contourne le cache"""
+        mock_cache_mgr.get.return_value = None
+        ttl_func = Mock(side_effect=lambda req: None if req.args.get('cursor') else 42)
+        
+        @cache_response(CacheType.SEARCH, ttl_func=ttl_func)
+        def search():
+            return jsonify({"total": 0})
+        
+        with self.app.test_request_context('/api/search?q=x'):
+            search()
+        mock_cache_mgr.set.assert_called_once()
+        self.assertEqual(mock_cache_mgr.set.call_args[0][2], 42)
+        
+        mock_cache_mgr.reset_mock()
+        with self.app.test_request_context('/api/search?cursor=abc'):
+            search()
+        mock_cache_mgr.get.assert_not_called()
+        mock_cache_mgr.set.assert_not_called()
+    
+    @patch('cache.redis_cache.cache_manager')
+    def test_key_func_none_bypasses_cache(self, mock_cache_mgr):
+        """key_func renvoie None (version des données illisible) : pas de cache"""
+        @cache_response(CacheType.SEARCH, key_func=lambda req: None)
+        def search():
+            return jsonify({"total": 0})
+        
+        with self.app.test_request_context('/api/search?q=x'):
+            search()
+        mock_cache_mgr.get.assert_not_called()
+        mock_cache_mgr.set.assert_not_called()
+    
+    @patch('cache.redis_cache.cache_manager')
+    def test_errors_not_cached(self, mock_cache_mgr):
+        """Une réponse d'erreur n'est pas mise en cache"""
+        mock_cache_mgr.get.return_value = None
+        
+        @cache_response(CacheType.SEARCH)
+        def search():
+            return jsonify({"error": "Elasticsearch not connected"}), 500
+        
+        with self.app.test_request_context('/api/search'):
+            response, status = search()
+        self.assertEqual(status, 500)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        mock_cache_mgr.set.assert_not_called()
+
+
 class TestIntegration(unittest.TestCase):
     """Tests d'intégration (nécessitent Redis réel)"""
     
@@ -325,6 +414,7 @@ def run_tests():
     suite.addTests(loader.loadTestsFromTestCase(TestCacheConfig))
     suite.addTests(loader.loadTestsFromTestCase(TestCacheManager))
     suite.addTests(loader.loadTestsFromTestCase(TestCacheDecorator))
+    suite.addTests(loader.loadTestsFromTestCase(TestSearchCache))
     suite.addTests(loader.loadTestsFromTestCase(TestPerformance))
     suite.addTests(loader.loadTestsFromTestCase(TestIntegration))
     
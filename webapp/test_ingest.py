@@ -0,0 +1,1032 @@
+"""
+Tests du module d'ingestion
+Valide l'indexation bulk (dont le mode adaptatif), les écritures MongoDB bufferisées, les jobs d'ingestion
+les documents rejetés (dead-letter), les uploads par morceaux, la normalisation des timestamps,
+le manifeste, les identifiants déterministes et les templates d'index
+"""
+
+import unittest
+import time
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import tempfile
+import threading
+import json
+from datetime import date
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from pymongo.errors import BulkWriteError
+from elasticsearch import ApiError, NotFoundError
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+
+from ingest.bulk_indexer import BulkIndexer, BulkResult
+from ingest.backpressure import AdaptiveBatchSize, BulkMetrics, backoff_delay, bulk_metrics, in_flight_limiter
+from ingest.config import IngestConfig
+from ingest.dead_letter import DeadLetterStore, NdjsonDeadLetterStore
+from ingest.index_templates import ensure_index_templates, SCHEMA_VERSION, INDEX_TEMPLATE_NAME
+from ingest.lifecycle import IndexLifecycleManager
+from ingest.canonical import CANONICAL_PIPELINE, CANONICAL_VERSION, canonicalize
+from ingest.mongo_writer import BufferedMongoWriter
+from ingest.jobs import IngestJob, JobManager, JobStatus
+from ingest.chunked_upload import ChunkedUploadManager, ChunkedUploadError
+from ingest.readers import iter_csv_range, iter_documents, open_text_stream
+from ingest.timestamps import TimestampNormalizer
+from ingest.manifest import IngestManifest, ManifestAction
+from ingest.doc_ids import document_id, document_route, event_index
+from ingest.pipeline import iter_upload_actions
+
+
+def _ok(doc_id):
+    return True, {'index': {'_index': 'test', '_id': doc_id, 'status': 201}}
+
+
+def _error(doc_id, error_type='mapper_parsing_exception'):
+    return False, {'index': {
+        '_index': 'test',
+        '_id': doc_id,
+        'status': 400,
+        'error': {'type': error_type, 'reason': 'failed to parse field [total_amount]'}
+    }}
+
+
+class TestBulkIndexer(unittest.TestCase):
+    """Tests de l'indexeur bulk"""
+
+    @patch('ingest.bulk_indexer.streaming_bulk')
+    def test_counts_indexed_and_failed(self, mock_streaming_bulk):
+        """Les succès et échecs sont comptés séparément"""
+        mock_streaming_bulk.return_value = iter([_ok('1'), _error('2'), _ok('3')])
+
+        result = BulkIndexer(MagicMock(), chunk_size=2, adaptive=False).index([{}, {}, {}])
+
+        self.assertEqual(result.indexed, 2)
+        self.assertEqual(result.failed, 1)
+        self.assertEqual(result.errors[0]['id'], '2')
+        self.assertEqual(result.errors[0]['status'], 400)
+        self.assertIn('mapper_parsing_exception', result.errors[0]['reason'])
+
+    @patch('ingest.bulk_indexer.streaming_bulk')
+    def test_chunk_options_forwarded(self, mock_streaming_bulk):
+        """chunk_size et max_chunk_bytes sont transmis au helper"""
+        mock_streaming_bulk.return_value = iter([])
+
+        BulkIndexer(MagicMock(), chunk_size=250, max_chunk_bytes=1024, adaptive=False).index([])
+
+        kwargs = mock_streaming_bulk.call_args.kwargs
+        self.assertEqual(kwargs['chunk_size'], 250)
+        self.assertEqual(kwargs['max_chunk_bytes'], 1024)
+        self.assertFalse(kwargs['raise_on_error'])
+        self.assertFalse(kwargs['raise_on_exception'])
+
+    @patch('ingest.bulk_indexer.parallel_bulk')
+    def test_parallel_mode(self, mock_parallel_bulk):
+        """thread_count > 1 bascule sur parallel_bulk"""
+        mock_parallel_bulk.return_value = iter([_ok('1'), _ok('2')])
+
+        result = BulkIndexer(MagicMock(), thread_count=4, adaptive=False).index([{}, {}])
+
+        self.assertEqual(result.indexed, 2)
+        self.assertEqual(mock_parallel_bulk.call_args.kwargs['thread_count'], 4)
+
+    @patch('ingest.bulk_indexer.streaming_bulk')
+    def test_reported_errors_are_capped(self, mock_streaming_bulk):
+        """Le nombre d'erreurs détaillées est borné, pas le compteur"""
+        mock_streaming_bulk.return_value = iter([_error(str(i)) for i in range(10)])
+
+        result = BulkIndexer(MagicMock(), max_errors=3, adaptive=False).index([])
+
+        self.assertEqual(result.failed, 10)
+        self.assertEqual(len(result.errors), 3)
+
+    def test_result_to_dict(self):
+        """Le résultat est sérialisable pour la réponse JSON"""
+        result = BulkResult()
+        result.add_success()
+        data = result.finish().to_dict()
+        self.assertEqual(data['indexed'], 1)
+        self.assertEqual(data['failed'], 0)
+        self.assertIn('docs_per_sec', data)
+
+    @patch('ingest.bulk_indexer.streaming_bulk')
+    def test_create_conflicts_are_duplicates(self, mock_streaming_bulk):
+        """Un create en 409 compte comme doublon et non comme échec"""
+        conflict = (False, {'create': {'_index': 'test', '_id': 'a', 'status': 409,
+                                       'error': {'type': 'version_conflict_engine_exception'}}})
+        mock_streaming_bulk.return_value = iter([conflict, _ok('b'), _error('c')])
+
+        result = BulkIndexer(MagicMock(), adaptive=False).index([])
+        self.assertEqual((result.indexed, result.duplicates, result.failed), (1, 1, 1))
+
+
+class FakeBulkClient:
+    """Client Elasticsearch factice : rejette en 429 les documents listés au premier essai"""
+
+    def __init__(self, reject_ids=(), fail_ids=(), reject_request=0):
+        self.reject_ids = set(reject_ids)
+        self.fail_ids = set(fail_ids)
+        self.reject_request = reject_request
+        self.requests = []
+        self.transport = MagicMock()
+        self.transport.serializers.get_serializer.return_value.dumps = \
+            lambda data: json.dumps(data).encode('utf-8')
+
+    def bulk(self, operations):
+        headers = [json.loads(op) for op in operations[::2]]
+        self.requests.append(len(headers))
+        if self.reject_request:
+            self.reject_request -= 1
+            raise ApiError('es_rejected_execution_exception', ApiResponseMeta(
+                429, 'HTTP/1.1', HttpHeaders(), 0.1, NodeConfig('http', 'localhost', 9200)), {})
+        items = []
+        for header in headers:
+            op_type, meta = next(iter(header.items()))
+            doc_id = meta['_id']
+            if doc_id in self.reject_ids:
+                self.reject_ids.discard(doc_id)
+                items.append({op_type: {'_id': doc_id, 'status': 429,
+                                        'error': {'type': 'es_rejected_execution_exception'}}})
+            elif doc_id in self.fail_ids:
+                items.append({op_type: {'_id': doc_id, 'status': 400,
+                                        'error': {'type': 'mapper_parsing_exception'}}})
+            else:
+                items.append({op_type: {'_id': doc_id, 'status': 201}})
+        return {'items': items}
+
+
+def _actions(count):
+    return ({'_op_type': 'create', '_index': 'test', '_id': str(i), '_source': {'n': i}} for i in range(count))
+
+
+@patch('ingest.bulk_indexer.backoff_delay', return_value=0)
+class TestAdaptiveBulk(unittest.TestCase):
+    """Tests du mode adaptatif (AIMD, retry des 429)"""
+
+    def test_rejected_documents_are_retried(self, _):
+        """Les documents rejetés en 429 sont renvoyés et non perdus"""
+        client = FakeBulkClient(reject_ids={'3', '7'}, fail_ids={'5'})
+
+        result = BulkIndexer(client, chunk_size=100, adaptive=True).index(_actions(10))
+
+        self.assertEqual(result.indexed, 9)
+        self.assertEqual(result.failed, 1)
+        self.assertEqual(result.errors[0]['id'], '5')
+        self.assertEqual(client.requests, [10, 2])
+
+    def test_whole_request_rejection_is_retried(self, _):
+        """Une requête _bulk entière rejetée en 429 est renvoyée"""
+        client = FakeBulkClient(reject_request=2)
+
+        result = BulkIndexer(client, chunk_size=100, adaptive=True).index(_actions(5))
+
+        self.assertEqual(result.indexed, 5)
+        self.assertEqual(len(client.requests), 3)
+
+    def test_retries_are_bounded(self, _):
+        """Au-delà de max_retries les documents rejetés comptent en échec"""
+        client = FakeBulkClient(reject_request=10)
+
+        result = BulkIndexer(client, adaptive=True, max_retries=2).index(_actions(3))
+
+        self.assertEqual(result.failed, 3)
+        self.assertEqual(result.errors[0]['status'], 429)
+        self.assertEqual(len(client.requests), 3)
+
+    def test_unexpected_error_releases_request_slot(self, _):
+        """Une exception hors ApiError ne garde ni la place du sémaphore ni le compteur in_flight"""
+        client = FakeBulkClient()
+        client.bulk = MagicMock(side_effect=RuntimeError('socket closed'))
+        before = bulk_metrics.to_dict()
+
+        for _ in range(IngestConfig.BULK_MAX_IN_FLIGHT + 1):
+            with self.assertRaises(RuntimeError):
+                BulkIndexer(client, chunk_size=10, adaptive=True, thread_count=1).index(_actions(3))
+
+        after = bulk_metrics.to_dict()
+        self.assertEqual((after['in_flight'], after['queue_depth']), (before['in_flight'], before['queue_depth']))
+        for _ in range(IngestConfig.BULK_MAX_IN_FLIGHT):
+            self.assertTrue(in_flight_limiter.acquire(blocking=False))
+        for _ in range(IngestConfig.BULK_MAX_IN_FLIGHT):
+            in_flight_limiter.release()
+
+    def test_batch_size_follows_rejections(self, _):
+        """La taille des lots diminue après un rejet"""
+        client = FakeBulkClient(reject_ids={'0'})
+        indexer = BulkIndexer(client, chunk_size=400, adaptive=True, thread_count=1)
+
+        result = indexer.index(_actions(1000))
+
+        self.assertEqual(result.indexed, 1000)
+        self.assertEqual(client.requests[:3], [400, 1, 200])
+
+    def test_aimd(self, _):
+        """Augmentation additive sur lot plein, diminution multiplicative sur rejet ou latence"""
+        size = AdaptiveBatchSize(initial=1000, minimum=100, maximum=2000, step=250,
+                                 decrease_factor=0.5, target_latency=1.0)
+        self.assertEqual(size.record(0.2, 1000, 0), 1250)
+        self.assertEqual(size.record(0.2, 10, 0), 1250)
+        self.assertEqual(size.record(0.2, 1250, 5), 625)
+        self.assertEqual(size.record(3.0, 625, 0), 312)
+        for _ in range(10):
+            size.record(0.1, 5000, 0)
+        self.assertEqual(size.size, 2000)
+
+    def test_backoff_is_jittered_and_capped(self, _):
+        """Le délai de retry croît, reste borné et varie d'un appel à l'autre"""
+        delays = {backoff_delay(3, initial=1.0, maximum=30.0) for _ in range(20)}
+        self.assertTrue(all(2.0 <= d <= 4.0 for d in delays))
+        self.assertGreater(len(delays), 1)
+        self.assertLessEqual(backoff_delay(20, initial=1.0, maximum=30.0), 30.0)
+
+    def test_metrics(self, _):
+        """Les métriques exposent taille de lot, file d'attente et rejets"""
+        metrics = BulkMetrics()
+        metrics.add_queued(100)
+        metrics.request_started()
+        metrics.request_ended()
+        metrics.request_finished(0.5, 100, 3, 50)
+        metrics.add_queued(-100)
+
+        data = metrics.to_dict()
+        self.assertEqual(data['batch_size'], 50)
+        self.assertEqual(data['queue_depth'], 0)
+        self.assertEqual(data['in_flight'], 0)
+        self.assertEqual(data['rejected_documents'], 3)
+        self.assertEqual(data['latency_ms'], 500.0)
+
+
+@patch('ingest.bulk_indexer.backoff_delay', return_value=0)
+class TestDeadLetter(unittest.TestCase):
+    """Tests du store de documents rejetés"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = NdjsonDeadLetterStore(os.path.join(self.tmpdir.name, 'dead.ndjson'), batch_size=2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _entries(self):
+        with open(self.store.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_every_rejected_document_is_kept(self, _):
+        """Tous les rejets sont écrits avec le document et la raison, pas seulement les premiers"""
+        client = FakeBulkClient(fail_ids={'1', '4', '6'})
+
+        result = BulkIndexer(client, adaptive=True, max_errors=1).index(
+            _actions(8), dead_letter=self.store, source_file='orders.csv')
+
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.dead_lettered, 3)
+        entries = self._entries()
+        self.assertEqual(sorted(e['id'] for e in entries), ['1', '4', '6'])
+        self.assertEqual(entries[0]['error_type'], 'mapper_parsing_exception')
+        self.assertEqual(entries[0]['source_file'], 'orders.csv')
+        self.assertEqual(entries[0]['document'], {'n': int(entries[0]['id'])})
+
+    def test_partial_store_fails_at_instantiation(self, _):
+        """Un store qui n'implémente que _write est refusé dès sa création"""
+        class WriteOnlyStore(DeadLetterStore):
+            def _write(self, entries):
+                pass
+
+        with self.assertRaises(TypeError):
+            WriteOnlyStore()
+
+    def test_replay_removes_indexed_entries(self, _):
+        """Après correction, le rejeu ré-indexe les documents et vide le store"""
+        BulkIndexer(FakeBulkClient(fail_ids={'2', '3'}), adaptive=True).index(
+            _actions(5), dead_letter=self.store, source_file='orders.csv')
+
+        fixed = FakeBulkClient()
+        stats = self.store.replay(fixed, source_file='orders.csv')
+
+        self.assertEqual(stats, {'replayed': 2, 'failed': 0, 'skipped': 0})
+        self.assertEqual(fixed.requests, [2])
+        self.assertEqual(self._entries(), [])
+
+    def test_replay_keeps_documents_still_failing(self, _):
+        """Un document toujours rejeté reste dans le store avec attempts incrémenté"""
+        BulkIndexer(FakeBulkClient(fail_ids={'2', '3'}), adaptive=True).index(
+            _actions(5), dead_letter=self.store, source_file='orders.csv')
+
+        stats = self.store.replay(FakeBulkClient(fail_ids={'3'}))
+
+        self.assertEqual((stats['replayed'], stats['failed']), (1, 1))
+        entries = self._entries()
+        self.assertEqual([(e['id'], e['attempts']) for e in entries], [('3', 2)])
+
+    def test_replay_filters_and_skips_entries_without_source(self, _):
+        """Filtre par fichier source ; les entrées sans document ne sont pas rejouables"""
+        self.store.add({'index': 'test', 'id': 'a', 'status': 400, 'reason': 'x: y'}, {'n': 1}, 'a.csv')
+        self.store.add({'index': 'test', 'id': 'b', 'status': 400, 'reason': 'x: y'}, None, 'b.csv')
+        self.store.flush()
+
+        self.assertEqual(self.store.replay(FakeBulkClient(), source_file='b.csv'),
+                         {'replayed': 0, 'failed': 0, 'skipped': 1})
+        self.assertEqual(self.store.count(), 2)
+
+
+class FakeCollection:
+    """Collection MongoDB factice enregistrant les lots reçus"""
+
+    def __init__(self, fail_with=None):
+        self.batches = []
+        self.fail_with = fail_with
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append((list(documents), ordered))
+        if self.fail_with is not None:
+            raise self.fail_with
+
+
+class TestBufferedMongoWriter(unittest.TestCase):
+    """Tests de l'écrivain MongoDB bufferisé"""
+
+    def test_flush_by_count(self):
+        """Les documents partent par lots de batch_size en mode non ordonné"""
+        collection = FakeCollection()
+        with BufferedMongoWriter(collection, batch_size=10, flush_interval=60) as writer:
+            for i in range(25):
+                writer.write({'n': i})
+
+        self.assertEqual([len(batch) for batch, _ in collection.batches], [10, 10, 5])
+        self.assertTrue(all(ordered is False for _, ordered in collection.batches))
+        stats = writer.get_stats()
+        self.assertEqual(stats['inserted'], 25)
+        self.assertEqual(stats['batches'], 3)
+        self.assertIsNotNone(stats['batch_latency_ms'])
+
+    def test_flush_by_size(self):
+        """Un lot part dès que la taille maximale est atteinte"""
+        collection = FakeCollection()
+        with BufferedMongoWriter(collection, batch_size=1000, max_batch_bytes=100, flush_interval=60) as writer:
+            for i in range(4):
+                writer.write({'payload': 'x' * 60})
+
+        self.assertEqual(len(collection.batches), 2)
+
+    def test_flush_by_time(self):
+        """Un lot incomplet part après flush_interval"""
+        collection = FakeCollection()
+        writer = BufferedMongoWriter(collection, batch_size=1000, flush_interval=0.05)
+        writer.write({'n': 1})
+        time.sleep(0.3)
+        self.assertEqual(len(collection.batches), 1)
+        writer.close()
+
+    def test_partial_bulk_write_error(self):
+        """Les erreurs partielles de insert_many sont comptées sans interrompre l'écriture"""
+        error = BulkWriteError({'nInserted': 3, 'writeErrors': [{'index': 1, 'errmsg': 'E11000 duplicate key'}]})
+        collection = FakeCollection(fail_with=error)
+        with BufferedMongoWriter(collection, batch_size=4, flush_interval=60) as writer:
+            for i in range(4):
+                writer.write({'n': i})
+
+        stats = writer.get_stats()
+        self.assertEqual(stats['inserted'], 3)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(len(stats['errors']), 1)
+
+    def test_duplicate_keys_are_not_failures(self):
+        """Une clé _id déjà présente (ré-ingestion) est comptée comme doublon"""
+        error = BulkWriteError({'nInserted': 2, 'writeErrors': [
+            {'index': 0, 'code': 11000, 'errmsg': 'E11000 duplicate key'},
+            {'index': 3, 'code': 11000, 'errmsg': 'E11000 duplicate key'}
+        ]})
+        collection = FakeCollection(fail_with=error)
+        with BufferedMongoWriter(collection, batch_size=4, flush_interval=60) as writer:
+            for i in range(4):
+                writer.write({'_id': str(i)})
+
+        stats = writer.get_stats()
+        self.assertEqual((stats['inserted'], stats['duplicates'], stats['failed']), (2, 2, 0))
+        self.assertEqual(stats['errors'], [])
+
+
+class TestJobManager(unittest.TestCase):
+    """Tests des jobs d'ingestion en arrière-plan"""
+
+    def _wait(self, manager, job_id, timeout=2):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            state = manager.get(job_id)
+            if JobStatus.is_terminal(state['status']):
+                return state
+            time.sleep(0.01)
+        self.fail('job did not finish')
+
+    def test_job_runs_in_background(self):
+        """Le job est accepté immédiatement puis exécuté par le pool"""
+        def runner(job):
+            job.progress_callback(50, 1, job.total_bytes // 2)
+            job.update_progress(100, 2, job.total_bytes)
+            return {'indexed': 98, 'failed': 2}
+
+        manager = JobManager(runner, max_workers=1, backend='local')
+        job = manager.submit(IngestJob('/tmp/x.csv', 'csv', 'x.csv', total_bytes=1000))
+        state = self._wait(manager, job.id)
+
+        self.assertEqual(state['status'], JobStatus.COMPLETED)
+        self.assertEqual(state['rows_processed'], 100)
+        self.assertEqual(state['rows_failed'], 2)
+        self.assertEqual(state['progress'], 100.0)
+        self.assertEqual(state['result']['indexed'], 98)
+
+    def test_failed_job(self):
+        """Une exception du runner marque le job en échec"""
+        def runner(job):
+            raise ValueError('Invalid JSON')
+
+        manager = JobManager(runner, max_workers=1, backend='local')
+        job = manager.submit(IngestJob('/tmp/x.json', 'json', 'x.json', total_bytes=10))
+        state = self._wait(manager, job.id)
+
+        self.assertEqual(state['status'], JobStatus.FAILED)
+        self.assertIn('Invalid JSON', state['errors'][-1]['reason'])
+
+    def test_eta_from_bytes_read(self):
+        """L'ETA est extrapolée à partir des octets lus"""
+        job = IngestJob('/tmp/x.csv', 'csv', 'x.csv', total_bytes=1000,
+                        status=JobStatus.RUNNING, started_at='2025-01-01T00:00:00',
+                        finished_at=None)
+        job.elapsed_seconds = lambda: 10.0
+        job.update_progress(400, 0, 250)
+
+        state = job.to_dict()
+        self.assertEqual(state['progress'], 25.0)
+        self.assertEqual(state['eta_seconds'], 30.0)
+        self.assertEqual(state['rows_per_sec'], 40.0)
+
+    def test_state_shared_through_redis(self):
+        """Une autre réplique retrouve l'état du job via Redis"""
+        store = {}
+        redis_client = MagicMock()
+        redis_client.setex.side_effect = lambda key, ttl, value: store.__setitem__(key, value)
+        redis_client.get.side_effect = store.get
+
+        manager = JobManager(lambda job: {'indexed': 1}, redis_client=redis_client, backend='local')
+        job = manager.submit(IngestJob('/tmp/x.csv', 'csv', 'x.csv', total_bytes=10))
+        self._wait(manager, job.id)
+
+        other_replica = JobManager(lambda job: None, redis_client=redis_client, backend='local')
+        self.assertEqual(other_replica.get(job.id)['status'], JobStatus.COMPLETED)
+        self.assertIsNone(other_replica.get('unknown'))
+
+    def test_filepath_kept_out_of_client_state(self):
+        """Le chemin du fichier est persisté pour les workers mais jamais renvoyé aux clients"""
+        store = {}
+        redis_client = MagicMock()
+        redis_client.setex.side_effect = lambda key, ttl, value: store.__setitem__(key, value)
+        redis_client.get.side_effect = store.get
+
+        manager = JobManager(lambda job: {'indexed': 1}, redis_client=redis_client, backend='local')
+        job = manager.submit(IngestJob('/srv/uploads/x.csv', 'csv', 'x.csv', total_bytes=10))
+        self._wait(manager, job.id)
+
+        self.assertNotIn('filepath', manager.get(job.id))
+        other_replica = JobManager(lambda job: None, redis_client=redis_client, backend='local')
+        self.assertNotIn('filepath', other_replica.get(job.id))
+        persisted = json.loads(store[f"{JobManager.KEY_PREFIX}{job.id}"])
+        self.assertEqual(IngestJob.from_dict(persisted).filepath, '/srv/uploads/x.csv')
+
+
+class FakeRedis:
+    """Client Redis factice (hash + set) suffisant pour les sessions d'upload"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+        self.strings = {}
+        self.lock = threading.Lock()
+
+    def set(self, key, value, nx=False, ex=None):
+        with self.lock:
+            if nx and key in self.strings:
+                return None
+            self.strings[key] = str(value)
+            return True
+
+    def delete(self, key):
+        for store in (self.strings, self.hashes, self.sets):
+            store.pop(key, None)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        data = self.hashes.setdefault(key, {})
+        if mapping:
+            data.update({k: str(v) for k, v in mapping.items()})
+        if field is not None:
+            data[field] = str(value)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def sadd(self, key, value):
+        self.sets.setdefault(key, set()).add(str(value))
+
+    def sismember(self, key, value):
+        return str(value) in self.sets.get(key, set())
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def srem(self, key, value):
+        self.sets.get(key, set()).discard(str(value))
+
+    def expire(self, key, ttl):
+        return True
+
+
+class TestChunkedUpload(unittest.TestCase):
+    """Tests des uploads par morceaux (reprise et ingestion anticipée)"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.manager = ChunkedUploadManager(FakeRedis(), self.folder)
+        self.content = ''.join(f"{i},item-{i}\n" for i in range(500)).encode('utf-8')
+        self.content = b'id,name\n' + self.content
+
+    def _chunks(self, size):
+        return [self.content[i:i + size] for i in range(0, len(self.content), size)]
+
+    def test_out_of_order_chunks_and_resume(self):
+        """Les chunks manquants sont signalés et le fichier final est identique"""
+        session = self.manager.init('orders.csv', 'csv', len(self.content), chunk_size=1000)
+        upload_id = session['upload_id']
+        chunks = self._chunks(1000)
+
+        # Connexion coupée après quelques chunks envoyés dans le désordre
+        for index in (2, 0, 3):
+            self.manager.write_chunk(upload_id, index, chunks[index])
+        status = self.manager.status(upload_id)
+        self.assertEqual(status['contiguous_bytes'], 1000)
+        self.assertIn(1, status['missing_chunks'])
+        with self.assertRaises(ChunkedUploadError):
+            self.manager.complete(upload_id)
+
+        # Reprise : envoyer uniquement les chunks manquants
+        for index in status['missing_chunks']:
+            self.manager.write_chunk(upload_id, index, chunks[index])
+        final = self.manager.complete(upload_id)
+
+        self.assertEqual(final['status'], 'completed')
+        with open(os.path.join(self.folder, final['filename']), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, final['filename'] + '.part')))
+
+    def test_concurrent_complete_finalizes_once(self):
+        """Deux complete simultanés : un seul renommage et un seul job d'ingestion"""
+        session = self.manager.init('orders.csv', 'csv', len(self.content), chunk_size=1000)
+        upload_id = session['upload_id']
+        for index, chunk in enumerate(self._chunks(1000)):
+            self.manager.write_chunk(upload_id, index, chunk)
+
+        started = []
+        barrier = threading.Barrier(2)
+
+        def on_complete(state):
+            started.append(state['filename'])
+            time.sleep(0.05)
+            return 'job-1'
+
+        def finish(results):
+            barrier.wait()
+            try:
+                results.append(self.manager.complete(upload_id, on_complete)['job_id'])
+            except ChunkedUploadError as e:
+                results.append(e.status_code)
+
+        results = []
+        threads = [threading.Thread(target=finish, args=(results,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(started), 1)
+        self.assertEqual(sorted(results, key=str), [409, 'job-1'])
+        final = self.manager.complete(upload_id, on_complete)
+        self.assertEqual((final['status'], final['job_id']), ('completed', 'job-1'))
+        self.assertEqual(len(started), 1)
+
+    @patch('ingest.chunked_upload.IngestConfig.CHUNKED_MAX_OPEN_SESSIONS', 2)
+    def test_open_sessions_are_capped(self):
+        """Au-delà de la limite, l'init est refusé sans réserver de fichier ; un upload terminé libère sa place"""
+        first = self.manager.init('a.csv', 'csv', len(self.content), chunk_size=1000)
+        self.manager.init('b.csv', 'csv', len(self.content), chunk_size=1000)
+        with self.assertRaises(ChunkedUploadError) as error:
+            self.manager.init('c.csv', 'csv', len(self.content), chunk_size=1000)
+        self.assertEqual(error.exception.status_code, 429)
+        self.assertEqual(len(os.listdir(self.folder)), 2)
+
+        for index, chunk in enumerate(self._chunks(1000)):
+            self.manager.write_chunk(first['upload_id'], index, chunk)
+        self.manager.complete(first['upload_id'])
+        self.manager.init('c.csv', 'csv', len(self.content), chunk_size=1000)
+
+    def test_sweep_removes_abandoned_parts(self):
+        """Un .part dont la session a expiré est supprimé, celui d'un upload en cours est gardé"""
+        live = self.manager.init('live.csv', 'csv', len(self.content), chunk_size=1000)
+        abandoned = self.manager.init('abandoned.csv', 'csv', len(self.content), chunk_size=1000)
+        # Expiration de la session Redis de l'upload abandonné
+        self.manager.redis_client.delete(f"upload:session:{abandoned['upload_id']}")
+        old = time.time() - 3600
+        for name in os.listdir(self.folder):
+            os.utime(os.path.join(self.folder, name), (old, old))
+
+        self.assertEqual(self.manager.sweep(force=True), [abandoned['filename'] + '.part'])
+        self.assertEqual(os.listdir(self.folder), [live['filename'] + '.part'])
+
+    def test_rejects_wrong_chunk_size(self):
+        """Un chunk tronqué est refusé"""
+        session = self.manager.init('orders.csv', 'csv', len(self.content), chunk_size=1000)
+        with self.assertRaises(ChunkedUploadError):
+            self.manager.write_chunk(session['upload_id'], 0, b'short')
+        with self.assertRaises(ChunkedUploadError):
+            self.manager.write_chunk(session['upload_id'], 99, b'')
+
+    @patch('ingest.chunked_upload.IngestConfig.CHUNKED_POLL_INTERVAL', 0.01)
+    def test_stream_reads_while_uploading(self):
+        """L'ingestion démarre sur les chunks contigus avant la fin de l'upload"""
+        session = self.manager.init('orders.csv', 'csv', len(self.content), chunk_size=512)
+        upload_id = session['upload_id']
+        chunks = self._chunks(512)
+        self.manager.write_chunk(upload_id, 0, chunks[0])
+
+        def upload_rest():
+            for index in range(len(chunks) - 1, 0, -1):
+                time.sleep(0.005)
+                self.manager.write_chunk(upload_id, index, chunks[index])
+            self.manager.complete(upload_id)
+
+        # Le lecteur est ouvert sur le fichier .part, seul le chunk 0 est arrivé
+        stream, counter = open_text_stream(self.manager.open_stream(upload_id))
+        uploader = threading.Thread(target=upload_rest)
+        uploader.start()
+        rows = list(iter_documents(stream, 'csv', batch_size=10))
+        uploader.join()
+        stream.close()
+
+        self.assertEqual(counter.bytes_read, len(self.content))
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(rows[-1]['name'], 'item-499')
+
+
+class TestTimestampNormalizer(unittest.TestCase):
+    """Tests du normaliseur de timestamps (chemin rapide / dateutil)"""
+
+    def test_detect_format(self):
+        self.assertEqual(TimestampNormalizer.detect_format('2025-12-21T10:15:30Z'), 'iso')
+        self.assertEqual(TimestampNormalizer.detect_format('2025-12-21 10:15:30'), 'iso')
+        self.assertEqual(TimestampNormalizer.detect_format('21/12/2025 10:15:30'), '%d/%m/%Y %H:%M:%S')
+        self.assertEqual(TimestampNormalizer.detect_format(1766312130), 'epoch_s')
+        self.assertEqual(TimestampNormalizer.detect_format('1766312130000'), 'epoch_ms')
+        self.assertIsNone(TimestampNormalizer.detect_format('yesterday'))
+
+    def test_field_detected_once(self):
+        normalizer = TimestampNormalizer()
+        source, ts = normalizer.normalize({'Time': '2025-12-21 10:15:30', 'Level': 'INFO'})
+        self.assertEqual(source, {'Level': 'INFO'})
+        self.assertEqual(ts, '2025-12-21T10:15:30')
+        self.assertEqual(normalizer.get_stats()['field'], 'Time')
+
+    def test_outliers_use_slow_path(self):
+        """Seules les valeurs hors format passent par dateutil"""
+        normalizer = TimestampNormalizer()
+        rows = [{'timestamp': f'21/12/2025 10:{i:02d}:00'} for i in range(50)]
+        rows.append({'timestamp': 'Dec 21 2025 11:00:00'})
+        rows.append({'timestamp': 'not a date'})
+        results = normalizer.normalize_batch(rows)
+
+        self.assertEqual(results[0][1], '2025-12-21T10:00:00')
+        self.assertEqual(results[50][1], '2025-12-21T11:00:00')
+        self.assertIsNone(results[51][1])
+        stats = normalizer.get_stats()
+        self.assertEqual((stats['fast_path'], stats['slow_path'], stats['failed']), (50, 2, 1))
+
+    def test_ambiguous_dates_month_first(self):
+        """Date ambiguë lue mois en premier, comme dateutil.parse"""
+        self.assertEqual(TimestampNormalizer.detect_format('01/02/2025 10:15:30'), '%m/%d/%Y %H:%M:%S')
+        normalizer = TimestampNormalizer()
+        _, ts = normalizer.normalize({'date': '01/02/2025 10:15:30'})
+        self.assertEqual(ts, '2025-01-02T10:15:30')
+
+    def test_format_redetected_on_failure(self):
+        """Un changement de format en cours de fichier reste sur le chemin rapide"""
+        normalizer = TimestampNormalizer()
+        rows = [{'timestamp': f'2025-12-21 10:{i:02d}:00'} for i in range(10)]
+        rows += [{'timestamp': f'{i + 13}/12/2025 11:00:00'} for i in range(10)]
+        results = normalizer.normalize_batch(rows[:10]) + normalizer.normalize_batch(rows[10:])
+
+        self.assertEqual(results[10][1], '2025-12-13T11:00:00')
+        self.assertEqual(results[19][1], '2025-12-22T11:00:00')
+        stats = normalizer.get_stats()
+        self.assertEqual(stats['format'], '%d/%m/%Y %H:%M:%S')
+        self.assertEqual((stats['fast_path'], stats['slow_path']), (20, 0))
+
+    def test_epoch_and_missing(self):
+        normalizer = TimestampNormalizer()
+        _, ts = normalizer.normalize({'date': 1766312130000})
+        self.assertEqual(ts, '2025-12-21T10:15:30+00:00')
+        item, ts = normalizer.normalize({'Level': 'INFO'})
+        self.assertIsNone(ts)
+        self.assertEqual(normalizer.get_stats()['missing'], 1)
+
+
+class TestIngestManifest(unittest.TestCase):
+    """Tests du manifeste de ré-indexation incrémentale"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'events.ndjson')
+        with open(self.path, 'w') as f:
+            f.write('{"n": 1}\n' * 1000)
+        self.manifest = IngestManifest(os.path.join(self.folder, 'manifest.sqlite'))
+
+    def tearDown(self):
+        self.manifest.close()
+
+    def _index(self, ranges):
+        action, start, fingerprint = self.manifest.plan(self.path)
+        self.manifest.begin(self.path, fingerprint, start)
+        for range_start, range_end in ranges:
+            self.manifest.complete_range(self.path, range_start, range_end)
+        return action, start
+
+    def test_new_then_unchanged(self):
+        self.assertEqual(self._index([(0, 9000)]), (ManifestAction.FULL, 0))
+        self.assertEqual(self.manifest.plan(self.path)[:2], (ManifestAction.SKIP, 9000))
+
+    def test_resume_after_interruption(self):
+        """L'offset n'avance que sur des plages contiguës terminées"""
+        self._index([(3000, 6000), (0, 3000)])
+        self.assertEqual(self.manifest.get(self.path)['indexed_offset'], 6000)
+        self.assertEqual(self.manifest.plan(self.path)[:2], (ManifestAction.RESUME, 6000))
+
+    def test_tail_and_rewrite(self):
+        self._index([(0, 9000)])
+        with open(self.path, 'a') as f:
+            f.write('{"n": 2}\n')
+        self.assertEqual(self.manifest.plan(self.path)[:2], (ManifestAction.TAIL, 9000))
+
+        with open(self.path, 'w') as f:
+            f.write('{"n": 3}\n' * 2000)
+        self.assertEqual(self.manifest.plan(self.path)[:2], (ManifestAction.FULL, 0))
+
+
+class TestDocumentIds(unittest.TestCase):
+    """Tests des identifiants déterministes"""
+
+    def test_stable_across_key_order_and_types(self):
+        a = document_id({'order_id': 'ORD-1', 'amount': 10.0, 'note': float('nan')}, 'orders.csv')
+        b = document_id({'note': None, 'amount': 10, 'order_id': 'ORD-1', 'uploaded_at': 'now'}, 'orders.csv')
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, document_id({'order_id': 'ORD-1', 'amount': 10}, 'other.csv'))
+        self.assertNotEqual(a, document_id({'order_id': 'ORD-2', 'amount': 10}, 'orders.csv'))
+
+    def test_event_index_uses_utc_event_date(self):
+        from datetime import datetime, timezone, timedelta
+        ts = datetime(2025, 12, 21, 23, 30, tzinfo=timezone(timedelta(hours=-2)))
+        self.assertEqual(event_index(ts), 'ecommerce-logs-2025.12.22')
+
+    def test_undated_documents_use_a_fixed_index(self):
+        """Sans date, l'index ne dépend pas du jour de chargement"""
+        self.assertEqual(event_index(None), 'ecommerce-logs-undated')
+
+    def test_same_route_for_typed_and_text_csv_rows(self):
+        """Upload (pandas, valeurs typées) et scripts (csv, chaînes) donnent les mêmes (_index, _id)"""
+        path = os.path.join(tempfile.mkdtemp(), 'orders.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('Timestamp,order_id,amount,zip,paid,note\n'
+                    '2025-12-20 10:00:00,ORD-1,42.50,01234,true,\n'
+                    ',ORD-2,10,75001,False,late\n')
+
+        uploaded = [(a['_index'], a['_id']) for a in iter_upload_actions(iter_documents(path, 'csv'), 'orders.csv')]
+        normalizer = TimestampNormalizer()
+        scripted = [document_route(row, 'orders.csv', normalizer.parse(row['Timestamp']))
+                    for row in iter_csv_range(path)]
+
+        self.assertEqual(uploaded, scripted)
+        self.assertEqual([index for index, _ in uploaded], ['ecommerce-logs-2025.12.20', 'ecommerce-logs-undated'])
+
+    def test_upload_actions_are_idempotent(self):
+        """Deux uploads du même contenu produisent les mêmes _id"""
+        def actions():
+            docs = [{'@timestamp': '2025-12-21T10:00:00Z', 'n': 1}, {'n': 2}]
+            return list(iter_upload_actions(docs, '20251221_100000_orders.csv', id_source='orders.csv'))
+
+        first, second = actions(), actions()
+        self.assertEqual([a['_id'] for a in first], [a['_id'] for a in second])
+        self.assertEqual(first[0]['_op_type'], 'create')
+        self.assertEqual(first[0]['_index'], 'ecommerce-logs-2025.12.21')
+
+
+class TestCanonicalize(unittest.TestCase):
+    """Tests des champs canonicaux écrits à l'ingestion"""
+
+    def test_application_log(self):
+        doc = canonicalize({'Level': 'ERROR', 'Service': 'payment', 'Message': 'Timeout', 'User': 'u1'})
+        self.assertEqual((doc['level'], doc['service'], doc['message'], doc['user']),
+                         ('ERROR', 'payment', 'Timeout', 'u1'))
+        self.assertEqual(doc['canonical_version'], CANONICAL_VERSION)
+
+    def test_event(self):
+        doc = canonicalize({'event': 'add_to_cart', 'user': 'u2', 'page': '/cart'})
+        self.assertEqual(doc['level'], 'INFO')
+        self.assertEqual(doc['service'], 'add_to_cart')
+        self.assertEqual(doc['message'], 'add_to_cart - User: u2 - Page: /cart')
+
+    def test_generic_fallbacks(self):
+        """Service déduit des champs alternatifs ou du contenu, niveau via severity"""
+        doc = canonicalize({'severity': 'WARN', 'msg': 'disk', 'application': 'api'})
+        self.assertEqual((doc['level'], doc['service'], doc['message'], doc['user']), ('WARN', 'api', 'disk', ''))
+        order = canonicalize({'order_id': 'O1', 'product_name': 'Laptop'})
+        self.assertEqual(order['service'], 'E-commerce')
+        self.assertEqual(order['message'], '')
+
+    def test_existing_message_is_kept(self):
+        """Message ne remplace pas un champ message déjà présent"""
+        doc = canonicalize({'Level': 'WARN', 'message': 'kept', 'Message': 'other'})
+        self.assertEqual(doc['message'], 'kept')
+
+    def test_non_text_event_is_generic(self):
+        """Un event objet ne devient ni le service ni le message"""
+        doc = canonicalize({'event': {'type': 'click'}, 'severity': 'WARN', 'app': 'web', 'msg': 'clicked'})
+        self.assertEqual((doc['level'], doc['service'], doc['message']), ('WARN', 'web', 'clicked'))
+
+    def test_idempotent(self):
+        doc = canonicalize({'Level': 'INFO', 'Message': 'ok'})
+        doc['Message'] = 'changed'
+        self.assertEqual(canonicalize(doc)['message'], 'ok')
+
+    def test_upload_actions_are_canonical_with_unchanged_ids(self):
+        """Les champs canonicaux n'entrent pas dans le calcul de l'_id"""
+        raw = {'@timestamp': '2025-12-21T10:00:00', 'Level': 'INFO', 'Message': 'hello'}
+        action = next(iter_upload_actions([dict(raw)], 'logs.csv'))
+        self.assertEqual(action['_id'], document_id(raw, 'logs.csv'))
+        self.assertEqual(action['_source']['level'], 'INFO')
+        self.assertEqual(action['_source']['service'], 'Application')
+
+
+def _es_meta(status):
+    return ApiResponseMeta(status, 'HTTP/1.1', HttpHeaders(), 0.1, NodeConfig('http', 'localhost', 9200))
+
+
+class TestIndexTemplates(unittest.TestCase):
+    """Tests de l'installation idempotente des templates"""
+
+    def _client(self, installed_version=None):
+        es = MagicMock()
+        if installed_version is None:
+            es.indices.get_index_template.side_effect = NotFoundError('not found', _es_meta(404), {})
+        else:
+            template = {'index_patterns': ['ecommerce-logs-*']}
+            if installed_version:
+                template['version'] = installed_version
+            es.indices.get_index_template.return_value = {
+                'index_templates': [{'name': INDEX_TEMPLATE_NAME, 'index_template': template}]
+            }
+        return es
+
+    def test_created_when_missing(self):
+        es = self._client()
+        self.assertEqual(ensure_index_templates(es), 'created')
+        self.assertEqual(es.cluster.put_component_template.call_count, 4)
+        kwargs = es.indices.put_index_template.call_args.kwargs
+        self.assertEqual(kwargs['version'], SCHEMA_VERSION)
+        self.assertEqual(kwargs['composed_of'][0], 'ecommerce-settings')
+        self.assertEqual(es.ingest.put_pipeline.call_args.kwargs['id'], CANONICAL_PIPELINE)
+
+    def test_unchanged_when_up_to_date(self):
+        """Relancer la webapp ou un loader ne réécrit pas les templates"""
+        es = self._client(SCHEMA_VERSION)
+        self.assertEqual(ensure_index_templates(es), 'unchanged')
+        es.indices.put_index_template.assert_not_called()
+        es.cluster.put_component_template.assert_not_called()
+
+    def test_unversioned_template_is_replaced(self):
+        """L'ancien template (text + keyword, sans version) est remplacé"""
+        es = self._client(0)
+        self.assertEqual(ensure_index_templates(es), 'updated')
+        es.indices.put_index_template.assert_called_once()
+
+    def test_mappings(self):
+        """Champs filtrés/agrégés en keyword, montants en scaled_float, index trié par date"""
+        es = self._client()
+        ensure_index_templates(es)
+        templates = {c.kwargs['name']: c.kwargs['template'] for c in es.cluster.put_component_template.call_args_list}
+
+        settings = templates['ecommerce-settings']['settings']
+        self.assertEqual((settings['index.sort.field'], settings['index.sort.order']), ('@timestamp', 'desc'))
+        logs = templates['ecommerce-logs-mappings']['mappings']['properties']
+        self.assertEqual(logs['Level']['type'], 'keyword')
+        self.assertEqual(logs['Service']['fields']['text']['type'], 'text')
+        # Level.keyword / Service.keyword des visualisations Kibana existent toujours
+        for field in ('Level', 'Service', 'User'):
+            self.assertEqual(logs[field]['fields']['keyword']['type'], 'keyword', field)
+        orders = templates['ecommerce-orders-mappings']['mappings']['properties']
+        for field in ('customer_country', 'product_category', 'payment_method', 'order_status'):
+            self.assertEqual(orders[field]['type'], 'keyword', field)
+        self.assertEqual(orders['total_amount']['type'], 'scaled_float')
+        self.assertEqual(orders['product_name']['fields']['keyword']['type'], 'keyword')
+        self.assertEqual(settings['index.default_pipeline'], CANONICAL_PIPELINE)
+        common = templates['ecommerce-settings']['mappings']['properties']
+        self.assertEqual(common['level']['type'], 'keyword')
+        self.assertEqual(common['message']['type'], 'match_only_text')
+
+
+class TestIndexLifecycle(unittest.TestCase):
+    """Tests du cycle de vie des index quotidiens"""
+
+    TODAY = date(2025, 12, 21)
+
+    def _client(self, rows, segments=None, blocked=()):
+        es = MagicMock()
+        es.cat.indices.return_value = [
+            dict({'status': 'open', 'pri': '1', 'rep': '0', 'docs.count': '1000', 'store.size': '2048'}, **row)
+            for row in rows
+        ]
+        es.indices.stats.return_value = {'indices': {
+            name: {'total': {'segments': {'count': count}}} for name, count in (segments or {}).items()
+        }}
+        es.indices.get_settings.return_value = {
+            name: {'settings': {'index.blocks.write': 'true'}} for name in blocked
+        }
+        return es
+
+    def _manager(self, es, **kwargs):
+        options = dict(write_window_days=2, retention_days=30, snapshot_repository='')
+        options.update(kwargs)
+        return IndexLifecycleManager(es, **options)
+
+    def test_plan_by_age(self):
+        """Jours récents intacts, jours fermés fusionnés et bloqués, jours expirés supprimés"""
+        es = self._client(
+            [{'index': 'ecommerce-logs-2025.12.21'}, {'index': 'ecommerce-logs-2025.12.20'},
+             {'index': 'ecommerce-logs-2025.12.10', 'rep': '1'}, {'index': 'ecommerce-logs-2025.11.01'},
+             {'index': 'ecommerce-logs-archive'}],
+            segments={'ecommerce-logs-2025.12.21': 12, 'ecommerce-logs-2025.12.20': 9,
+                      'ecommerce-logs-2025.12.10': 14, 'ecommerce-logs-2025.11.01': 3}
+        )
+        steps = {step['index']: step for step in self._manager(es).plan(self.TODAY)}
+
+        self.assertNotIn('ecommerce-logs-archive', steps)
+        self.assertEqual(steps['ecommerce-logs-2025.12.21']['actions'], [])
+        self.assertEqual(steps['ecommerce-logs-2025.12.20']['actions'], [])
+        self.assertEqual(steps['ecommerce-logs-2025.12.10']['actions'], ['read_only', 'drop_replicas', 'forcemerge'])
+        self.assertEqual(steps['ecommerce-logs-2025.11.01']['actions'], ['delete'])
+
+    def test_report_savings(self):
+        es = self._client(
+            [{'index': 'ecommerce-logs-2025.12.10', 'rep': '1'}, {'index': 'ecommerce-logs-2025.11.01'}],
+            segments={'ecommerce-logs-2025.12.10': 14, 'ecommerce-logs-2025.11.01': 3}
+        )
+        manager = self._manager(es)
+        report = manager.report(manager.plan(self.TODAY))
+        self.assertEqual((report['shards_before'], report['shards_after']), (3, 1))
+        self.assertEqual((report['segments_before'], report['segments_after']), (17, 1))
+        self.assertEqual(report['indices_deleted'], 1)
+        self.assertEqual(report['bytes_deleted'], 2048)
+
+    def test_merged_and_blocked_day_is_left_alone(self):
+        es = self._client([{'index': 'ecommerce-logs-2025.12.10'}],
+                          segments={'ecommerce-logs-2025.12.10': 1}, blocked={'ecommerce-logs-2025.12.10'})
+        self.assertEqual(self._manager(es).plan(self.TODAY)[0]['actions'], [])
+
+    def test_dry_run_changes_nothing(self):
+        es = self._client([{'index': 'ecommerce-logs-2025.11.01'}, {'index': 'ecommerce-logs-2025.12.10'}],
+                          segments={'ecommerce-logs-2025.12.10': 5})
+        outcome = self._manager(es).run(self.TODAY, dry_run=True)
+        self.assertEqual({result['status'] for result in outcome['results']}, {'dry_run'})
+        es.indices.delete.assert_not_called()
+        es.indices.put_settings.assert_not_called()
+        es.options.assert_not_called()
+
+    def test_apply(self):
+        es = self._client([{'index': 'ecommerce-logs-2025.12.10'}], segments={'ecommerce-logs-2025.12.10': 5})
+        outcome = self._manager(es).run(self.TODAY)
+        self.assertEqual([result['status'] for result in outcome['results']], ['ok', 'ok'])
+        es.indices.put_settings.assert_called_once_with(
+            index='ecommerce-logs-2025.12.10', settings={'index.blocks.write': True})
+        es.options.return_value.indices.forcemerge.assert_called_once_with(
+            index='ecommerce-logs-2025.12.10', max_num_segments=1)
+
+    def test_failed_snapshot_keeps_index(self):
+        """Pas de suppression si le snapshot n'a pas abouti"""
+        es = self._client([{'index': 'ecommerce-logs-2025.11.01'}])
+        es.options.return_value.snapshot.create.return_value = {'snapshot': {'state': 'PARTIAL'}}
+        outcome = self._manager(es, snapshot_repository='backups').run(self.TODAY)
+        self.assertEqual([(r['action'], r['status']) for r in outcome['results']], [('snapshot', 'error')])
+        es.indices.delete.assert_not_called()
+
+        es.options.return_value.snapshot.create.return_value = {'snapshot': {'state': 'SUCCESS'}}
+        outcome = self._manager(es, snapshot_repository='backups').run(self.TODAY)
+        self.assertEqual([r['status'] for r in outcome['results']], ['ok', 'ok'])
+        es.indices.delete.assert_called_once_with(index='ecommerce-logs-2025.11.01')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,725 @@
+"""
+Tests du module de requêtes
+Valide la résolution des index quotidiens à partir d'une plage de dates
+"""
+
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import DEFAULT, MagicMock, patch
+import sys
+import os
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from ingest.canonical import canonical_fields, canonicalize
+from query.hit_normalizer import HitNormalizer, compile_plan
+from query.index_resolver import IndexResolver, data_version, parse_day
+from query.projection import canonical_term, complete_legacy_sources
+from query.rollups import ROLLUP_VERSION, OrderRollups, format_results, results_aggs
+from query.config import QueryConfig
+from query.cursor import CursorError, SearchCursors
+from query.export import HitExporter, csv_chunks, export_query
+from query import export_jobs
+from query.export_jobs import ExportJobError, ExportJobManager
+from elasticsearch import NotFoundError
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+
+
+def _bounds_response(names, bounds=None):
+    """Réponse de l'agrégation min/max @timestamp par index (par défaut : le jour du nom)"""
+    buckets = []
+    for name in names:
+        if bounds and name in bounds:
+            span = bounds[name]
+        elif name[-10:].replace('.', '').isdigit():
+            day = name[-10:].replace('.', '-')
+            span = (f"{day}T00:00:00+00:00", f"{day}T23:59:59+00:00")
+        else:
+            continue
+        if span is not None:
+            first, last = (datetime.fromisoformat(value).timestamp() * 1000 for value in span)
+            buckets.append({'key': name, 'first': {'value': first}, 'last': {'value': last}})
+    return {'aggregations': {'indices': {'buckets': buckets}}}
+
+
+def _is_bounds_query(kwargs):
+    return 'indices' in (kwargs.get('aggs') or {})
+
+
+def _catalogue_client(names, closed=(), bounds=None):
+    es = MagicMock()
+    es.cat.indices.return_value = [
+        {'index': name, 'status': 'close' if name in closed else 'open'} for name in names
+    ]
+    # Les autres recherches renvoient es.search.return_value
+    es.search.side_effect = lambda **kwargs: (_bounds_response(names, bounds) if _is_bounds_query(kwargs)
+                                              else DEFAULT)
+    return es
+
+
+def _daily(start, days, prefix='ecommerce-logs'):
+    first = date.fromisoformat(start).toordinal()
+    return [f"{prefix}-{date.fromordinal(first + i).strftime('%Y.%m.%d')}" for i in range(days)]
+
+
+class TestParseDay(unittest.TestCase):
+    """Tests de l'interprétation des bornes"""
+
+    NOW = datetime(2025, 12, 21, 15, 30, tzinfo=timezone.utc)
+
+    def test_iso_dates(self):
+        self.assertEqual(parse_day('2025-12-01'), date(2025, 12, 1))
+        self.assertEqual(parse_day('2025-12-01T23:30:00-02:00'), date(2025, 12, 2))
+
+    def test_date_math(self):
+        self.assertEqual(parse_day('now', self.NOW), date(2025, 12, 21))
+        self.assertEqual(parse_day('now-7d/d', self.NOW), date(2025, 12, 14))
+        self.assertEqual(parse_day('now-1M', self.NOW), date(2025, 11, 21))
+
+    def test_epoch_millis(self):
+        self.assertEqual(parse_day(1766275200000), date(2025, 12, 21))
+        self.assertEqual(parse_day('1766275200000'), date(2025, 12, 21))
+
+    def test_unparseable(self):
+        self.assertIsNone(parse_day('last tuesday'))
+
+
+class TestIndexResolver(unittest.TestCase):
+    """Tests du resolver d'index"""
+
+    def setUp(self):
+        self.names = _daily('2025-10-01', 92)  # octobre -> décembre
+        self.es = _catalogue_client(self.names + ['ecommerce-logs-archive'], bounds={
+            'ecommerce-logs-archive': ('2025-01-01T00:00:00+00:00', '2025-12-31T23:00:00+00:00')})
+        self.resolver = IndexResolver(self.es, ttl=60, margin_days=1)
+
+    def test_window_selects_daily_indices_with_margin(self):
+        """Une fenêtre de 2 jours touche 4 index quotidiens (+1 jour de chaque côté) et l'archive qui la couvre"""
+        indices = self.resolver.resolve('2025-12-10', '2025-12-11T12:00:00')
+        self.assertEqual(indices, ['ecommerce-logs-archive', 'ecommerce-logs-2025.12.09',
+                                   'ecommerce-logs-2025.12.10', 'ecommerce-logs-2025.12.11',
+                                   'ecommerce-logs-2025.12.12'])
+
+    def test_open_ended_window(self):
+        indices = self.resolver.resolve(start='2025-12-30')
+        self.assertEqual(indices[1:], ['ecommerce-logs-2025.12.29', 'ecommerce-logs-2025.12.30',
+                                       'ecommerce-logs-2025.12.31'])
+
+    def test_no_range_or_unparseable_bound_uses_wildcard(self):
+        self.assertIsNone(self.resolver.resolve())
+        self.assertIsNone(self.resolver.resolve('yesterday', '2025-12-01'))
+        self.assertEqual(self.resolver.expression(None), 'ecommerce-logs-*')
+
+    def test_window_without_indices_is_empty(self):
+        """Aucun index dans la fenêtre : la requête peut être court-circuitée"""
+        resolver = IndexResolver(_catalogue_client(self.names), margin_days=1)
+        self.assertEqual(resolver.resolve('2024-01-01', '2024-01-31'), [])
+
+    def test_contents_outside_name_day_are_found(self):
+        """Un index chargé un autre jour que celui de ses documents est retenu d'après son contenu"""
+        es = _catalogue_client(self.names + ['ecommerce-logs-empty'], bounds={
+            'ecommerce-logs-2025.10.01': ('2025-06-03T08:00:00+00:00', '2025-10-01T09:00:00+00:00'),
+            'ecommerce-logs-empty': None})
+        resolver = IndexResolver(es, margin_days=0)
+        self.assertEqual(resolver.resolve('2025-06-01', '2025-06-30'), ['ecommerce-logs-2025.10.01'])
+        self.assertEqual(resolver.resolve('2025-12-10', '2025-12-10'), ['ecommerce-logs-2025.12.10'])
+        self.assertEqual(resolver.resolve('2025-01-01', '2025-01-31'), [])
+
+    def test_bounds_error_falls_back_to_wildcard(self):
+        """Sans les bornes du contenu, le jour du nom ne suffit pas : wildcard"""
+        self.es.search.side_effect = ConnectionError('timeout')
+        self.assertIsNone(self.resolver.resolve('2025-12-01', '2025-12-02'))
+        self.assertEqual(len(self.resolver.catalogue()), 93)
+
+    def test_data_version_follows_document_counts(self):
+        es = MagicMock()
+        es.indices.stats.return_value = {'indices': {'i1': {'primaries': {'docs': {'count': 10, 'deleted': 0}}}}}
+        version = data_version(es, 'i1')
+        self.assertEqual(data_version(es, 'i1'), version)
+        es.indices.stats.return_value['indices']['i1']['primaries']['docs']['deleted'] = 1
+        self.assertNotEqual(data_version(es, 'i1'), version)
+        self.assertEqual(data_version(es, None), 'empty')
+
+    def test_catalogue_is_cached(self):
+        self.resolver.resolve('2025-12-01', '2025-12-02')
+        self.resolver.resolve('2025-11-01', '2025-11-02')
+        self.assertEqual(self.es.cat.indices.call_count, 1)
+
+        self.resolver.invalidate()
+        self.resolver.resolve('2025-12-01', '2025-12-02')
+        self.assertEqual(self.es.cat.indices.call_count, 2)
+
+    def test_catalogue_expires(self):
+        with patch('query.index_resolver.time.monotonic', side_effect=[0.0, 100.0, 100.0]):
+            self.resolver.catalogue()
+            self.resolver.catalogue()
+        self.assertEqual(self.es.cat.indices.call_count, 2)
+
+    def test_closed_indices_are_skipped(self):
+        resolver = IndexResolver(_catalogue_client(self.names, closed={'ecommerce-logs-2025.12.10'}), margin_days=0)
+        self.assertEqual(resolver.resolve('2025-12-10', '2025-12-10'), [])
+
+    def test_latest(self):
+        self.assertEqual(self.resolver.latest(2), ['ecommerce-logs-2025.12.30', 'ecommerce-logs-2025.12.31'])
+
+    def test_catalogue_error_falls_back_to_wildcard(self):
+        self.es.cat.indices.side_effect = ConnectionError('down')
+        self.assertIsNone(self.resolver.resolve('2025-12-01', '2025-12-02'))
+
+    @patch('query.index_resolver.QueryConfig.MAX_INDEX_EXPRESSION_LENGTH', 200)
+    def test_long_expressions_use_month_wildcards(self):
+        """Les mois entièrement couverts deviennent ecommerce-logs-YYYY.MM.*"""
+        indices = self.resolver.resolve('2025-10-15', '2025-12-31')
+        expression = self.resolver.expression(indices)
+        parts = expression.split(',')
+        self.assertIn('ecommerce-logs-2025.11.*', parts)
+        self.assertIn('ecommerce-logs-2025.12.*', parts)
+        self.assertIn('ecommerce-logs-2025.10.14', parts)
+        self.assertNotIn('ecommerce-logs-2025.10.*', parts)
+        self.assertIn('ecommerce-logs-archive', parts)
+
+    def test_short_expression_lists_indices(self):
+        indices = self.resolver.resolve('2025-12-10', '2025-12-10')
+        self.assertEqual(self.resolver.expression(indices), ','.join(indices))
+
+
+SHAPES = [
+    {'@timestamp': 't', 'Level': 'ERROR', 'Service': 'payment', 'Message': 'Timeout', 'User': 'u1'},
+    {'@timestamp': 't', 'Level': 'INFO', 'Service': '', 'app': 'api', 'Message': 'ok'},
+    {'@timestamp': 't', 'event': 'add_to_cart', 'user': 'u2', 'page': '/cart'},
+    {'@timestamp': 't', 'event': 'login'},
+    {'@timestamp': 't', 'severity': 'WARN', 'msg': 'disk', 'component': 'db'},
+    {'@timestamp': 't', 'level': 'DEBUG', 'message': 'hi', 'User': 'u3', 'source': 'worker'},
+    {'order_id': 'O1', 'product_name': 'Laptop'},
+    {'@timestamp': 't', 'foo': 'bar'},
+    {'@timestamp': 't', 'Level': 'WARN', 'message': 'kept', 'Message': 'other'},
+    {'@timestamp': 't', 'event': {'type': 'click'}, 'severity': 'WARN', 'source': {'ip': '1.2.3.4'}, 'app': 'web'},
+]
+
+
+class TestHitNormalizer(unittest.TestCase):
+    """Tests du normaliseur de hits compilé par forme de document"""
+
+    def test_same_result_as_canonical_rules(self):
+        """Le plan compilé reproduit les règles de l'ingestion pour chaque forme"""
+        normalizer = HitNormalizer()
+        for source in SHAPES:
+            expected = canonical_fields(dict(source))
+            row = normalizer.row(dict(source))
+            self.assertEqual(row, (source.get('@timestamp', ''), expected['level'], expected['service'],
+                                   expected['message'], expected['user']), source)
+
+    def test_canonical_documents_are_read_directly(self):
+        normalizer = HitNormalizer()
+        source = canonicalize({'@timestamp': 't', 'Level': 'ERROR', 'Message': 'boom'})
+        source['service'] = 'overridden'
+        self.assertEqual(normalizer.row(source)[2], 'overridden')
+
+    def test_hit_format(self):
+        hit = HitNormalizer().hit({'_id': '1', '_source': SHAPES[0]})
+        self.assertEqual(hit, {'_id': '1', 'timestamp': 't', 'level': 'ERROR', 'service': 'payment',
+                               'message': 'Timeout', 'user': 'u1'})
+
+    def test_plans_are_cached_by_shape(self):
+        normalizer = HitNormalizer()
+        with patch('query.hit_normalizer.compile_plan', wraps=compile_plan) as compiled:
+            for _ in range(3):
+                for source in SHAPES:
+                    normalizer.row(source)
+        self.assertEqual(compiled.call_count, len(SHAPES))
+        self.assertEqual(normalizer.plan_count, len(SHAPES))
+
+    def test_plan_cache_is_bounded(self):
+        normalizer = HitNormalizer(max_plans=4)
+        for i in range(10):
+            normalizer.row({'@timestamp': 't', f'field_{i}': i})
+        self.assertLessEqual(normalizer.plan_count, 4)
+
+
+class TestProjection(unittest.TestCase):
+    """Tests du rechargement des champs historiques"""
+
+    def test_canonical_hits_need_no_request(self):
+        es = MagicMock()
+        hits = [{'_index': 'i', '_id': '1', '_source': canonicalize({'Level': 'INFO', 'Message': 'ok'})}]
+        self.assertEqual(complete_legacy_sources(es, hits), 0)
+        es.mget.assert_not_called()
+
+    def test_legacy_hits_are_fetched_with_legacy_fields_only(self):
+        es = MagicMock()
+        es.mget.return_value = {'docs': [
+            {'_id': '2', 'found': True, '_source': {'Level': 'ERROR', 'Message': 'boom'}},
+            {'_id': '3', 'found': False}
+        ]}
+        hits = [
+            {'_index': 'i', '_id': '1', '_source': canonicalize({'Level': 'INFO'})},
+            {'_index': 'i', '_id': '2', '_source': {}},
+            {'_index': 'i', '_id': '3', '_source': {'level': 'x'}},
+        ]
+        self.assertEqual(complete_legacy_sources(es, hits), 2)
+        kwargs = es.mget.call_args.kwargs
+        self.assertEqual(kwargs['docs'], [{'_index': 'i', '_id': '2'}, {'_index': 'i', '_id': '3'}])
+        self.assertIn('Message', kwargs['_source_includes'])
+        self.assertEqual(hits[1]['_source'], {'Level': 'ERROR', 'Message': 'boom'})
+        self.assertEqual(hits[2]['_source'], {'level': 'x'})
+
+    def test_canonical_term_matches_legacy_documents_only_on_legacy_field(self):
+        clauses = canonical_term('service', 'payment')['bool']['should']
+        self.assertEqual(clauses[0], {'term': {'service': 'payment'}})
+        self.assertEqual(clauses[1]['bool']['filter'], [{'term': {'Service': 'payment'}}])
+        self.assertEqual(clauses[1]['bool']['must_not'], [{'exists': {'field': 'canonical_version'}}])
+
+    @patch('query.projection.QueryConfig.LEGACY_MGET_BATCH_SIZE', 2)
+    def test_mget_batches(self):
+        es = MagicMock()
+        es.mget.side_effect = lambda docs, _source_includes: {'docs': [{'found': False} for _ in docs]}
+        complete_legacy_sources(es, [{'_index': 'i', '_id': str(i), '_source': {}} for i in range(5)])
+        self.assertEqual(es.mget.call_count, 3)
+
+
+def _search_response(hits, total=None, pit_id='pit-2'):
+    body = {'took': 3, 'pit_id': pit_id, 'hits': {'hits': hits}}
+    if total is not None:
+        body['hits']['total'] = {'value': total, 'relation': 'eq'}
+    response = MagicMock()
+    response.body = body
+    return response
+
+
+def _page(start, count):
+    return [{'_index': 'ecommerce-logs-2025.12.21', '_id': str(i), 'sort': [1000 - i, i],
+             '_source': canonicalize({'@timestamp': 't', 'Level': 'INFO', 'Message': str(i)})}
+            for i in range(start, start + count)]
+
+
+class TestSearchCursors(unittest.TestCase):
+    """Tests de la pagination PIT + search_after"""
+
+    def setUp(self):
+        self.es = MagicMock()
+        self.es.open_point_in_time.return_value = {'id': 'pit-1'}
+        self.cursors = SearchCursors(self.es, 'secret', keep_alive='1m')
+
+    def test_first_page_opens_pit_and_counts_total(self):
+        self.es.search.return_value = _search_response(_page(0, 2), total=5)
+        state = self.cursors.open('ecommerce-logs-2025.12.21', {'match_all': {}}, 2)
+        hits, total, _took, token = self.cursors.page(state)
+
+        self.es.open_point_in_time.assert_called_once_with(
+            index='ecommerce-logs-2025.12.21', keep_alive='1m', ignore_unavailable=True)
+        body = self.es.search.call_args.kwargs['body']
+        self.assertEqual(body['pit'], {'id': 'pit-1', 'keep_alive': '1m'})
+        self.assertEqual(body['sort'][1], {'_shard_doc': {'order': 'desc'}})
+        self.assertTrue(body['track_total_hits'])
+        self.assertNotIn('search_after', body)
+        self.assertEqual((len(hits), total), (2, 5))
+        self.assertIsNotNone(token)
+
+    def test_next_page_uses_search_after_and_carried_total(self):
+        self.es.search.return_value = _search_response(_page(0, 2), total=5)
+        _, _, _, token = self.cursors.page(self.cursors.open('idx', {'match_all': {}}, 2))
+
+        self.es.search.return_value = _search_response(_page(2, 2), pit_id='pit-3')
+        hits, total, _took, token = self.cursors.page(self.cursors.decode(token))
+        body = self.es.search.call_args.kwargs['body']
+        self.assertEqual(body['search_after'], [999, 1])
+        self.assertEqual(body['pit']['id'], 'pit-2')
+        self.assertFalse(body['track_total_hits'])
+        self.assertEqual(total, 5)
+        self.assertEqual(self.cursors.decode(token)['pit'], 'pit-3')
+
+    def test_last_page_closes_pit(self):
+        self.es.search.return_value = _search_response(_page(0, 1), total=1)
+        _, _, _, token = self.cursors.page(self.cursors.open('idx', {'match_all': {}}, 2))
+        self.assertIsNone(token)
+        self.es.close_point_in_time.assert_called_once_with(id='pit-2')
+
+    def test_tampered_token_is_rejected(self):
+        token = self.cursors.encode({'pit': 'pit-1', 'query': {'match_all': {}}, 'size': 2,
+                                     'after': None, 'total': None})
+        payload, signature = token.split('.')
+        with self.assertRaises(CursorError):
+            self.cursors.decode(payload[:-2] + 'xx.' + signature)
+        with self.assertRaises(CursorError):
+            SearchCursors(self.es, 'other-secret').decode(token)
+        with self.assertRaises(CursorError):
+            self.cursors.decode('not-a-cursor')
+
+    def test_expired_pit(self):
+        meta = ApiResponseMeta(404, 'HTTP/1.1', HttpHeaders(), 0.1, NodeConfig('http', 'localhost', 9200))
+        self.es.search.side_effect = NotFoundError('search_context_missing_exception', meta, {})
+        with self.assertRaises(CursorError) as ctx:
+            self.cursors.page({'pit': 'old', 'query': {}, 'size': 2, 'after': [1, 2], 'total': 4})
+        self.assertEqual(ctx.exception.status_code, 410)
+
+    @patch('query.cursor.QueryConfig.CURSOR_MAX_SIZE', 100)
+    def test_page_size_is_capped(self):
+        self.assertEqual(self.cursors.open('idx', {}, 5000)['size'], 100)
+
+
+class TestHitExporter(unittest.TestCase):
+    """Tests de l'export CSV en flux"""
+
+    def setUp(self):
+        self.es = MagicMock()
+        self.es.open_point_in_time.return_value = {'id': 'pit-1'}
+        self.exporter = HitExporter(self.es, batch_size=2, keep_alive='1m')
+
+    def test_walks_every_batch_then_closes_pit(self):
+        self.es.search.side_effect = [_search_response(_page(0, 2)), _search_response(_page(2, 2)),
+                                      _search_response(_page(4, 1))]
+        batches = list(self.exporter.batches(self.exporter.open('idx'), {'match_all': {}}))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        bodies = [call.kwargs['body'] for call in self.es.search.call_args_list]
+        self.assertNotIn('search_after', bodies[0])
+        self.assertEqual(bodies[2]['search_after'], [997, 3])
+        self.assertFalse(bodies[0]['track_total_hits'])
+        self.es.close_point_in_time.assert_called_once_with(id='pit-2')
+
+    def test_abandoned_download_closes_pit(self):
+        self.es.search.return_value = _search_response(_page(0, 2))
+        batches = self.exporter.batches('pit-1', {'match_all': {}})
+        next(batches)
+        batches.close()
+        self.es.close_point_in_time.assert_called_once_with(id='pit-2')
+
+    def _sliced_search(self, slices):
+        """Tranche i : hits dont le tri vaut 1000 - n pour n ≡ i (mod slices), par lots de 2"""
+        docs = {i: [hit for hit in _page(0, 9) if int(hit['_id']) % slices == i] for i in range(slices)}
+
+        def search(body, filter_path):
+            remaining = docs[body['slice']['id']]
+            if 'search_after' in body:
+                remaining = [hit for hit in remaining if hit['sort'] < body['search_after']]
+            return _search_response(remaining[:body['size']])
+        return search
+
+    def test_sliced_ordered_merge(self):
+        self.es.search.side_effect = self._sliced_search(3)
+        batches = list(self.exporter.batches('pit-1', {'match_all': {}}, slices=3))
+
+        ids = [hit['_id'] for batch in batches for hit in batch]
+        self.assertEqual(ids, [str(i) for i in range(9)])
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+        slice_ids = {call.kwargs['body']['slice']['id'] for call in self.es.search.call_args_list}
+        self.assertEqual(slice_ids, {0, 1, 2})
+        self.es.close_point_in_time.assert_called_once()
+
+    def test_sliced_unordered(self):
+        self.es.search.side_effect = self._sliced_search(4)
+        batches = list(self.exporter.batches('pit-1', {'match_all': {}}, slices=4, ordered=False))
+        self.assertEqual(sorted(int(hit['_id']) for batch in batches for hit in batch), list(range(9)))
+
+    def test_slice_error_is_raised(self):
+        self.es.search.side_effect = RuntimeError('shard failure')
+        with self.assertRaises(RuntimeError):
+            list(self.exporter.batches('pit-1', {'match_all': {}}, slices=2))
+        self.es.close_point_in_time.assert_called_once()
+
+    def test_export_query(self):
+        self.assertEqual(export_query(), {'match_all': {}})
+        must = export_query('timeout', level='ERROR', end_date='2025-12-21')['bool']['must']
+        self.assertEqual(must[1], canonical_term('level', 'ERROR'))
+        self.assertEqual(must[2], {'range': {'@timestamp': {'lte': '2025-12-21'}}})
+
+    def test_header_before_first_batch(self):
+        def batches():
+            raise AssertionError('lot demandé avant l\'en-tête')
+            yield
+
+        chunks = csv_chunks(batches(), lambda source: ())
+        self.assertEqual(next(chunks), b'Timestamp,Level,Service,Message,User\r\n')
+
+    def test_csv_and_gzip_streams_match(self):
+        batches = [_page(0, 2), _page(2, 1)]
+        row = HitNormalizer().row
+        plain = b''.join(csv_chunks(batches, row))
+        chunks = list(csv_chunks(batches, row, compress=True))
+
+        self.assertEqual(len(chunks), 4)  # en-tête, 2 lots, fin du gzip
+        self.assertEqual(gzip.decompress(b''.join(chunks)), plain)
+        rows = list(csv.reader(io.StringIO(plain.decode('utf-8'))))
+        self.assertEqual(rows[1], ['t', 'INFO', 'Application', '0', ''])
+        self.assertEqual(len(rows), 4)
+
+
+class TestExportJobs(unittest.TestCase):
+    """Tests des jobs d'export et de la déduplication des artefacts"""
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.es = MagicMock()
+        self.es.open_point_in_time.return_value = {'id': 'pit-1'}
+        # Tous les hits dans la tranche 0
+        self.es.search.side_effect = lambda body, filter_path: _search_response(
+            _page(0, 3) if body.get('slice', {}).get('id', 0) == 0 else [])
+        self._stats(3)
+        resolver = MagicMock()
+        resolver.resolve.return_value = ['ecommerce-logs-2025.12.21']
+        resolver.expression.side_effect = ','.join
+        self.manager = ExportJobManager(self.es, resolver, self.export_dir, max_workers=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.export_dir)
+
+    def _stats(self, count):
+        self.es.indices.stats.return_value = {'indices': {
+            'ecommerce-logs-2025.12.21': {'primaries': {'docs': {'count': count, 'deleted': 0}}}}}
+
+    def _wait(self, job):
+        for _ in range(500):
+            job = self.manager.get(job['job_id'])
+            if job['status'] in ('completed', 'failed'):
+                return job
+            time.sleep(0.01)
+        self.fail('export job did not finish')
+
+    def test_csv_gz_artifact(self):
+        job = self._wait(self.manager.request_export({'level': 'INFO', 'start_date': '2025-12-21'}))
+        self.assertEqual(job['status'], 'completed', job['errors'])
+        self.assertEqual(job['result']['rows'], 3)
+        with open(self.manager.artifact_path(job['job_id']), 'rb') as artifact:
+            rows = list(csv.reader(io.StringIO(gzip.decompress(artifact.read()).decode('utf-8'))))
+        self.assertEqual(rows[0], ['Timestamp', 'Level', 'Service', 'Message', 'User'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(os.listdir(self.export_dir), [job['artifact']])
+
+    def test_repeated_export_reuses_artifact(self):
+        first = self._wait(self.manager.request_export({'level': 'INFO', 'query': ''}))
+        searches = self.es.search.call_count
+
+        again = self.manager.request_export({'level': 'INFO'})
+        self.assertTrue(again['cached'])
+        self.assertEqual(again['status'], 'completed')
+        self.assertEqual(again['artifact'], first['artifact'])
+        self.assertEqual(self.es.search.call_count, searches)
+        self.assertIsNotNone(self.manager.artifact_path(again['job_id']))
+
+        other = self._wait(self.manager.request_export({'level': 'ERROR'}))
+        self.assertFalse(other['cached'])
+        self.assertNotEqual(other['artifact'], first['artifact'])
+
+    def test_new_data_replaces_artifact(self):
+        first = self._wait(self.manager.request_export({'level': 'INFO'}))
+        self._stats(4)
+        second = self._wait(self.manager.request_export({'level': 'INFO'}))
+        self.assertFalse(second['cached'])
+        self.assertNotEqual(second['artifact'], first['artifact'])
+        self.assertEqual(os.listdir(self.export_dir), [second['artifact']])
+        self.assertIsNone(self.manager.artifact_path(first['job_id']))
+
+    def test_invalid_format(self):
+        with self.assertRaises(ExportJobError):
+            self.manager.request_export({}, 'xlsx')
+
+    @unittest.skipIf(export_jobs.pyarrow is not None, 'pyarrow installé')
+    def test_parquet_requires_pyarrow(self):
+        with self.assertRaises(ExportJobError) as ctx:
+            self.manager.request_export({}, 'parquet')
+        self.assertEqual(ctx.exception.status_code, 501)
+
+    @unittest.skipIf(export_jobs.pyarrow is None, 'pyarrow non installé')
+    def test_parquet_artifact(self):
+        job = self._wait(self.manager.request_export({}, 'parquet'))
+        self.assertEqual(job['status'], 'completed', job['errors'])
+        table = export_jobs.pyarrow.parquet.read_table(self.manager.artifact_path(job['job_id']))
+        self.assertEqual(table.column_names, ['timestamp', 'level', 'service', 'message', 'user'])
+        self.assertEqual(table.num_rows, 3)
+
+
+def _results_aggregations():
+    bucket = {'key': 'France', 'orders': {'value': 4.0}, 'country_revenue': {'value': 100.0},
+              'product_revenue': {'value': 100.0}, 'quantity_sold': {'value': 6.0}}
+    terms = {'buckets': [bucket]}
+    return {
+        'total_revenue': {'value': 100.0}, 'total_orders': {'value': 4.0}, 'unique_customers': {'value': 3},
+        'orders_by_country': terms, 'top_products': terms, 'orders_by_category': terms,
+        'payment_methods': terms, 'order_status': terms,
+        'orders_over_time': {'buckets': [{'key_as_string': '2025-12-21T10:00:00.000Z', 'orders': {'value': 4.0},
+                                          'hourly_revenue': {'value': 100.0}}]}
+    }
+
+
+class TestOrderRollups(unittest.TestCase):
+    """Tests des rollups horaires de /api/results"""
+
+    DAYS = _daily('2025-12-19', 4)
+
+    HOUR_KEY = {'hour': 1766300400000, 'customer_country': 'France', 'product_name': 'Laptop',
+                'product_category': None, 'payment_method': 'paypal', 'order_status': 'completed'}
+
+    def setUp(self):
+        self.es = _catalogue_client(self.DAYS)
+        self.es.search.side_effect = self._search
+        self.es.indices.exists.return_value = True
+        # 19 et 20 à jour, 21 modifié depuis son rollup, 22 jamais résumé
+        self.es.options.return_value.mget.return_value = MagicMock(body={'docs': [
+            {'found': True, '_source': {'day': '2025.12.19', 'source_docs': 10, 'rollup_version': ROLLUP_VERSION}},
+            {'found': True, '_source': {'day': '2025.12.20', 'source_docs': 10, 'rollup_version': ROLLUP_VERSION}},
+            {'found': True, '_source': {'day': '2025.12.21', 'source_docs': 7, 'rollup_version': ROLLUP_VERSION}},
+            {'found': False}
+        ]})
+        self.rollups = OrderRollups(self.es, IndexResolver(self.es), rollup_index='rollups')
+
+    def _search(self, **kwargs):
+        """Bornes du catalogue et commandes datées de leur jour (10 par index)"""
+        aggs = kwargs.get('aggs', {})
+        if _is_bounds_query(kwargs):
+            return _bounds_response(self.DAYS)
+        if 'units' in aggs:
+            return {'aggregations': {'units': {'buckets': {
+                name: {'doc_count': 10} for name in aggs['units']['filters']['filters']}}}}
+        return DEFAULT
+
+    def _materialize(self, customers, extra=None):
+        """Matérialise au 22/12 avec un bucket horaire ; renvoie (rapport, documents, recherches)"""
+        actions, searches = [], []
+
+        def search(**kwargs):
+            searches.append(kwargs)
+            response = self._search(**kwargs)
+            aggs = kwargs.get('aggs', {})
+            if response is not DEFAULT:
+                return response
+            if 'hours' in aggs:
+                return {'aggregations': {'hours': {'buckets': [{
+                    'key': self.HOUR_KEY, 'doc_count': 2, 'total_amount': {'value': 50.5},
+                    'quantity': {'value': 3.0}, 'customers': customers}]}}}
+            if 'customers' in aggs:
+                return {'aggregations': {'customers': {'buckets': [{'key': {'customer': key}} for key in extra]}}}
+            return {'hits': {'hits': [{'_source': {'day': '2025.12.01'}}, {'_source': {'day': '2025.12.19'}}]}}
+        self.es.search.side_effect = search
+
+        with patch('query.rollups.BulkIndexer') as bulk_indexer:
+            def index(docs):
+                actions.extend(docs)
+                return MagicMock(failed=0, indexed=len(actions))
+            bulk_indexer.return_value.index.side_effect = index
+            report = self.rollups.materialize(today=date(2025, 12, 22))
+        return report, actions, searches
+
+    def test_plan_uses_rollups_for_inner_up_to_date_days(self):
+        rolled, raw = self.rollups.plan('2025-12-18', '2025-12-22')
+        self.assertEqual(rolled, ['2025.12.19', '2025.12.20'])
+        # Les index en rollup restent lus pour leurs commandes datées d'un autre jour
+        self.assertEqual(raw, self.DAYS)
+
+    def test_plan_compares_orders_dated_on_the_day(self):
+        self.rollups.plan('2025-12-18', '2025-12-22')
+        counts = [call.kwargs for call in self.es.search.call_args_list if 'units' in call.kwargs.get('aggs', {})]
+        unit = counts[0]['aggs']['units']['filters']['filters']['ecommerce-logs-2025.12.19']
+        self.assertEqual(unit['bool']['filter'], [
+            {'term': {'_index': 'ecommerce-logs-2025.12.19'}},
+            {'range': {'@timestamp': {'gte': '2025-12-19T00:00:00Z', 'lt': '2025-12-20T00:00:00Z'}}}])
+        self.es.indices.stats.assert_not_called()
+
+    def test_plan_keeps_window_edges_raw(self):
+        rolled, raw = self.rollups.plan('2025-12-19T06:00:00Z', '2025-12-21')
+        self.assertEqual(rolled, ['2025.12.20'])
+        self.assertIn('ecommerce-logs-2025.12.19', raw)
+
+    def test_plan_without_rollups(self):
+        rolled, raw = self.rollups.plan(use_rollups=False)
+        self.assertEqual((rolled, raw), ([], self.DAYS))
+
+    def test_results_query_combines_rollups_and_tail(self):
+        self.es.search.return_value = {'aggregations': _results_aggregations()}
+        response = self.rollups.results('2025-12-18', '2025-12-22')
+
+        kwargs = self.es.search.call_args.kwargs
+        self.assertEqual(kwargs['index'], ','.join(self.DAYS + ['rollups']))
+        raw, rollup = kwargs['query']['bool']['should']
+        self.assertIn({'exists': {'field': 'order_id'}}, raw['bool']['filter'])
+        # Commandes résumées par les rollups exclues du brut : jour 19 de l'index du 19, jour 20 de celui du 20
+        self.assertEqual([unit['bool']['filter'][0] for unit in raw['bool']['must_not']],
+                         [{'term': {'_index': 'ecommerce-logs-2025.12.19'}},
+                          {'term': {'_index': 'ecommerce-logs-2025.12.20'}}])
+        self.assertIn({'range': {'@timestamp': {'gte': '2025-12-20T00:00:00Z', 'lt': '2025-12-21T00:00:00Z'}}},
+                      raw['bool']['must_not'][1]['bool']['filter'])
+        self.assertIn({'terms': {'day': ['2025.12.19', '2025.12.20']}}, rollup['bool']['filter'])
+        self.assertEqual(response['summary']['total_orders'], 4)
+
+    def test_format_results(self):
+        response = format_results(_results_aggregations())
+        self.assertEqual(response['summary'], {'total_revenue': 100.0, 'total_orders': 4,
+                                               'avg_order_value': 25.0, 'unique_customers': 3})
+        self.assertEqual(response['by_country'], [{'country': 'France', 'orders': 4, 'revenue': 100.0}])
+        self.assertEqual(response['over_time'][0]['orders'], 4)
+        self.assertEqual(results_aggs()['total_orders'], {'sum': {'field': 'order_count', 'missing': 1}})
+
+    def test_materialize_rolls_dirty_past_days(self):
+        report, actions, searches = self._materialize({'buckets': [{'key': 'CUST-1'}, {'key': 'CUST-2'}]})
+
+        self.assertEqual(report['rolled'], ['2025.12.21'])
+        self.assertEqual((report['up_to_date'], report['pending'], report['removed']), (2, 1, ['2025.12.01']))
+        doc = actions[0]['_source']
+        self.assertEqual(actions[0]['_index'], 'rollups')
+        self.assertEqual((doc['order_count'], doc['quantity'], doc['customer_id']), (2, 3, ['CUST-1', 'CUST-2']))
+        self.assertNotIn('product_category', doc)
+        state = self.es.index.call_args.kwargs
+        self.assertEqual(state['id'], 'state-2025.12.21')
+        self.assertEqual(state['document']['source_docs'], 10)
+
+        hourly = next(kwargs for kwargs in searches if 'hours' in kwargs.get('aggs', {}))
+        self.assertIn({'range': {'@timestamp': {'gte': '2025-12-21T00:00:00Z', 'lt': '2025-12-22T00:00:00Z'}}},
+                      hourly['query']['bool']['filter'])
+        # Page × (1 + clients par bucket) sous search.max_buckets
+        composite = hourly['aggs']['hours']
+        self.assertLessEqual(composite['composite']['size'] * (composite['aggs']['customers']['terms']['size'] + 1),
+                             QueryConfig.ROLLUP_MAX_BUCKETS)
+
+    def test_truncated_customers_are_listed_exactly(self):
+        report, actions, searches = self._materialize(
+            {'buckets': [{'key': 'CUST-1'}], 'sum_other_doc_count': 2}, extra=['CUST-1', 'CUST-2', 'CUST-3'])
+
+        self.assertEqual(actions[0]['_source']['customer_id'], ['CUST-1', 'CUST-2', 'CUST-3'])
+        follow_up = next(kwargs for kwargs in searches if 'customers' in kwargs.get('aggs', {}))
+        self.assertIn({'term': {'customer_country': 'France'}}, follow_up['query']['bool']['filter'])
+        self.assertIn({'range': {'@timestamp': {'gte': 1766300400000, 'lt': 1766304000000,
+                                                'format': 'epoch_millis'}}}, follow_up['query']['bool']['filter'])
+        self.assertEqual(follow_up['query']['bool']['must_not'], [{'exists': {'field': 'product_category'}}])
+
+    def test_materialize_skipped_while_another_process_holds_the_lock(self):
+        redis_client = MagicMock()
+        redis_client.lock.return_value.acquire.return_value = False
+        rollups = OrderRollups(self.es, IndexResolver(self.es), rollup_index='rollups', redis_client=redis_client)
+
+        self.assertIsNone(rollups.materialize(today=date(2025, 12, 22)))
+        redis_client.lock.return_value.acquire.assert_called_once_with(blocking=False)
+        self.es.indices.exists.assert_not_called()
+
+    def test_requests_during_a_pass_coalesce(self):
+        started, release = threading.Event(), threading.Event()
+
+        def materialize():
+            started.set()
+            release.wait(5)
+            return {'rolled': [], 'removed': []}
+
+        with patch.object(self.rollups, 'materialize', side_effect=materialize) as run:
+            self.rollups.request_materialize()
+            self.assertTrue(started.wait(5))
+            for _ in range(3):
+                self.rollups.request_materialize()
+            release.set()
+            for _ in range(100):
+                if self.rollups._worker is None:
+                    break
+                time.sleep(0.05)
+
+        self.assertIsNone(self.rollups._worker)
+        self.assertEqual(run.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+"""
+Tests des lecteurs streaming
+Valide le parsing incrémental CSV/JSON/NDJSON, la décompression en flux et le plafond mémoire
+"""
+
+import unittest
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from ingest.readers import (
+    iter_json_records, iter_batches, read_batches, iter_documents,
+    detect_format, open_text_stream, zstandard,
+    iter_ndjson_records, iter_ndjson_range, iter_csv_range, split_byte_ranges
+)
+
+
+class TestJsonStreamParser(unittest.TestCase):
+    """Tests du parseur JSON incrémental"""
+
+    def test_array(self):
+        """Un tableau d'objets est lu objet par objet"""
+        data = json.dumps([{'n': i, 'msg': 'a, b ] {c}'} for i in range(50)])
+        records = list(iter_json_records(io.StringIO(data), read_size=7))
+        self.assertEqual([r['n'] for r in records], list(range(50)))
+        self.assertEqual(records[0]['msg'], 'a, b ] {c}')
+
+    def test_single_object(self):
+        """Un objet unique donne un seul document"""
+        records = list(iter_json_records(io.StringIO('  {"Level": "INFO"}\n')))
+        self.assertEqual(records, [{'Level': 'INFO'}])
+
+    def test_ndjson(self):
+        """Les objets concaténés ligne par ligne (NDJSON) sont supportés"""
+        data = '{"n": 1}\n{"n": 2}\n\n{"n": 3}\n'
+        records = list(iter_json_records(io.StringIO(data), read_size=4))
+        self.assertEqual([r['n'] for r in records], [1, 2, 3])
+
+    def test_empty_array(self):
+        """Un tableau vide ne produit aucun document"""
+        self.assertEqual(list(iter_json_records(io.StringIO('[ ]'))), [])
+
+    def test_truncated_json(self):
+        """Un fichier tronqué lève une ValueError"""
+        with self.assertRaises(ValueError):
+            list(iter_json_records(io.StringIO('[{"n": 1}, {"n": '), read_size=5))
+
+    def test_non_object_rejected(self):
+        """Les valeurs qui ne sont pas des objets sont refusées"""
+        with self.assertRaises(ValueError):
+            list(iter_json_records(io.StringIO('[1, 2]')))
+
+    def test_large_document_read_geometrically(self):
+        """Un gros document (tableau indenté) est redécodé un nombre logarithmique de fois"""
+        data = json.dumps([{'items': [{'n': i} for i in range(5000)]}, {'n': 1}], indent=2)
+        stream = io.StringIO(data)
+        reads = []
+        original = stream.read
+        stream.read = lambda size: reads.append(size) or original(size)
+
+        records = list(iter_json_records(stream, read_size=64))
+
+        self.assertEqual(len(records[0]['items']), 5000)
+        self.assertEqual(records[1], {'n': 1})
+        self.assertLess(len(reads), 30)
+
+    def test_document_size_limit(self):
+        """Un document plus gros que la limite est refusé sans tout charger"""
+        data = '[{"payload": "' + 'x' * 1000 + '"}]'
+        with self.assertRaises(ValueError):
+            list(iter_json_records(io.StringIO(data), read_size=64, max_document_bytes=256))
+
+
+class TestBatches(unittest.TestCase):
+    """Tests du découpage en lots"""
+
+    def test_iter_batches(self):
+        batches = list(iter_batches(range(7), 3))
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_csv_batches(self):
+        """Le CSV est lu par blocs avec l'inférence de types pandas"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('Level,Service,count\n')
+            for i in range(25):
+                f.write(f'INFO,api,{i}\n')
+        try:
+            batches = list(read_batches(f.name, 'csv', batch_size=10))
+            self.assertEqual([len(b) for b in batches], [10, 10, 5])
+            self.assertEqual(batches[2][-1]['count'], 24)
+            self.assertEqual(batches[0][0]['Service'], 'api')
+        finally:
+            os.remove(f.name)
+
+
+class TestNdjson(unittest.TestCase):
+    """Tests du lecteur NDJSON ligne par ligne et du découpage par plages d'octets"""
+
+    def test_line_by_line(self):
+        data = '{"n": 1}\n\n  {"n": 2, "msg": "a\\nb"}\r\n{"n": 3}'
+        records = list(iter_ndjson_records(io.StringIO(data)))
+        self.assertEqual([r['n'] for r in records], [1, 2, 3])
+        self.assertEqual(records[1]['msg'], 'a\nb')
+
+    def test_invalid_line_reports_line_number(self):
+        with self.assertRaisesRegex(ValueError, 'line 2'):
+            list(iter_ndjson_records(io.StringIO('{"n": 1}\n{"n": \n')))
+        with self.assertRaisesRegex(ValueError, 'Expected JSON objects'):
+            list(iter_ndjson_records(io.StringIO('[1, 2]\n')))
+
+    def test_byte_ranges_cover_each_line_once(self):
+        """Chaque ligne est lue exactement une fois quel que soit le découpage"""
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False, encoding='utf-8') as f:
+            for i in range(1000):
+                f.write(json.dumps({'n': i, 'msg': 'é' * (i % 17)}) + '\n')
+        try:
+            for parts in (1, 3, 7, 64):
+                ranges = split_byte_ranges(f.name, parts)
+                self.assertEqual(ranges[0][0], 0)
+                self.assertEqual(ranges[-1][1], os.path.getsize(f.name))
+                seen = [r['n'] for start, end in ranges for r in iter_ndjson_range(f.name, start, end)]
+                self.assertEqual(seen, list(range(1000)), f"{parts} parts")
+        finally:
+            os.remove(f.name)
+
+    def test_csv_byte_ranges(self):
+        """Le CSV découpé garde l'en-tête et les valeurs en chaînes"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as f:
+            f.write('id,name,amount\n')
+            for i in range(300):
+                f.write(f'{i:03d},"Item, {i}",{i}.50\n')
+        try:
+            rows = [r for start, end in split_byte_ranges(f.name, 5) for r in iter_csv_range(f.name, start, end)]
+            self.assertEqual(len(rows), 300)
+            self.assertEqual(rows[7], {'id': '007', 'name': 'Item, 7', 'amount': '7.50'})
+            self.assertEqual(rows[-1]['id'], '299')
+        finally:
+            os.remove(f.name)
+
+    def test_read_batches_ndjson(self):
+        stream = io.StringIO(''.join(json.dumps({'n': i}) + '\n' for i in range(25)))
+        batches = list(read_batches(stream, 'ndjson', batch_size=10))
+        self.assertEqual([len(b) for b in batches], [10, 10, 5])
+
+
+class TestCompressedStreams(unittest.TestCase):
+    """Tests de la détection de format et de la décompression à la volée"""
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format('logs.csv'), ('csv', None))
+        self.assertEqual(detect_format('logs.JSON.GZ'), ('json', 'gzip'))
+        self.assertEqual(detect_format('events.ndjson.gz'), ('ndjson', 'gzip'))
+        self.assertEqual(detect_format('events.jsonl'), ('ndjson', None))
+        self.assertEqual(detect_format('archive.tar.gz'), (None, None))
+        self.assertEqual(detect_format('logs.gz'), (None, None))
+        self.assertEqual(detect_format('README'), (None, None))
+
+    def _write_gzip(self, suffix, text):
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            f.write(gzip.compress(text.encode('utf-8')))
+        return f.name
+
+    def test_gzip_csv(self):
+        """Le CSV compressé est lu sans fichier décompressé intermédiaire"""
+        text = 'Level,count\n' + ''.join(f'INFO,{i}\n' for i in range(2000))
+        path = self._write_gzip('.csv.gz', text)
+        try:
+            stream, counter = open_text_stream(path, 'gzip')
+            with stream:
+                rows = list(iter_documents(stream, 'csv', batch_size=300))
+            self.assertEqual(len(rows), 2000)
+            self.assertEqual(rows[-1]['count'], 1999)
+            # La progression est mesurée sur les octets compressés (taille sur disque)
+            self.assertEqual(counter.bytes_read, os.path.getsize(path))
+            self.assertTrue(counter.closed)
+        finally:
+            os.remove(path)
+
+    def test_gzip_ndjson(self):
+        text = ''.join(json.dumps({'n': i}) + '\n' for i in range(500))
+        path = self._write_gzip('.ndjson.gz', text)
+        try:
+            stream, _ = open_text_stream(path, 'gzip')
+            with stream:
+                self.assertEqual([r['n'] for r in iter_documents(stream, 'ndjson')], list(range(500)))
+        finally:
+            os.remove(path)
+
+    @unittest.skipIf(zstandard is None, 'zstandard not installed')
+    def test_zstd_json(self):
+        data = zstandard.ZstdCompressor().compress(json.dumps([{'n': i} for i in range(100)]).encode('utf-8'))
+        stream, _ = open_text_stream(io.BytesIO(data), 'zstd')
+        with stream:
+            self.assertEqual(len(list(iter_documents(stream, 'json'))), 100)
+
+
+class TestMemoryCeiling(unittest.TestCase):
+    """Le pic mémoire reste borné quelle que soit la taille du fichier"""
+
+    ROWS = 100000
+    CEILING = 4 * 1024 * 1024  # 4MB
+
+    def _measure_peak(self, filepath, file_type):
+        tracemalloc.start()
+        try:
+            count = 0
+            for _ in iter_documents(filepath, file_type, batch_size=500):
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return count, peak
+
+    def test_json_array_memory_ceiling(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            f.write('[')
+            for i in range(self.ROWS):
+                if i:
+                    f.write(',')
+                json.dump({'@timestamp': '2025-12-21T10:00:00Z', 'Level': 'INFO',
+                           'Service': 'checkout', 'Message': f'Order {i} processed', 'User': f'user{i}'}, f)
+            f.write(']')
+        try:
+            size = os.path.getsize(f.name)
+            count, peak = self._measure_peak(f.name, 'json')
+            self.assertEqual(count, self.ROWS)
+            self.assertLess(peak, self.CEILING, f"peak {peak} bytes for a {size} bytes file")
+        finally:
+            os.remove(f.name)
+
+    def test_ndjson_memory_ceiling(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            for i in range(self.ROWS):
+                json.dump({'@timestamp': '2025-12-21T10:00:00Z', 'Level': 'INFO',
+                           'Service': 'checkout', 'Message': f'Order {i} processed', 'User': f'user{i}'}, f)
+                f.write('\n')
+        try:
+            size = os.path.getsize(f.name)
+            count, peak = self._measure_peak(f.name, 'ndjson')
+            self.assertEqual(count, self.ROWS)
+            self.assertLess(peak, self.CEILING, f"peak {peak} bytes for a {size} bytes file")
+        finally:
+            os.remove(f.name)
+
+    def test_csv_memory_ceiling(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('Timestamp,Level,Service,Message,User\n')
+            for i in range(self.ROWS):
+                f.write(f'2025-12-21 10:00:00,INFO,checkout,Order {i} processed,user{i}\n')
+        try:
+            size = os.path.getsize(f.name)
+            count, peak = self._measure_peak(f.name, 'csv')
+            self.assertEqual(count, self.ROWS)
+            self.assertLess(peak, self.CEILING, f"peak {peak} bytes for a {size} bytes file")
+        finally:
+            os.remove(f.name)
+
+
+if __name__ == '__main__':
+    unittest.main()